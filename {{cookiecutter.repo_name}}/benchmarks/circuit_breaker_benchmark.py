@@ -0,0 +1,427 @@
+"""
+Micro-benchmarks of the circuit breaker, which runs on every request, with a regression gate against a stored
+baseline.
+
+The cases are:
+    circuit_*      evaluation of a circuit: is_callable while closed, open and half open, and handle_failed_call
+    <repository>_* get, update and modify of a circuit in the in-memory, shared memory and distributed repositories,
+                   and a synchronization of the distributed repository with a SQLite circuit store
+    execute_*      overhead of CircuitBreakerService.execute over awaiting a no-op coroutine, and of a call that
+                   falls back because the circuit is open
+    execute_pool_* overhead of CircuitBreakerService.execute_pool over awaiting a no-op coroutine, with a pool of
+                   backends whose circuits are closed, and with a pool whose circuits are all open, which falls back
+    contention_*   execute called by thousands of concurrent tasks, with and without a bulkhead
+
+Every case is timed repeat times. The runs of the cases are interleaved, one run of every case per round, so a
+disturbance of the machine spreads over all cases instead of slowing down one of them. A case is summarized by the
+median of its runs, in nanoseconds per call, and their spread, the interquartile range. The overhead cases subtract
+the time of the direct call of the same round.
+
+A baseline is only comparable on the machine it was measured on, so save it there from the version to compare
+against, then run the changed version with --baseline. The run fails with exit code 1 if a case is slower than the
+baseline by more than the largest of:
+    - the threshold, a fraction of the baseline
+    - twice the spread of the case in the baseline
+    - the minimum difference in nanoseconds, which keeps the cases that take little time from failing on noise
+Cases whose spread in the baseline exceeds the maximum spread, a fraction of their median, are reported as unstable
+and not gated.
+
+Usage:
+    python -m benchmarks.circuit_breaker_benchmark --save-baseline circuit-breaker-baseline.json
+    python -m benchmarks.circuit_breaker_benchmark --baseline circuit-breaker-baseline.json --threshold 0.3
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+from src.core.model.backend_pool import BackendPool
+from src.core.model.circuit import Circuit
+from src.infrastructure.repositories.distributed_circuit_breaker_repository import (
+    DistributedCircuitBreakerRepository,
+)
+from src.infrastructure.repositories.in_memory_circuit_breaker_repository import (
+    InMemoryCircuitBreakerRepository,
+)
+from src.infrastructure.repositories.shared_memory_circuit_breaker_repository import (
+    SharedMemoryCircuitBreakerRepository,
+)
+from src.infrastructure.stores.sqlite_circuit_store import SqliteCircuitStore
+from src.services.bulkhead import Bulkhead
+from src.services.circuit_breaker_service import CircuitBreakerService
+
+CIRCUIT_ID = "primary"
+POOL_SIZE = 3
+# A case may differ from the baseline by this many spreads before it counts as a regression
+SPREAD_FACTOR = 2.0
+
+
+class Case:
+    """
+    A benchmarked operation.
+
+    It has the following attributes:
+        - name: name of the case in the results and the baseline
+        - run: function that makes count calls of the operation, a coroutine function for asynchronous operations
+        - count: calls per run
+        - subtract: name of the case whose time of the same round is subtracted, to only keep the overhead
+    """
+
+    def __init__(self, name, run, count, subtract=None):
+        self.name = name
+        self.run = run
+        self.count = count
+        self.subtract = subtract
+
+
+def sync_case(name, function, count):
+    def run(number):
+        for _ in range(number):
+            function()
+
+    return Case(name, run, count)
+
+
+def create_circuit(circuit_id=CIRCUIT_ID, **kwargs):
+    # A threshold that is never reached keeps the circuit closed while failures are recorded
+    return Circuit(circuit_id, failure_threshold=kwargs.pop("failure_threshold", 10**9), **kwargs)
+
+
+def circuit_cases(number):
+    closed = create_circuit()
+    opened = create_circuit(open=True, last_failure=time.time(), retry_timeout=3600)
+    # A half open circuit with a probe in flight refuses further calls, without changing its state
+    half_opened = create_circuit()
+    half_opened.half_open()
+    half_opened.is_callable()
+    failing = create_circuit()
+
+    return [
+        sync_case("circuit_is_callable_closed", closed.is_callable, number),
+        sync_case("circuit_is_callable_open", opened.is_callable, number),
+        sync_case("circuit_is_callable_half_open", half_opened.is_callable, number),
+        sync_case("circuit_handle_failed_call", failing.handle_failed_call, number),
+    ]
+
+
+def repository_cases(name, repository, number):
+    repository.add(create_circuit())
+    circuit = repository.get(CIRCUIT_ID)
+
+    return [
+        sync_case(f"{name}_get", lambda: repository.get(CIRCUIT_ID), number),
+        sync_case(f"{name}_update", lambda: repository.update(circuit), number),
+        sync_case(f"{name}_modify", lambda: repository.modify(CIRCUIT_ID, Circuit.is_callable), number),
+    ]
+
+
+def repositories_cases(directory, number, resources: ExitStack):
+    cases = repository_cases("in_memory", InMemoryCircuitBreakerRepository(), number)
+
+    shared_memory = SharedMemoryCircuitBreakerRepository(name="circuits", directory=directory)
+    resources.callback(shared_memory.close)
+    cases += repository_cases("shared_memory", shared_memory, number)
+
+    # The synchronization thread is not started, the store is only used by the synchronize case
+    store = SqliteCircuitStore(os.path.join(directory, "circuits.db"))
+    resources.callback(store.close)
+    distributed = DistributedCircuitBreakerRepository(store)
+    cases += repository_cases("distributed", distributed, number)
+
+    def record_failure_and_synchronize():
+        distributed.modify(CIRCUIT_ID, Circuit.handle_failed_call)
+        distributed.synchronize()
+
+    # Every round trip writes a delta, which is what a node with traffic does
+    cases.append(
+        sync_case("distributed_synchronize", record_failure_and_synchronize, max(number // 100, 10))
+    )
+    return cases
+
+
+def create_service(bulkhead=None, **circuit_kwargs):
+    service = CircuitBreakerService(InMemoryCircuitBreakerRepository(), bulkhead=bulkhead)
+    service.add_circuit(create_circuit(**circuit_kwargs))
+    return service
+
+
+def create_pool_service(**circuit_kwargs):
+    pool = BackendPool(
+        [Backend(f"backend-{index}", "http://localhost", SecretStr("key")) for index in range(POOL_SIZE)]
+    )
+    service = CircuitBreakerService(InMemoryCircuitBreakerRepository())
+
+    for backend in pool.backends:
+        service.add_circuit(create_circuit(backend.identifier, **circuit_kwargs))
+
+    return service, pool
+
+
+async def no_op():
+    return None
+
+
+async def yielding_no_op():
+    await asyncio.sleep(0)
+
+
+async def forward(backend, upstream_request):
+    """
+    Stands in for the forwarding service, which sends the request to the backend.
+    """
+    return upstream_request
+
+
+async def fallback(upstream_request):
+    return upstream_request
+
+
+def execute_cases(number):
+    closed = create_service()
+    opened = create_service(open=True, last_failure=time.time(), retry_timeout=3600)
+
+    async def run_direct(count):
+        for _ in range(count):
+            await no_op()
+
+    def run_execute(service):
+        async def run(count):
+            for _ in range(count):
+                await service.execute(CIRCUIT_ID, no_op, no_op)
+
+        return run
+
+    return [
+        Case("execute_no_op_direct", run_direct, number),
+        Case("execute_overhead", run_execute(closed), number, subtract="execute_no_op_direct"),
+        Case("execute_open_circuit_fallback", run_execute(opened), number, subtract="execute_no_op_direct"),
+    ]
+
+
+def execute_pool_cases(number):
+    closed = create_pool_service()
+    # After the first call the pool takes the backends out of its schedule, as it does in the gateway
+    opened = create_pool_service(open=True, last_failure=time.time(), retry_timeout=3600)
+    upstream_request = object()
+
+    def run_execute_pool(service, pool):
+        async def run(count):
+            for _ in range(count):
+                await service.execute_pool(pool, forward, fallback, upstream_request)
+
+        return run
+
+    return [
+        Case("execute_pool_overhead", run_execute_pool(*closed), number, subtract="execute_no_op_direct"),
+        Case(
+            "execute_pool_open_fallback", run_execute_pool(*opened), number, subtract="execute_no_op_direct"
+        ),
+    ]
+
+
+def contention_cases(tasks):
+    def run_concurrently(service):
+        async def run(count):
+            await asyncio.gather(
+                *[service.execute(CIRCUIT_ID, yielding_no_op, yielding_no_op) for _ in range(count)]
+            )
+
+        return run
+
+    # The bulkhead admits a fraction of the tasks at once, the others queue for a slot
+    bulkhead = Bulkhead(max_concurrency=100, max_queue_size=tasks, max_queue_time=60.0)
+
+    return [
+        Case("contention", run_concurrently(create_service()), tasks),
+        Case("contention_bulkhead", run_concurrently(create_service(bulkhead=bulkhead)), tasks),
+    ]
+
+
+async def time_case(case: Case):
+    """
+    Returns the nanoseconds per call of one run of the case. Like timeit, the garbage collector is disabled during
+    the run, so its pauses do not land on whichever case happens to trigger them.
+    """
+    gc.collect()
+    gc.disable()
+
+    try:
+        started = time.perf_counter_ns()
+
+        if asyncio.iscoroutinefunction(case.run):
+            await case.run(case.count)
+        else:
+            case.run(case.count)
+
+        return (time.perf_counter_ns() - started) / case.count
+    finally:
+        gc.enable()
+
+
+async def run_rounds(cases, repeat):
+    """
+    Returns the nanoseconds per call of every run of every case, running one run of every case per round. An
+    untimed round warms up the caches and the lazily initialized state of the services first.
+    """
+    for case in cases:
+        await time_case(case)
+
+    samples = {case.name: [] for case in cases}
+
+    for _ in range(repeat):
+        for case in cases:
+            samples[case.name].append(await time_case(case))
+
+    for case in cases:
+        if case.subtract is not None:
+            samples[case.name] = [
+                value - subtracted for value, subtracted in zip(samples[case.name], samples[case.subtract])
+            ]
+
+    return samples
+
+
+def summarize(samples):
+    """
+    Returns the median and the interquartile range of the runs of a case.
+    """
+    first_quartile, median, third_quartile = statistics.quantiles(samples, n=4)
+    return {"median": median, "spread": third_quartile - first_quartile}
+
+
+def run_benchmarks(number, repeat, tasks):
+    with tempfile.TemporaryDirectory() as directory, ExitStack() as resources:
+        cases = (
+            circuit_cases(number)
+            + repositories_cases(directory, number, resources)
+            + execute_cases(number)
+            + execute_pool_cases(number)
+            + contention_cases(tasks)
+        )
+        samples = asyncio.run(run_rounds(cases, repeat))
+
+    return {name: summarize(values) for name, values in samples.items()}
+
+
+def compare(results, baseline, threshold, min_difference, max_spread):
+    """
+    Returns the comparison of every case with the baseline, the names of the cases that regressed, and the names
+    of the cases that were too unstable to be compared.
+    """
+    comparison = {}
+    regressions = []
+    unstable = []
+
+    for name, result in results.items():
+        stored = baseline.get(name)
+
+        if stored is None:
+            comparison[name] = {"current": result["median"], "baseline": None, "change": None}
+            continue
+
+        baseline_value = stored["median"]
+        difference = result["median"] - baseline_value
+        # Cases that take almost no time are compared with a floor of a nanosecond
+        reference = max(abs(baseline_value), 1.0)
+        comparison[name] = {
+            "current": result["median"],
+            "baseline": baseline_value,
+            "change": difference / reference,
+        }
+
+        # The baseline decides which cases are stable enough to be gated, so every run gates the same cases
+        if stored["spread"] > max_spread * reference:
+            unstable.append(name)
+        elif difference > max(threshold * reference, SPREAD_FACTOR * stored["spread"], min_difference):
+            regressions.append(name)
+
+    return comparison, regressions, unstable
+
+
+def report(comparison, regressions, unstable):
+    for name, values in comparison.items():
+        line = f"{name:<32} {values['current']:12.1f} ns"
+
+        if values["baseline"] is not None:
+            line += f"   baseline: {values['baseline']:12.1f} ns   change: {values['change'] * 100:+7.1f}%"
+
+        if name in regressions:
+            line += "   REGRESSION"
+        elif name in unstable:
+            line += "   unstable, not gated"
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=10_000, help="calls per run")
+    parser.add_argument("--repeat", type=int, default=15, help="runs per case, the median is kept")
+    parser.add_argument("--tasks", type=int, default=5_000, help="concurrent tasks of the contention cases")
+    parser.add_argument("--baseline", help="baseline file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, a fraction of the baseline")
+    parser.add_argument(
+        "--min-difference", type=float, default=100.0, help="slowdown in nanoseconds that is always allowed"
+    )
+    parser.add_argument(
+        "--max-spread", type=float, default=0.5, help="spread in the baseline above which a case is not gated"
+    )
+    parser.add_argument("--save-baseline", help="file to save the results to as a baseline")
+    args = parser.parse_args()
+
+    if args.repeat < 2:
+        parser.error("--repeat must be at least 2 to measure the spread of the cases")
+
+    results = run_benchmarks(args.number, args.repeat, args.tasks)
+    baseline = {}
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            stored = json.load(file)
+
+        if stored["machine"] != platform.node() or stored["python"] != platform.python_version():
+            print(
+                f"Warning: the baseline was measured on {stored['machine']} with Python {stored['python']}",
+                file=sys.stderr,
+            )
+
+        baseline = stored["results"]
+
+    comparison, regressions, unstable = compare(
+        results, baseline, args.threshold, args.min_difference, args.max_spread
+    )
+    report(comparison, regressions, unstable)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+
+        with open(args.save_baseline, "w") as file:
+            json.dump(
+                {"machine": platform.node(), "python": platform.python_version(), "results": results},
+                file,
+                indent=2,
+                sort_keys=True,
+            )
+            file.write("\n")
+
+    if regressions:
+        print(
+            f"{len(regressions)} case(s) regressed by more than {args.threshold * 100:.0f}%, twice their spread "
+            f"and {args.min_difference:.0f} ns: {', '.join(regressions)}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measures the overhead the gateway adds per proxied request, using a no-op upstream that answers instantly.
+
+The app is called in-process through its ASGI interface. The /status route is measured as well; it goes
+through the same framework stack without doing any gateway work, so the difference between both is the
+time spent in the /openai route.
+
+Usage:
+    python -m benchmarks.gateway_overhead_benchmark --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+
+REQUEST_BODY = b'{"messages": [{"role": "user", "content": "Hello"}], "temperature": 0}'
+RESPONSE_BODY = b'{"choices": [{"message": {"role": "assistant", "content": "Hi"}}]}'
+
+
+def create_benchmark_app():
+    os.environ.setdefault("PRIMARY_OPENAI_HOST", "http://primary-host")
+    os.environ.setdefault("PRIMARY_OPENAI_API_KEY", "primary_key")
+    os.environ.setdefault("FALLBACK_OPENAI_HOST", "http://fallback-host")
+    os.environ.setdefault("FALLBACK_OPENAI_API_KEY", "fallback_key")
+    os.environ["APPLICATION_INSIGHTS_ENABLED"] = "False"
+
+    from src.create_app import create_app
+
+    app = create_app()
+    no_op_upstream = httpx.MockTransport(
+        lambda request: httpx.Response(
+            200, content=RESPONSE_BODY, headers={"content-type": "application/json"}
+        )
+    )
+    app.container.upstream_client_pool.override(
+        UpstreamClientPool(transport=no_op_upstream)
+    )
+    app.container.forwarding_service.reset()
+    return app
+
+
+async def measure(client: httpx.AsyncClient, method, url, total_requests, **kwargs):
+    # Warm up caches and lazily created objects before measuring
+    for _ in range(100):
+        await client.request(method, url, **kwargs)
+
+    durations = []
+
+    for _ in range(total_requests):
+        start = time.perf_counter()
+        await client.request(method, url, **kwargs)
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def report(name, durations):
+    quantiles = statistics.quantiles(durations, n=100)
+    print(
+        f"{name:<10} mean: {statistics.mean(durations) * 1e6:8.1f} us   "
+        f"p50: {quantiles[49] * 1e6:8.1f} us   p99: {quantiles[98] * 1e6:8.1f} us"
+    )
+
+
+async def benchmark(total_requests):
+    app = create_benchmark_app()
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+    ) as client:
+        status = await measure(client, "GET", "/status", total_requests)
+        proxied = await measure(
+            client,
+            "POST",
+            "/openai/deployments/gpt/chat/completions?api-version=2024-02-01",
+            total_requests,
+            content=REQUEST_BODY,
+            headers={"content-type": "application/json"},
+        )
+
+    report("/status", status)
+    report("/openai", proxied)
+    print(
+        f"Gateway overhead per request: "
+        f"{(statistics.median(proxied) - statistics.median(status)) * 1e6:.1f} us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.requests))
+
+
+if __name__ == "__main__":
+    main()
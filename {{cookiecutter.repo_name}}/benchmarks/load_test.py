@@ -0,0 +1,357 @@
+"""
+Load test of the gateway against local mock OpenAI backends, see benchmarks.mock_openai_upstream. The gateway runs
+with uvicorn in its own processes, with a primary backend and a fallback backend that run in processes of their own.
+
+The scenarios are:
+    latency   completions at the given concurrency: the latency the gateway adds, p50, p95 and p99, measured as the
+              latency of a request minus the latency the mock reports, and the requests per second per worker.
+              The same load is sent to the mock directly, so the overhead of the client is known.
+    stream    streamed completions: the latency the gateway adds to the first byte, and the duration of a stream
+    faults    completions while the primary backend throttles and fails a share of the requests: every request must
+              still be answered with status 200, by the fallback backend where needed
+    memory    requests held in flight by a slow backend: the memory of the gateway per request in flight, from the
+              resident memory of its processes (Linux only)
+
+The results are written as JSON with sorted keys, so the results of two versions can be diffed.
+
+Usage:
+    python -m benchmarks.load_test --workers 2 --concurrency 50 --duration 10 --output load-test.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.mock_openai_upstream import BACKEND_HEADER, LATENCY_HEADER, MockConfig, serve
+
+COMPLETIONS_PATH = "/openai/deployments/gpt/chat/completions?api-version=2024-02-01"
+REQUEST_BODY = {"messages": [{"role": "user", "content": "Hello " * 50}], "max_tokens": 100}
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+
+    raise Exception(f"Server did not start: {url}")
+
+
+def start_mock(name, config: MockConfig):
+    port = get_free_port()
+    process = multiprocessing.Process(target=serve, args=(name, port, config), daemon=True)
+    process.start()
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/mock/stats")
+    return process, url
+
+
+def start_gateway(workers, primary_url, fallback_url):
+    port = get_free_port()
+    environment = {
+        **os.environ,
+        "PRIMARY_OPENAI_HOST": primary_url,
+        "PRIMARY_OPENAI_API_KEY": "primary_key",
+        "FALLBACK_OPENAI_HOST": fallback_url,
+        "FALLBACK_OPENAI_API_KEY": "fallback_key",
+        "APPLICATION_INSIGHTS_ENABLED": "False",
+        "LOG_LEVEL": "WARNING",
+        "NO_PROXY": "127.0.0.1",
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        env=environment,
+    )
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/status")
+    return process, url
+
+
+def configure_mock(url, **config):
+    httpx.post(f"{url}/mock/config", json=config).raise_for_status()
+
+
+def get_mock_stats(url):
+    return httpx.get(f"{url}/mock/stats").json()
+
+
+def quantiles_ms(values):
+    if len(values) < 2:
+        return None
+
+    quantiles = statistics.quantiles(values, n=100)
+    return {
+        "p50": round(quantiles[49] * 1000, 3),
+        "p95": round(quantiles[94] * 1000, 3),
+        "p99": round(quantiles[98] * 1000, 3),
+    }
+
+
+def read_rss_kb(pid):
+    """
+    Returns the resident memory of the process and its children in kilobytes, or None if it cannot be read.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            rss = next(int(line.split()[1]) for line in file if line.startswith("VmRSS:"))
+
+        with open(f"/proc/{pid}/task/{pid}/children") as file:
+            children = [int(child) for child in file.read().split()]
+    except (OSError, StopIteration):
+        return None
+
+    for child in children:
+        child_rss = read_rss_kb(child)
+        rss += child_rss or 0
+
+    return rss
+
+
+class Sample:
+    __slots__ = ("latency", "first_byte", "upstream_latency", "status_code", "backend")
+
+    def __init__(self, latency, first_byte, upstream_latency, status_code, backend):
+        self.latency = latency
+        self.first_byte = first_byte
+        self.upstream_latency = upstream_latency
+        self.status_code = status_code
+        self.backend = backend
+
+
+async def send_request(client: httpx.AsyncClient, url, body):
+    started = time.perf_counter()
+
+    async with client.stream("POST", url, json=body) as response:
+        first_byte = None
+
+        async for _ in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+
+    latency = time.perf_counter() - started
+    upstream_latency = response.headers.get(LATENCY_HEADER)
+
+    return Sample(
+        latency,
+        first_byte if first_byte is not None else latency,
+        float(upstream_latency) if upstream_latency is not None else None,
+        response.status_code,
+        response.headers.get(BACKEND_HEADER),
+    )
+
+
+async def run_load(url, body, concurrency, duration):
+    """
+    Sends requests from concurrency clients, each sending its next request once the last one was answered, for
+    duration seconds. Returns the samples and the elapsed seconds.
+    """
+    samples = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        # Open the connections before measuring
+        await asyncio.gather(*[send_request(client, url, body) for _ in range(concurrency)])
+        started = time.perf_counter()
+        end = started + duration
+
+        async def run_client():
+            while time.perf_counter() < end:
+                samples.append(await send_request(client, url, body))
+
+        await asyncio.gather(*[run_client() for _ in range(concurrency)])
+        return samples, time.perf_counter() - started
+
+
+def added_latencies(samples, first_byte=False):
+    return [
+        (sample.first_byte if first_byte else sample.latency) - sample.upstream_latency
+        for sample in samples
+        if sample.status_code == 200 and sample.upstream_latency is not None
+    ]
+
+
+def run_latency_scenario(gateway_url, primary_url, args):
+    configure_mock(primary_url, latency=args.latency, throttle_rate=0.0, error_rate=0.0)
+    direct, _ = asyncio.run(run_load(primary_url + COMPLETIONS_PATH, REQUEST_BODY, args.concurrency, args.duration))
+    samples, elapsed = asyncio.run(
+        run_load(gateway_url + COMPLETIONS_PATH, REQUEST_BODY, args.concurrency, args.duration)
+    )
+    requests_per_second = len(samples) / elapsed
+
+    return {
+        "requests": len(samples),
+        "errors": sum(sample.status_code != 200 for sample in samples),
+        "requests_per_second": round(requests_per_second, 1),
+        "requests_per_second_per_worker": round(requests_per_second / args.workers, 1),
+        "gateway_added_latency_ms": quantiles_ms(added_latencies(samples)),
+        "client_overhead_ms": quantiles_ms(added_latencies(direct)),
+    }
+
+
+def run_stream_scenario(gateway_url, primary_url, args):
+    configure_mock(
+        primary_url,
+        latency=args.latency,
+        stream_tokens=args.stream_tokens,
+        token_interval=args.token_interval,
+        throttle_rate=0.0,
+        error_rate=0.0,
+    )
+    body = {**REQUEST_BODY, "stream": True}
+    samples, elapsed = asyncio.run(run_load(gateway_url + COMPLETIONS_PATH, body, args.concurrency, args.duration))
+
+    return {
+        "streams": len(samples),
+        "errors": sum(sample.status_code != 200 for sample in samples),
+        "streams_per_second": round(len(samples) / elapsed, 1),
+        "gateway_added_first_byte_ms": quantiles_ms(added_latencies(samples, first_byte=True)),
+        "stream_duration_ms": quantiles_ms([sample.latency for sample in samples]),
+    }
+
+
+def run_faults_scenario(gateway_url, primary_url, fallback_url, args):
+    configure_mock(
+        primary_url,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+    )
+    configure_mock(fallback_url, latency=args.latency)
+    samples, _ = asyncio.run(run_load(gateway_url + COMPLETIONS_PATH, REQUEST_BODY, args.concurrency, args.duration))
+    primary_responses = get_mock_stats(primary_url)
+    failed = sum(sample.status_code != 200 for sample in samples)
+
+    return {
+        "requests": len(samples),
+        "failed_responses": failed,
+        "fallback_responses": sum(sample.backend == "fallback" for sample in samples),
+        "primary_throttled": primary_responses.get("429", 0),
+        "primary_errors": primary_responses.get("500", 0),
+        "correct": failed == 0,
+    }
+
+
+def run_memory_scenario(gateway_process, gateway_url, primary_url, args):
+    idle = read_rss_kb(gateway_process.pid)
+
+    if idle is None:
+        return None
+
+    configure_mock(primary_url, latency=f"constant:{args.hold_time}", throttle_rate=0.0, error_rate=0.0)
+
+    async def hold_requests():
+        limits = httpx.Limits(max_connections=args.memory_requests)
+
+        async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+            requests = [
+                asyncio.ensure_future(send_request(client, gateway_url + COMPLETIONS_PATH, REQUEST_BODY))
+                for _ in range(args.memory_requests)
+            ]
+            # Sample once every request reached the slow backend
+            await asyncio.sleep(args.hold_time / 2)
+            loaded = read_rss_kb(gateway_process.pid)
+            await asyncio.gather(*requests)
+            return loaded
+
+    loaded = asyncio.run(hold_requests())
+
+    return {
+        "in_flight_requests": args.memory_requests,
+        "idle_rss_kb": idle,
+        "loaded_rss_kb": loaded,
+        "kb_per_in_flight_request": round((loaded - idle) / args.memory_requests, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--latency", default="lognormal:0.05,0.3", help="latency distribution of the backends")
+    parser.add_argument("--stream-tokens", type=int, default=20)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.1, help="share of throttled primary calls")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="share of failed primary calls")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--memory-requests", type=int, default=200)
+    parser.add_argument("--hold-time", type=float, default=4.0)
+    parser.add_argument("--scenarios", default="latency,stream,faults,memory")
+    parser.add_argument("--output", help="file to write the results to, instead of stdout")
+    args = parser.parse_args()
+    scenarios = args.scenarios.split(",")
+
+    primary, primary_url = start_mock("primary", MockConfig(latency=args.latency))
+    fallback, fallback_url = start_mock("fallback", MockConfig(latency=args.latency))
+    gateway, gateway_url = start_gateway(args.workers, primary_url, fallback_url)
+    results = {}
+
+    try:
+        if "latency" in scenarios:
+            results["latency"] = run_latency_scenario(gateway_url, primary_url, args)
+
+        if "stream" in scenarios:
+            results["stream"] = run_stream_scenario(gateway_url, primary_url, args)
+
+        if "faults" in scenarios:
+            results["faults"] = run_faults_scenario(gateway_url, primary_url, fallback_url, args)
+
+        if "memory" in scenarios:
+            results["memory"] = run_memory_scenario(gateway, gateway_url, primary_url, args)
+    finally:
+        gateway.terminate()
+        gateway.wait()
+        primary.terminate()
+        fallback.terminate()
+
+    report = {
+        "version": os.getenv("APP_VERSION", "UNKNOWN_VERSION"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measures the time a proxied request spends logging on the event loop, before and after the log pipeline.
+
+Before, every forwarded request logged its request and response bodies at INFO with eagerly built f-strings,
+written synchronously by the handler. After, the bodies are logged at DEBUG as lazily formatted arguments, and
+records are written by a background thread. Both variants log to os.devnull, so the numbers leave out the disk.
+
+Usage:
+    python -m benchmarks.logging_benchmark --requests 2000 --body-size 100000
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+from src.infrastructure.logs.log_body import LogBody
+from src.infrastructure.logs.log_pipeline import install_log_pipeline, LogQueueHandler
+
+URL = "https://primary-host/openai/deployments/gpt/chat/completions?api-version=2024-02-01"
+
+
+def log_eagerly(logger, body):
+    logger.info(f"Making request to url: '{URL}' \nMethod: POST\nBody: {body} ")
+    logger.info(f"Got response status: 200\nBody: {body}")
+
+
+def log_lazily(logger, body):
+    logger.debug("Making request to url: '%s'\nMethod: %s\nBody: %s", URL, "POST", LogBody(body))
+    logger.debug("Got response status: %s\nBody: %s", 200, LogBody(body))
+
+
+def measure(log, logger, body, total_requests):
+    durations = []
+
+    for _ in range(total_requests):
+        start = time.perf_counter()
+        log(logger, body)
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def report(name, durations):
+    quantiles = statistics.quantiles(durations, n=100)
+    print(
+        f"{name:<32} mean: {statistics.mean(durations) * 1e6:8.1f} us   "
+        f"p50: {quantiles[49] * 1e6:8.1f} us   p99: {quantiles[98] * 1e6:8.1f} us"
+    )
+
+
+def benchmark(total_requests, body_size):
+    body = b'{"messages": [{"role": "user", "content": "' + b"a" * body_size + b'"}]}'
+
+    with open(os.devnull, "w") as devnull:
+        before = logging.getLogger("benchmarks.before")
+        before.setLevel(logging.INFO)
+        before.propagate = False
+        before.addHandler(logging.StreamHandler(devnull))
+        report("before: eager INFO bodies", measure(log_eagerly, before, body, total_requests))
+
+        for level in [logging.INFO, logging.DEBUG]:
+            after = logging.getLogger(f"benchmarks.after.{logging.getLevelName(level).lower()}")
+            after.setLevel(level)
+            after.propagate = False
+            handler = LogQueueHandler([logging.StreamHandler(devnull)])
+            install_log_pipeline(after, handler)
+
+            durations = measure(log_lazily, after, body, total_requests)
+            handler.stop()
+
+            report(f"after: lazy bodies, {logging.getLevelName(level)}", durations)
+            print(f"{'':<32} dropped records: {handler.dropped_records}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--body-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    benchmark(args.requests, args.body_size)
+
+
+if __name__ == "__main__":
+    main()
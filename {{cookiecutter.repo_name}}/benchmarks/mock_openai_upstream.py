@@ -0,0 +1,223 @@
+"""
+Mock OpenAI backend for load tests. It answers chat completions after a latency drawn from a configurable
+distribution, streams completions as server-sent events at a configurable token pace, and injects throttling
+(429 with Retry-After) and server errors (500) at configurable rates.
+
+Every response carries the name of the mock in the x-mock-backend header and the seconds the mock waited before
+answering in the x-mock-latency header, so a client can tell the time the gateway added. The configuration can be
+changed at runtime with POST /mock/config, and GET /mock/stats returns the number of responses per status.
+
+Usage:
+    python -m benchmarks.mock_openai_upstream --port 9000 --latency lognormal:0.05,0.3 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+
+import uvicorn
+
+BACKEND_HEADER = "x-mock-backend"
+LATENCY_HEADER = "x-mock-latency"
+
+
+def parse_latency(spec):
+    """
+    Returns a function drawing latencies in seconds from the distribution of the spec: "constant:<seconds>",
+    "uniform:<min>,<max>" or "lognormal:<median>,<sigma>".
+    """
+    name, _, parameters = spec.partition(":")
+    values = [float(value) for value in parameters.split(",")] if parameters else []
+
+    if name == "constant" and len(values) == 1:
+        return lambda: values[0]
+
+    if name == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+
+    if name == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+
+    raise ValueError(f"Invalid latency distribution: {spec}")
+
+
+class MockConfig:
+    """
+    Behavior of the mock backend.
+
+    It has the following attributes:
+        - latency: distribution of the seconds until the response, or the first event of a stream
+        - stream_tokens: number of events of a streamed completion
+        - token_interval: seconds between the events of a streamed completion
+        - throttle_rate: share of the requests answered with status 429
+        - retry_after: seconds the throttled responses ask to wait
+        - error_rate: share of the requests answered with status 500
+    """
+
+    def __init__(
+        self,
+        latency="constant:0.05",
+        stream_tokens=20,
+        token_interval=0.01,
+        throttle_rate=0.0,
+        retry_after=1.0,
+        error_rate=0.0,
+    ):
+        self.latency = latency
+        self.stream_tokens = stream_tokens
+        self.token_interval = token_interval
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.draw_latency = parse_latency(latency)
+
+    def to_dict(self):
+        return {
+            "latency": self.latency,
+            "stream_tokens": self.stream_tokens,
+            "token_interval": self.token_interval,
+            "throttle_rate": self.throttle_rate,
+            "retry_after": self.retry_after,
+            "error_rate": self.error_rate,
+        }
+
+
+class MockOpenAIUpstream:
+    """
+    ASGI application of the mock backend.
+    """
+
+    def __init__(self, name, config: MockConfig):
+        self.name = name
+        self.config = config
+        self.responses = Counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more_body = True
+
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        path = scope["path"]
+
+        if path == "/mock/config" and scope["method"] == "POST":
+            self.config = MockConfig(**{**self.config.to_dict(), **json.loads(body)})
+            self.responses.clear()
+            await self._send_json(send, 200, self.config.to_dict())
+        elif path == "/mock/stats":
+            await self._send_json(send, 200, {str(status): count for status, count in self.responses.items()})
+        else:
+            await self._complete(body, send)
+
+    async def _complete(self, body, send):
+        config = self.config
+        latency = config.draw_latency()
+        await asyncio.sleep(latency)
+        headers = [
+            (BACKEND_HEADER.encode(), self.name.encode()),
+            (LATENCY_HEADER.encode(), str(latency).encode()),
+        ]
+        draw = random.random()
+
+        if draw < config.throttle_rate:
+            headers += [
+                (b"retry-after", str(max(int(config.retry_after), 1)).encode()),
+                (b"retry-after-ms", str(int(config.retry_after * 1000)).encode()),
+            ]
+            await self._send_json(send, 429, {"error": {"code": "429", "message": "Rate limit"}}, headers)
+        elif draw < config.throttle_rate + config.error_rate:
+            await self._send_json(send, 500, {"error": {"code": "500", "message": "Injected"}}, headers)
+        elif b'"stream": true' in body or b'"stream":true' in body:
+            await self._stream(send, headers)
+        else:
+            completion = {
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Mock " * 20}}],
+                "usage": {"prompt_tokens": 20, "completion_tokens": 20, "total_tokens": 40},
+            }
+            await self._send_json(send, 200, completion, headers)
+
+    async def _stream(self, send, headers):
+        config = self.config
+        self.responses[200] += 1
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": headers + [(b"content-type", b"text/event-stream")],
+            }
+        )
+
+        for index in range(config.stream_tokens):
+            if index:
+                await asyncio.sleep(config.token_interval)
+
+            event = {"choices": [{"index": 0, "delta": {"content": "Mock "}}], "usage": None}
+            chunk = f"data: {json.dumps(event)}\n\n".encode()
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        usage = {"choices": [], "usage": {"prompt_tokens": 20, "completion_tokens": config.stream_tokens}}
+        await send(
+            {"type": "http.response.body", "body": f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode()}
+        )
+
+    async def _send_json(self, send, status, content, headers=()):
+        self.responses[status] += 1
+        body = json.dumps(content).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    *headers,
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def serve(name, port, config: MockConfig):
+    uvicorn.run(
+        MockOpenAIUpstream(name, config),
+        host="127.0.0.1",
+        port=port,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="mock")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="constant:0.05")
+    parser.add_argument("--stream-tokens", type=int, default=20)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        stream_tokens=args.stream_tokens,
+        token_interval=args.token_interval,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+    )
+    serve(args.name, args.port, config)
+
+
+if __name__ == "__main__":
+    main()
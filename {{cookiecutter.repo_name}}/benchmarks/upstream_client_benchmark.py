@@ -0,0 +1,98 @@
+"""
+Compares the concurrent throughput of a single worker (one event loop) when forwarding requests with a
+blocking `requests` call, as forward_request did before, and with the pooled async upstream client.
+
+Usage:
+    python -m benchmarks.upstream_client_benchmark --concurrency 50 --requests 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+
+
+def start_mock_upstream(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            time.sleep(latency)
+            body = b'{"choices": []}'
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = Server(("localhost", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_concurrently(forward, total_requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call():
+        async with semaphore:
+            await forward()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[call() for _ in range(total_requests)])
+    return total_requests / (time.perf_counter() - start)
+
+
+async def blocking_forward(url, body):
+    # The previous implementation: a blocking call inside a coroutine, without connection reuse
+    requests.request("POST", url, data=body)
+
+
+async def benchmark(total_requests, concurrency, latency):
+    server = start_mock_upstream(latency)
+    host = f"http://localhost:{server.server_port}"
+    url = f"{host}/openai/deployments/gpt/chat/completions"
+    body = b'{"messages": [{"role": "user", "content": "Hello"}]}'
+    pool = UpstreamClientPool(max_connections=concurrency)
+
+    async def pooled_forward():
+        await pool.get_client(host).request("POST", url, content=body)
+
+    try:
+        before = await run_concurrently(
+            lambda: blocking_forward(url, body), total_requests, concurrency
+        )
+        after = await run_concurrently(pooled_forward, total_requests, concurrency)
+    finally:
+        await pool.close()
+        server.shutdown()
+
+    print(f"Upstream latency: {latency * 1000:.0f} ms, concurrency: {concurrency}")
+    print(f"Blocking requests client: {before:10.1f} req/s")
+    print(f"Pooled async client:      {after:10.1f} req/s")
+    print(f"Speedup:                  {after / before:10.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.requests, args.concurrency, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,12 @@ from src.api.routers.openai import router as openai_router
 from src.api.routers.status import router as status_router
 from src.api.routers.version import router as version_router
 from src.api.routers.settings import router as settings_router
+from src.api.routers.backends import router as backends_router
+from src.api.routers.coalescing import router as coalescing_router
+from src.api.routers.priorities import router as priorities_router
+from src.api.routers.tenants import router as tenants_router
+from src.api.routers.metrics import router as metrics_router
+from src.api.routers.usage import router as usage_router
 
 # Define main router to register all sub routers
 router = APIRouter()
@@ -11,6 +17,12 @@ router.include_router(status_router, tags=["status"])
 router.include_router(openai_router, tags=["openai"])
 router.include_router(version_router, tags=["version"])
 router.include_router(settings_router, tags=["settings"])
+router.include_router(backends_router, tags=["backends"])
+router.include_router(coalescing_router, tags=["coalescing"])
+router.include_router(priorities_router, tags=["priorities"])
+router.include_router(tenants_router, tags=["tenants"])
+router.include_router(metrics_router, tags=["metrics"])
+router.include_router(usage_router, tags=["usage"])
 
 
 __all__ = ["router"]
@@ -0,0 +1,31 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from src.core.model.backend_pool import BackendPool
+from src.dependency_container import DependencyContainer
+from src.services.circuit_breaker_service import CircuitBreakerService
+
+router = APIRouter()
+
+
+@router.get("/backends", response_class=JSONResponse)
+@inject
+async def backends(
+    circuit_breaker_service: CircuitBreakerService = Depends(
+        Provide[DependencyContainer.circuit_breaker_service]
+    ),
+    backend_pool: BackendPool = Depends(Provide[DependencyContainer.backend_pool]),
+):
+    selector = circuit_breaker_service.selector
+    capacity_tracker = circuit_breaker_service.capacity_tracker
+    hedging_policy = circuit_breaker_service.hedging_policy
+    bulkhead = circuit_breaker_service.bulkhead
+
+    return {
+        "selector": selector.name,
+        "backends": selector.scores(backend_pool),
+        "quotas": capacity_tracker.capacities() if capacity_tracker else {},
+        "hedging": hedging_policy.statistics() if hedging_policy else None,
+        "bulkheads": bulkhead.statistics() if bulkhead else {},
+    }
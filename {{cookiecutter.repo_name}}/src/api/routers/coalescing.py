@@ -0,0 +1,18 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from src.dependency_container import DependencyContainer
+from src.services.request_coalescing_service import RequestCoalescingService
+
+router = APIRouter()
+
+
+@router.get("/coalescing", response_class=JSONResponse)
+@inject
+async def coalescing(
+    request_coalescing_service: RequestCoalescingService = Depends(
+        Provide[DependencyContainer.request_coalescing_service]
+    ),
+):
+    return request_coalescing_service.statistics()
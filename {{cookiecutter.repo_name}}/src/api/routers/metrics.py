@@ -0,0 +1,22 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from src.dependency_container import DependencyContainer
+from src.services.gateway_metrics import GatewayMetrics
+
+router = APIRouter()
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+@inject
+async def metrics(
+    gateway_metrics: GatewayMetrics = Depends(Provide[DependencyContainer.gateway_metrics]),
+):
+    if gateway_metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    return PlainTextResponse(await gateway_metrics.render(), media_type=METRICS_CONTENT_TYPE)
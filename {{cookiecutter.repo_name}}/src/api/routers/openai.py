@@ -1,20 +1,41 @@
+import json
 import logging
-
-import requests
-from urllib.parse import urlparse
+from time import perf_counter
 
 from dependency_injector.wiring import inject, Provide
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
 
+from src.core.model.backend_pool import BackendPool
+from src.core.model.deadline import Deadline
+from src.core.model.upstream_request import UpstreamRequest
 from src.dependency_container import DependencyContainer
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.backend_capacity import estimate_cost
 from src.services.circuit_breaker_service import CircuitBreakerService
+from src.services.forwarding_service import ForwardingService
+from src.services.priority_service import PriorityService
+from src.services.request_coalescing_service import RequestCoalescingService
+from src.services.response_cache_service import (
+    CACHE_STATUS_HEADER,
+    ResponseCacheService,
+    is_bypassed,
+)
+from src.services.tenant_quota_service import TenantQuotaService
+from src.services.usage_accounting_service import get_usage, UsageScanner
 from src.settings import Settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Client headers that are passed through to the backends. Prompt flow sends a large number of headers,
+# causing the downstream to return an error, so all others are dropped.
+FORWARDED_HEADERS = ["accept", "content-type", "accept-encoding"]
+# Client header with the seconds the gateway may take to respond, overriding the default request timeout
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"
+
 
 @router.get("/openai/{path:path}")
 @router.post("/openai/{path:path}")
@@ -26,77 +47,215 @@ async def openai(
     circuit_breaker_service: CircuitBreakerService = Depends(
         Provide[DependencyContainer.circuit_breaker_service]
     ),
+    forwarding_service: ForwardingService = Depends(
+        Provide[DependencyContainer.forwarding_service]
+    ),
+    backend_pool: BackendPool = Depends(Provide[DependencyContainer.backend_pool]),
+    response_cache_service: ResponseCacheService = Depends(
+        Provide[DependencyContainer.response_cache_service]
+    ),
+    request_coalescing_service: RequestCoalescingService = Depends(
+        Provide[DependencyContainer.request_coalescing_service]
+    ),
+    priority_service: PriorityService = Depends(
+        Provide[DependencyContainer.priority_service]
+    ),
+    tenant_quota_service: TenantQuotaService = Depends(
+        Provide[DependencyContainer.tenant_quota_service]
+    ),
     settings: Settings = Depends(Provide[DependencyContainer.settings]),
 ):
-    downstream_response = await circuit_breaker_service.execute(
-        "openai",
-        function=lambda: forward_request(
-            settings.primary_open_ai_host,
-            settings.primary_open_ai_api_key.get_secret_value(),
-            request.url.path,
-            request,
-        ),
-        fallback_function=lambda: forward_request(
-            settings.fallback_open_ai_host,
-            settings.fallback_open_ai_api_key.get_secret_value(),
-            request.url.path,
-            request,
-            False,
-        ),
+    started = perf_counter()
+    deadline = create_deadline(request, settings)
+    priority = priority_service.classify(request.headers)
+    upstream_request = await create_upstream_request(request)
+    upstream_request.tenant, authenticated = tenant_quota_service.identify(request.headers)
+    # Over-quota requests are refused before they reach the cache or a backend
+    reservation = (
+        tenant_quota_service.reserve(upstream_request.tenant, upstream_request.cost, authenticated)
+        if tenant_quota_service.enabled
+        else None
     )
+    cache_key = None
+    cache_status = None
+
+    if response_cache_service.enabled:
+        if is_bypassed(request.headers.get("cache-control")):
+            cache_status = "BYPASS"
+        else:
+            cache_key = response_cache_service.create_key(upstream_request)
+
+    if cache_key is not None:
+        cached_response = response_cache_service.get(cache_key)
+
+        if cached_response is not None:
+            tenant_quota_service.reconcile(reservation, 0)
+            return Response(
+                cached_response.content,
+                status_code=cached_response.status_code,
+                headers={**cached_response.headers, CACHE_STATUS_HEADER: "HIT"},
+            )
+
+        cache_status = "MISS"
+
+    coalescing_key = (
+        request_coalescing_service.create_key(upstream_request)
+        if request_coalescing_service.enabled
+        else None
+    )
+
+    downstream_response = await request_coalescing_service.execute(
+        coalescing_key,
+        circuit_breaker_service.execute_pool,
+        backend_pool,
+        forwarding_service.forward,
+        forwarding_service.forward_to_fallback,
+        upstream_request,
+        cost=upstream_request.cost,
+        hedge_function=forwarding_service.hedge_to_fallback,
+        deadline=deadline,
+        priority=priority,
+    )
+    # Streamed responses count up to their first chunk, like the latencies of the backends
+    priority_service.record(priority, perf_counter() - started)
+
+    if upstream_request.stream:
+        chunks = pass_through(downstream_response)
+
+        if reservation is not None:
+            chunks = reconcile_stream(chunks, tenant_quota_service, reservation)
+
+        return StreamingResponse(
+            chunks,
+            status_code=downstream_response.status_code,
+            headers=downstream_response.headers,
+        )
+
+    tenant_quota_service.reconcile(reservation, count_used_tokens(downstream_response))
+
+    if cache_key is not None:
+        response_cache_service.put(
+            cache_key,
+            downstream_response.status_code,
+            downstream_response.headers,
+            downstream_response.content,
+        )
+
+    headers = downstream_response.headers
+
+    if cache_status is not None:
+        headers = headers.copy()
+        headers[CACHE_STATUS_HEADER] = cache_status
 
     return Response(
         downstream_response.content,
         status_code=downstream_response.status_code,
-        headers=downstream_response.headers,
+        headers=headers,
     )
 
 
-async def forward_request(
-    openai_host, api_key, path, forwarding_request, check_status_code=True
-):
-    parsed_host = urlparse(openai_host)
-    url = f"{parsed_host.geturl()}{path}"
-    params = dict(forwarding_request.query_params)
-    method = forwarding_request.method
-    data = await forwarding_request.body()
-
-    # Override headers. Prompt flow sends a large number of headers, causing the downstream to return an error.
-    headers = {
-        "host": parsed_host.hostname,
-        "accept": forwarding_request.headers.get("accept"),
-        "content-type": forwarding_request.headers.get("content-type"),
-        "accept-encoding": forwarding_request.headers.get("accept-encoding"),
-        "api-key": api_key,
-    }
-
-    logger.info(
-        f"Making request to url: '{url}' \nParams: {params}\nMethod: {method}\nBody: {data} "
-    )
+async def create_upstream_request(request: Request):
+    body = await request.body()
+    query = request.url.query
+    target = f"{request.url.path}?{query}" if query else request.url.path
+    request_headers = request.headers
+    headers = [
+        (header, request_headers[header])
+        for header in FORWARDED_HEADERS
+        if header in request_headers
+    ]
 
-    downstream_response = requests.request(
-        method,
-        url,
-        headers=headers,
-        data=data,
-        params=params,
+    upstream_request = UpstreamRequest(request.method, target, body, headers)
+    upstream_request.stream = is_stream_request(upstream_request)
+    # Requests that had to be decoded for the stream flag are not searched for their max_tokens again
+    upstream_request.cost = estimate_cost(
+        body, upstream_request.json_body if upstream_request.decoded else None
     )
+    return upstream_request
 
-    logger.info(
-        f"Got response status: {downstream_response.status_code}\nBody: {downstream_response.content}"
+
+def create_deadline(request: Request, settings: Settings):
+    """
+    Returns the deadline of the request, starting now. The budget is taken from the request timeout header if
+    the client sent one, capped at the maximum request timeout.
+    """
+    budget = settings.request_timeout
+    header = request.headers.get(REQUEST_TIMEOUT_HEADER)
+
+    if header is not None:
+        try:
+            budget = float(header)
+        except ValueError:
+            budget = 0
+
+        if not budget > 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{REQUEST_TIMEOUT_HEADER} must be a positive number of seconds",
+            )
+
+    return Deadline(
+        min(budget, settings.request_max_timeout), settings.fallback_min_timeout
     )
 
-    # Only raise the exception if the main downstream API returns an error, to force the fallback mechanism.
-    # If the fallback API returns an error, return this to the client as-is.
-    if check_status_code and (
-        downstream_response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
-        or downstream_response.status_code >= 500
-    ):
-        raise HTTPException(
-            status_code=downstream_response.status_code,
-            detail=downstream_response.text,
-        )
 
-    # Remove the Connection header before returning the downstream response, as it cannot be returned
-    downstream_response.headers.pop("connection", None)
-    return downstream_response
+def count_used_tokens(response):
+    """
+    Returns the tokens a response reports in its usage. Error responses without usage used none.
+    """
+    usage = get_usage(response)
+    used_tokens = usage.total_tokens if usage is not None else None
+
+    if used_tokens is None and response.status_code >= 400:
+        return 0
+
+    return used_tokens
+
+
+def is_stream_request(upstream_request: UpstreamRequest):
+    # Only decode the body if it can contain the stream flag at all
+    if b'"stream"' not in upstream_request.body:
+        return False
+
+    body = upstream_request.json_body
+    return body is not None and body.get("stream") is True
+
+
+async def pass_through(upstream_stream: UpstreamStream):
+    """
+    Passes the upstream chunks through to the client as they arrive. The status and headers have already been sent
+    at this point, so a failure can no longer fall back. Instead, it is reported to the client as a final error event.
+    """
+    try:
+        async for chunk in upstream_stream:
+            yield chunk
+    except Exception as e:
+        logger.warning("Upstream stream failed after the first byte: %r", e)
+
+        if upstream_stream.headers.get("content-type", "").startswith(
+            "text/event-stream"
+        ):
+            error = {
+                "error": {
+                    "message": "The upstream stream was interrupted",
+                    "type": "upstream_stream_error",
+                }
+            }
+            yield f"data: {json.dumps(error)}\n\n".encode()
+    finally:
+        await upstream_stream.aclose()
+
+
+async def reconcile_stream(chunks, tenant_quota_service: TenantQuotaService, reservation):
+    """
+    Passes the chunks through and settles the quota reservation with the usage of the final event, or keeps the
+    estimate if the stream reported none.
+    """
+    scanner = UsageScanner()
+
+    try:
+        async for chunk in chunks:
+            scanner.feed(chunk)
+            yield chunk
+    finally:
+        tenant_quota_service.reconcile(reservation, scanner.total_tokens)
@@ -0,0 +1,18 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from src.dependency_container import DependencyContainer
+from src.services.priority_service import PriorityService
+
+router = APIRouter()
+
+
+@router.get("/priorities", response_class=JSONResponse)
+@inject
+async def priorities(
+    priority_service: PriorityService = Depends(
+        Provide[DependencyContainer.priority_service]
+    ),
+):
+    return priority_service.statistics()
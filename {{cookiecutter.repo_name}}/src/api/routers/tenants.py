@@ -0,0 +1,18 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from src.dependency_container import DependencyContainer
+from src.services.tenant_quota_service import TenantQuotaService
+
+router = APIRouter()
+
+
+@router.get("/tenants", response_class=JSONResponse)
+@inject
+async def tenants(
+    tenant_quota_service: TenantQuotaService = Depends(
+        Provide[DependencyContainer.tenant_quota_service]
+    ),
+):
+    return tenant_quota_service.statistics()
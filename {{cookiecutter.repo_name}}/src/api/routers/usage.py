@@ -0,0 +1,21 @@
+from dependency_injector.wiring import inject, Provide
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+
+from src.dependency_container import DependencyContainer
+from src.services.usage_accounting_service import UsageAccountingService
+
+router = APIRouter()
+
+
+@router.get("/usage", response_class=JSONResponse)
+@inject
+async def usage(
+    usage_accounting_service: UsageAccountingService = Depends(
+        Provide[DependencyContainer.usage_accounting_service]
+    ),
+):
+    if usage_accounting_service is None:
+        raise HTTPException(status_code=404, detail="Usage accounting is disabled")
+
+    return usage_accounting_service.statistics()
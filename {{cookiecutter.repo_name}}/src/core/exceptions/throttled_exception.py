@@ -0,0 +1,12 @@
+from fastapi import HTTPException
+
+
+class ThrottledException(HTTPException):
+    """
+    Raised when a backend throttles a call. Unlike other failures, it tells how long the backend asks to be left
+    alone: retry_after is the number of seconds from its retry-after headers, or None if it did not send any.
+    """
+
+    def __init__(self, status_code, detail=None, retry_after=None):
+        super().__init__(status_code=status_code, detail=detail)
+        self.retry_after = retry_after
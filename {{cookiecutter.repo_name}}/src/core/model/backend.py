@@ -0,0 +1,33 @@
+from urllib.parse import urlparse
+
+from pydantic import SecretStr
+
+
+class Backend:
+    """
+    Backend class describing an upstream OpenAI host.
+
+    Everything that is static for a backend is computed once, so forwarding a request only has to combine it with
+    the request specific parts.
+
+    It has the following attributes:
+        - identifier: unique id for the backend
+        - host: the configured host of the backend
+        - base_url: url that the forwarded request path is appended to
+        - headers: host and authentication headers sent with every forwarded request
+        - weight: share of the traffic the backend receives relative to the other members of its pool
+    """
+
+    def __init__(self, identifier, host, api_key: SecretStr, weight=1):
+        parsed_host = urlparse(host)
+        self.identifier = identifier
+        self.host = host
+        self.base_url = parsed_host.geturl()
+        self.headers = [
+            ("host", parsed_host.hostname),
+            ("api-key", api_key.get_secret_value()),
+        ]
+        self.weight = weight
+
+    def __str__(self):
+        return f"['identifier': '{self.identifier}', 'host': '{self.host}', 'weight': '{self.weight}']"
@@ -0,0 +1,125 @@
+import logging
+from itertools import count
+from math import gcd
+from time import time
+
+from src.core.model.backend import Backend
+
+
+class BackendPool:
+    """
+    BackendPool class to spread traffic over several backends according to their weights.
+
+    The available backends are laid out in a weighted schedule, so selecting the next backend is a single index
+    into a list. Backends whose circuit opened are taken out of the schedule until their retry time, instead of
+    being skipped on every selection. The schedule is only rebuilt when a backend leaves or rejoins it.
+
+    It has the following attributes:
+        - backends: all members of the pool
+        - available: members that are currently part of the schedule, replaced rather than modified on changes
+        - unavailable: members taken out of the schedule, with the time they may rejoin it
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, backends: list[Backend]):
+        self.backends = list(backends)
+        self.available = list(backends)
+        self.unavailable = {}
+        self._next_retry_at = None
+        self._counter = count()
+        self._schedule = self._create_schedule(self.available)
+
+    def refresh(self):
+        """
+        Lets backends whose retry time has passed rejoin the pool, and returns the available backends.
+        """
+        if self._next_retry_at is not None and time() >= self._next_retry_at:
+            self._rejoin_due_backends()
+
+        return self.available
+
+    def select(self):
+        """
+        Yields the backends to try for a request, in order. The first one follows the weighted schedule, the
+        others are only computed when an earlier backend could not serve the request.
+        """
+        self.refresh()
+        schedule = self._schedule
+
+        if not schedule:
+            return
+
+        first = schedule[next(self._counter) % len(schedule)]
+        yield first
+
+        for backend in self.available:
+            if backend is not first:
+                yield backend
+
+    def mark_unavailable(self, backend: Backend, retry_at):
+        if backend.identifier in self.unavailable:
+            return
+
+        self.logger.info("Removing backend from the pool until %s: %s", retry_at, backend)
+        self.unavailable[backend.identifier] = (backend, retry_at)
+        # Replace the list instead of removing from it, selections in progress keep iterating over the old one
+        self.available = [member for member in self.available if member is not backend]
+        self._next_retry_at = min(retry for _, retry in self.unavailable.values())
+        self._schedule = self._create_schedule(self.available)
+
+    def mark_available(self, backend: Backend):
+        if backend.identifier not in self.unavailable:
+            return
+
+        self.logger.info("Adding backend to the pool: %s", backend)
+        del self.unavailable[backend.identifier]
+        self._rebuild_available()
+
+    def _rejoin_due_backends(self):
+        now = time()
+
+        for identifier, (backend, retry_at) in list(self.unavailable.items()):
+            if retry_at <= now:
+                self.logger.info("Backend may be retried, adding it to the pool: %s", backend)
+                del self.unavailable[identifier]
+
+        self._rebuild_available()
+
+    def _rebuild_available(self):
+        self.available = [
+            backend for backend in self.backends if backend.identifier not in self.unavailable
+        ]
+        self._next_retry_at = (
+            min(retry for _, retry in self.unavailable.values()) if self.unavailable else None
+        )
+        self._schedule = self._create_schedule(self.available)
+
+    @staticmethod
+    def _create_schedule(backends):
+        """
+        Creates a smooth weighted round robin schedule, which interleaves the backends instead of sending
+        a burst of requests to the heaviest one.
+        """
+        if not backends:
+            return []
+
+        divisor = 0
+
+        for backend in backends:
+            divisor = gcd(divisor, backend.weight)
+
+        weights = [backend.weight // divisor for backend in backends]
+        total = sum(weights)
+        current = [0] * len(backends)
+        schedule = []
+
+        for _ in range(total):
+            for index, weight in enumerate(weights):
+                current[index] += weight
+
+            selected = max(range(len(backends)), key=current.__getitem__)
+            current[selected] -= total
+            schedule.append(backends[selected])
+
+        return schedule
@@ -1,18 +1,54 @@
 import logging
+from enum import Enum
 from time import time
 
+from src.core.model.circuit_window import CircuitWindow
+
+
+class CircuitState(Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
 
 class Circuit:
     """
     Circuit class to keep track of a circuit to a specific resource.
 
+    The circuit is a state machine. It starts CLOSED and opens when the failure threshold is reached. Once the
+    retry timeout has passed it becomes HALF_OPEN and admits a bounded number of concurrent probe calls, while
+    all other calls keep going to the fallback. A successful probe closes the circuit, a failed probe opens it
+    again with an exponentially increased retry timeout. A throttled call opens the circuit right away, for the
+    time the backend asked for, without counting as a failure.
+
+    By default the circuit opens after failure_threshold consecutive failures. With a window, it opens once the
+    failure rate or slow call rate of the calls in the window reaches its threshold instead, so interleaved
+    failures and slow but successful calls open the circuit as well.
+
+    Every state transition starts a new generation of the circuit. A call is admitted under the current generation,
+    and its outcome only counts if the circuit is still in that generation when the call ends, see
+    CircuitBreakerRepository.compare_and_set. Outcomes of calls that outlived a transition are ignored, so a call
+    that started before the circuit opened cannot close it, and one that started before it recovered cannot open it.
+
     It has the following attributes:
         - id: unique id for the circuit
         - failure_threshold: maximum concurrent failures until the circuit opens
         - retry_timeout: time in seconds until the circuit is open again.
         - last_failure: time the last failure was recorded.
-        - open: flag set to true if circuit is open.
+        - state: CLOSED, OPEN or HALF_OPEN.
         - failure_count: number of concurrent failures recorded in the circuit.
+        - half_open_max_probes: maximum number of concurrent probe calls while half open.
+        - backoff_multiplier: factor the retry timeout grows with for each consecutive failed probe.
+        - max_retry_timeout: upper bound in seconds for the increased retry timeout.
+        - open_count: number of times the circuit opened since it was last closed.
+        - probes_in_flight: number of probe calls currently admitted while half open.
+        - probe_lease: seconds after the last probe was admitted until probes that never ended, e.g. because their
+          worker process died, no longer block new probes.
+        - probe_started: time the last probe was admitted.
+        - open_until: time a throttled circuit may be retried, None if it opened because of failures.
+        - window: sliding window of call outcomes that decides when the circuit opens, None to count consecutive
+          failures.
+        - generation: number of state transitions of the circuit.
     """
 
     logger = logging.getLogger(__name__)
@@ -25,52 +61,175 @@ class Circuit:
         last_failure=None,
         failure_count=0,
         open=False,
+        half_open_max_probes=1,
+        backoff_multiplier=2,
+        max_retry_timeout=300,
+        window: CircuitWindow = None,
+        probe_lease=120,
     ):
         self.identifier = identifier
         self.failure_threshold = failure_threshold
         self.retry_timeout = retry_timeout
         self.last_failure = last_failure
-        self.open = open
+        self.state = CircuitState.OPEN if open else CircuitState.CLOSED
         self.failure_count = failure_count
+        self.half_open_max_probes = half_open_max_probes
+        self.backoff_multiplier = backoff_multiplier
+        self.max_retry_timeout = max_retry_timeout
+        self.open_count = 1 if open else 0
+        self.probes_in_flight = 0
+        self.probe_lease = probe_lease
+        self.probe_started = None
+        self.open_until = None
+        self.window = window
+        self.generation = 0
+
+    @property
+    def open(self):
+        return self.state is not CircuitState.CLOSED
+
+    @property
+    def current_retry_timeout(self):
+        if self.open_count <= 1:
+            return self.retry_timeout
+
+        return min(
+            self.retry_timeout * self.backoff_multiplier ** (self.open_count - 1),
+            max(self.max_retry_timeout, self.retry_timeout),
+        )
+
+    @property
+    def retry_at(self):
+        """
+        Time the open circuit may be retried, or None if it has no recorded failure.
+        """
+        if self.open_until is not None:
+            return self.open_until
+
+        if self.last_failure is None:
+            return None
+
+        return self.last_failure + self.current_retry_timeout
 
     def reset_circuit(self):
-        self.logger.info(f"Resetting circuit: {self.identifier}")
-        self.open = False
+        # Every successful call resets a closed circuit, only a circuit that closes is a transition worth logging
+        if self.state is not CircuitState.CLOSED:
+            self.logger.info("Resetting circuit: %s", self.identifier)
+            self.generation += 1
+
+        self.state = CircuitState.CLOSED
         self.last_failure = None
         self.failure_count = 0
+        self.open_count = 0
+        self.probes_in_flight = 0
+        self.probe_started = None
+        self.open_until = None
 
     def is_retry_time(self):
-        if self.last_failure is None:
+        retry_at = self.retry_at
+
+        if retry_at is None:
             return False
 
-        return time() - self.last_failure >= self.retry_timeout
+        return time() >= retry_at
 
     def trip(self):
-        self.logger.info(f"Tripping circuit: {self.identifier}")
-        self.open = True
-
-    def handle_successful_call(self):
-        self.reset_circuit()
+        self.logger.info("Tripping circuit: %s", self.identifier)
+        self.generation += 1
+        self.state = CircuitState.OPEN
+        self.open_count += 1
+        self.probes_in_flight = 0
+        self.probe_started = None
+        self.open_until = None
+
+    def half_open(self):
+        self.logger.info("Half opening circuit: %s", self.identifier)
+        self.generation += 1
+        self.state = CircuitState.HALF_OPEN
+        self.probes_in_flight = 0
+        self.probe_started = None
+
+    def handle_successful_call(self, latency=None):
+        if self.window is None:
+            self.reset_circuit()
+        elif self.state is not CircuitState.CLOSED:
+            # A successful probe closes the circuit, the outcomes that opened it no longer count
+            self.window.reset()
+            self.reset_circuit()
+        elif self.window.record(False, latency):
+            # Too many calls were slow
+            self.last_failure = time()
+            self.trip()
 
-    def handle_failed_call(self):
+    def handle_failed_call(self, latency=None):
         self.failure_count += 1
         self.last_failure = time()
 
-        if self.failure_count >= self.failure_threshold:
+        if self.state is CircuitState.HALF_OPEN:
+            # A failed probe opens the circuit again, with a longer retry timeout
+            self.trip()
+        elif self.state is not CircuitState.CLOSED:
+            return
+        elif self.window is not None:
+            if self.window.record(True, latency):
+                self.trip()
+        elif self.failure_count >= self.failure_threshold:
             self.trip()
 
+    def handle_throttled_call(self, retry_after=None):
+        """
+        Opens the circuit for retry_after seconds, or the retry timeout if the backend did not tell, capped at the
+        maximum retry timeout. The failure count and the backoff of the retry timeout are left unchanged.
+        """
+        if retry_after is None:
+            retry_after = self.retry_timeout
+
+        retry_after = min(retry_after, max(self.max_retry_timeout, self.retry_timeout))
+        self.logger.info("Circuit throttled for %ss: %s", retry_after, self.identifier)
+        self.last_failure = time()
+        self.open_until = self.last_failure + retry_after
+        self.generation += 1
+        self.state = CircuitState.OPEN
+        self.probes_in_flight = 0
+        self.probe_started = None
+
+    def handle_abandoned_call(self):
+        """
+        Releases the probe slot of a call that was admitted but ended without an outcome, e.g. when it was cancelled.
+        """
+        if self.state is CircuitState.HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+
     def is_callable(self):
-        if self.is_retry_time():
+        """
+        Checks if a call may go through the circuit. While half open, a positive answer admits the call as one of
+        the probes, so every call admitted must be followed by one of the handle_*_call methods.
+        """
+        if self.state is CircuitState.CLOSED:
             return True
 
-        if self.open:
-            return False
+        if self.state is CircuitState.OPEN:
+            if not self.is_retry_time():
+                return False
+
+            self.half_open()
+
+        if self.probes_in_flight >= self.half_open_max_probes:
+            if self.probe_started is None or time() < self.probe_started + self.probe_lease:
+                return False
+
+            self.logger.warning("Probes of circuit outlived their lease, admitting new probes: %s", self.identifier)
+            self.probes_in_flight = 0
 
+        self.probes_in_flight += 1
+        self.probe_started = time()
         return True
 
     def __str__(self):
         return (
             f"['identifier': '{self.identifier}', 'failure_threshold': '{self.failure_threshold}', "
             f"'retry_timeout': '{self.retry_timeout}', 'last_failure': '{self.last_failure}', "
-            f"'open': '{self.open}', 'failure_count': '{self.failure_count}']"
+            f"'state': '{self.state.value}', 'failure_count': '{self.failure_count}', "
+            f"'open_count': '{self.open_count}', 'probes_in_flight': '{self.probes_in_flight}', "
+            f"'open_until': '{self.open_until}', 'generation': '{self.generation}']"
         )
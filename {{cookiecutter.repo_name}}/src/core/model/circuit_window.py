@@ -0,0 +1,153 @@
+from array import array
+from time import time
+
+
+class CircuitWindow:
+    """
+    Outcomes of the calls through a circuit in a sliding time window, as an alternative to counting consecutive
+    failures. The window is a ring buffer of time buckets, so recording a call and evaluating the window take
+    constant time, and the oldest bucket is dropped as the window slides.
+
+    The circuit should trip once the window holds at least minimum_calls calls and either the share of failed calls
+    reaches failure_rate_threshold, or the share of calls slower than slow_call_duration reaches
+    slow_call_rate_threshold.
+
+    It has the following attributes:
+        - duration: length of the window in seconds.
+        - bucket_count: number of buckets the window is divided into.
+        - failure_rate_threshold: share of failed calls, between 0 and 1, that trips the circuit.
+        - slow_call_duration: seconds after which a call counts as slow, None to not track slow calls.
+        - slow_call_rate_threshold: share of slow calls, between 0 and 1, that trips the circuit.
+        - minimum_calls: number of calls the window must hold before the circuit can trip.
+    """
+
+    __slots__ = (
+        "duration",
+        "bucket_count",
+        "failure_rate_threshold",
+        "slow_call_duration",
+        "slow_call_rate_threshold",
+        "minimum_calls",
+        "_bucket_duration",
+        "_successes",
+        "_failures",
+        "_slow_calls",
+        "_latencies",
+        "_last_epoch",
+        "_calls",
+        "_failed_calls",
+        "_slow_call_count",
+        "_latency",
+    )
+
+    def __init__(
+        self,
+        duration=60.0,
+        bucket_count=10,
+        failure_rate_threshold=0.5,
+        slow_call_duration=None,
+        slow_call_rate_threshold=1.0,
+        minimum_calls=10,
+    ):
+        self.duration = duration
+        self.bucket_count = bucket_count
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self._bucket_duration = duration / bucket_count
+        # Call counts and sum of the latencies per bucket
+        self._successes = array("I", bytes(4 * bucket_count))
+        self._failures = array("I", bytes(4 * bucket_count))
+        self._slow_calls = array("I", bytes(4 * bucket_count))
+        self._latencies = array("d", bytes(8 * bucket_count))
+        self._last_epoch = -1
+        # Totals of all buckets in the window, kept up to date as buckets are recorded and dropped
+        self._calls = 0
+        self._failed_calls = 0
+        self._slow_call_count = 0
+        self._latency = 0.0
+
+    def record(self, failed, latency=None, now=None):
+        """
+        Records the outcome of a call and returns true if the window now asks for the circuit to trip.
+        """
+        index = self._advance(time() if now is None else now)
+        slow = (
+            latency is not None
+            and self.slow_call_duration is not None
+            and latency >= self.slow_call_duration
+        )
+
+        if failed:
+            self._failures[index] += 1
+            self._failed_calls += 1
+        else:
+            self._successes[index] += 1
+
+        if slow:
+            self._slow_calls[index] += 1
+            self._slow_call_count += 1
+
+        if latency is not None:
+            self._latencies[index] += latency
+            self._latency += latency
+
+        self._calls += 1
+        return self.should_trip()
+
+    def should_trip(self):
+        if self._calls == 0 or self._calls < self.minimum_calls:
+            return False
+
+        return (
+            self._failed_calls >= self.failure_rate_threshold * self._calls
+            or (
+                self.slow_call_duration is not None
+                and self._slow_call_count >= self.slow_call_rate_threshold * self._calls
+            )
+        )
+
+    def reset(self):
+        for index in range(self.bucket_count):
+            self._clear(index)
+
+        self._last_epoch = -1
+        self._latency = 0.0
+
+    def statistics(self, now=None) -> dict:
+        self._advance(time() if now is None else now)
+        calls = self._calls
+
+        return {
+            "calls": calls,
+            "failure_rate": self._failed_calls / calls if calls else 0.0,
+            "slow_call_rate": self._slow_call_count / calls if calls else 0.0,
+            "average_latency": self._latency / calls if calls else 0.0,
+        }
+
+    def _advance(self, now):
+        """
+        Drops the buckets that slid out of the window and returns the index of the bucket for the given time.
+        """
+        epoch = int(now // self._bucket_duration)
+
+        if epoch > self._last_epoch:
+            # Only the buckets between the last recorded time slice and this one can hold outdated calls
+            for skipped in range(max(self._last_epoch + 1, epoch - self.bucket_count + 1), epoch + 1):
+                self._clear(skipped % self.bucket_count)
+
+            self._last_epoch = epoch
+
+        # A call from before the window, e.g. after the clock was turned back, counts towards the oldest bucket
+        return max(epoch, self._last_epoch - self.bucket_count + 1) % self.bucket_count
+
+    def _clear(self, index):
+        self._calls -= self._successes[index] + self._failures[index]
+        self._failed_calls -= self._failures[index]
+        self._slow_call_count -= self._slow_calls[index]
+        self._latency -= self._latencies[index]
+        self._successes[index] = 0
+        self._failures[index] = 0
+        self._slow_calls[index] = 0
+        self._latencies[index] = 0.0
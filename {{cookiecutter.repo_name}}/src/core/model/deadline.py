@@ -0,0 +1,37 @@
+from time import monotonic
+
+# Largest share of the budget kept for the fallback, so a short budget still leaves time to try the pool
+MAX_FALLBACK_SHARE = 0.5
+
+
+class Deadline:
+    """
+    Time budget of a request, shared by all its calls to the backends of the pool and the fallback backend. Calls to
+    the pool may only use the budget up to the reserve kept for the fallback, so a hanging backend cannot leave the
+    fallback without time. The reserve is at most half of the budget, and no call runs past the end of the budget.
+
+    It has the following attributes:
+        - expires: monotonic time the budget is used up
+        - fallback_reserve: seconds at the end of the budget that are kept for the fallback
+    """
+
+    __slots__ = ("expires", "fallback_reserve")
+
+    def __init__(self, budget, fallback_reserve=0.0):
+        self.expires = monotonic() + budget
+        self.fallback_reserve = min(fallback_reserve, max(budget, 0) * MAX_FALLBACK_SHARE)
+
+    def remaining(self):
+        return self.expires - monotonic()
+
+    def attempt_timeout(self):
+        """
+        Returns the seconds a call to a backend of the pool may take, zero or less if it must not be made.
+        """
+        return self.remaining() - self.fallback_reserve
+
+    def fallback_timeout(self):
+        """
+        Returns the seconds a call to the fallback backend may take, zero or less if the budget is used up.
+        """
+        return self.remaining()
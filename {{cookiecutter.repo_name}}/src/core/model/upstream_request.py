@@ -0,0 +1,53 @@
+import json
+
+# Marks a body that has not been decoded yet
+UNDECODED = object()
+
+
+class UpstreamRequest:
+    """
+    The parts of an incoming request that are forwarded upstream. It is created once per request and shared by the
+    primary and fallback calls, so the body is read and held only once.
+
+    It has the following attributes:
+        - method: http method of the request
+        - target: path and query string appended to the url of the backend
+        - body: request body as bytes
+        - headers: client headers that are passed through
+        - stream: flag set to true if the client requested a streamed response
+        - cost: estimated number of tokens the request counts against the quota of a backend
+        - tenant: tenant the tokens of the request are accounted to, None if it was not identified
+        - json_body: JSON object in the body, decoded on first use and shared by everything that inspects it
+    """
+
+    __slots__ = ("method", "target", "body", "headers", "stream", "cost", "tenant", "_json_body")
+
+    def __init__(self, method, target, body: bytes, headers, stream=False, cost=0, tenant=None):
+        self.method = method
+        self.target = target
+        self.body = body
+        self.headers = headers
+        self.stream = stream
+        self.cost = cost
+        self.tenant = tenant
+        self._json_body = UNDECODED
+
+    @property
+    def json_body(self):
+        """
+        Returns the JSON object in the body, or None if the body is not a JSON object. The body is decoded once, on
+        first use.
+        """
+        if self._json_body is UNDECODED:
+            try:
+                body = json.loads(self.body)
+            except ValueError:
+                body = None
+
+            self._json_body = body if isinstance(body, dict) else None
+
+        return self._json_body
+
+    @property
+    def decoded(self):
+        return self._json_body is not UNDECODED
@@ -9,18 +9,32 @@ from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
 from src.dependency_container import setup_dependency_container
 from src.api.routers import router as api_router
+from src.core.model.backend_pool import BackendPool
 from src.core.model.circuit import Circuit
+from src.core.model.circuit_window import CircuitWindow
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+from src.infrastructure.logs.log_body import LogBody
+from src.infrastructure.logs.log_pipeline import (
+    install_log_pipeline,
+    LogQueueHandler,
+    SamplingFilter,
+)
 from src.services import CircuitBreakerService
+from src.services.gateway_metrics import GatewayMetrics
 from src.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
 
 async def catch_all_exception_handler(
     request: Request, exception: Exception
 ) -> JSONResponse:
     logger.exception(
-        msg=f"Exception thrown for request: {request.method} - {request.url}",
+        "Exception thrown for request: %s - %s",
+        request.method,
+        request.url,
         exc_info=exception,
     )
     return JSONResponse(
@@ -37,6 +51,21 @@ def setup_application_insights(app, settings: Settings):
     FastAPIInstrumentor.instrument_app(app)
 
 
+def setup_logging(app, settings: Settings):
+    output_handler = logging.StreamHandler()
+    output_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_handler = LogQueueHandler([output_handler], queue_size=settings.log_queue_size)
+    log_handler.addFilter(SamplingFilter(settings.log_sample_rates))
+    LogBody.max_length = settings.log_body_max_length
+
+    # Only the loggers of the gateway go through the pipeline, the server configures its own
+    gateway_logger = logging.getLogger("src")
+    gateway_logger.setLevel(settings.log_level)
+    install_log_pipeline(gateway_logger, log_handler)
+    app.add_event_handler("shutdown", log_handler.stop)
+
+
 def create_app() -> FastAPI:
     """
     Factory method to create a FastAPI instance.
@@ -50,6 +79,8 @@ def create_app() -> FastAPI:
     app = setup_dependency_container(app, packages=["src.api"])
 
     settings = app.container.settings()
+    setup_logging(app, settings)
+
     if settings.app_insights_enabled:
         setup_application_insights(app, settings)
 
@@ -57,15 +88,65 @@ def create_app() -> FastAPI:
 
     app.add_exception_handler(Exception, catch_all_exception_handler)
 
+    upstream_client_pool: UpstreamClientPool = app.container.upstream_client_pool()
+    app.add_event_handler("shutdown", upstream_client_pool.close)
+
+    # Resolve the backends at startup, so their static request data is computed once
+    app.container.forwarding_service()
+
+    gateway_metrics: GatewayMetrics = app.container.gateway_metrics()
+    if gateway_metrics is not None and gateway_metrics.directory is not None:
+        app.add_event_handler("startup", gateway_metrics.directory.start)
+        app.add_event_handler("shutdown", gateway_metrics.directory.stop)
+
+    usage_accounting_service = app.container.usage_accounting_service()
+    if usage_accounting_service is not None:
+        app.add_event_handler("startup", usage_accounting_service.start)
+        app.add_event_handler("shutdown", usage_accounting_service.stop)
+
+    circuit_breaker_repository = app.container.circuit_breaker_repository()
+    app.add_event_handler("startup", circuit_breaker_repository.start)
+    app.add_event_handler("shutdown", circuit_breaker_repository.stop)
+
     circuit_breaker_service: CircuitBreakerService = (
         app.container.circuit_breaker_service()
     )
-    circuit_breaker_service.add_circuit(
-        Circuit(
-            "openai",
-            failure_threshold=settings.circuit_failure_threshold,
-            retry_timeout=settings.circuit_retry_timeout,
+    # Every backend of the pool has its own circuit, identified by the backend name
+    backend_pool: BackendPool = app.container.backend_pool()
+    for backend in backend_pool.backends:
+        circuit_breaker_service.add_circuit(
+            Circuit(
+                backend.identifier,
+                failure_threshold=settings.circuit_failure_threshold,
+                retry_timeout=settings.circuit_retry_timeout,
+                half_open_max_probes=settings.circuit_half_open_max_probes,
+                backoff_multiplier=settings.circuit_backoff_multiplier,
+                max_retry_timeout=settings.circuit_max_retry_timeout,
+                probe_lease=settings.circuit_probe_lease,
+                window=create_circuit_window(settings),
+            )
+        )
+
+    if gateway_metrics is not None:
+        gateway_metrics.watch(
+            circuit_breaker_service,
+            [backend.identifier for backend in backend_pool.backends],
+            app.container.priority_service(),
         )
-    )
 
     return app
+
+
+def create_circuit_window(settings: Settings):
+    if settings.circuit_policy != "window":
+        return None
+
+    return CircuitWindow(
+        duration=settings.circuit_window,
+        bucket_count=settings.circuit_window_buckets,
+        failure_rate_threshold=settings.circuit_failure_rate_threshold,
+        # A slow call duration of 0 turns off the slow call rate
+        slow_call_duration=settings.circuit_slow_call_duration or None,
+        slow_call_rate_threshold=settings.circuit_slow_call_rate_threshold,
+        minimum_calls=settings.circuit_minimum_calls,
+    )
@@ -1,9 +1,118 @@
+import functools
+import json
+
 from dependency_injector import containers, providers
 from src.settings import Settings
+from src.core.model.backend import Backend
+from src.core.model.backend_pool import BackendPool
+from src.infrastructure.caches.lru_response_cache import LruResponseCache
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+from src.infrastructure.metrics.metrics_directory import MetricsDirectory
+from src.infrastructure.metrics.metrics_registry import MetricsRegistry
+from src.services.backend_capacity import BackendCapacityTracker
+from src.services.backend_selector import BackendSelector, LatencyAwareBackendSelector
+from src.services.bulkhead import Bulkhead
+from src.services.concurrency_limiter import GradientLimiter
 from src.services.circuit_breaker_service import CircuitBreakerService
+from src.services.forwarding_service import ForwardingService
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.priority_service import PriorityService
+from src.services.hedging_policy import HedgingPolicy
+from src.services.request_coalescing_service import RequestCoalescingService
+from src.services.response_cache_service import ResponseCacheService
+from src.services.tenant_quota_service import TenantQuotaService
+from src.services.usage_accounting_service import UsageAccountingService
 from src.infrastructure.repositories.in_memory_circuit_breaker_repository import (
     InMemoryCircuitBreakerRepository
 )
+from src.infrastructure.repositories.shared_memory_circuit_breaker_repository import (
+    SharedMemoryCircuitBreakerRepository
+)
+from src.infrastructure.repositories.distributed_circuit_breaker_repository import (
+    DistributedCircuitBreakerRepository
+)
+from src.infrastructure.stores.redis_circuit_store import RedisCircuitStore
+from src.infrastructure.stores.sqlite_circuit_store import SqliteCircuitStore
+
+
+def create_backends(backends_settings):
+    return [
+        Backend(
+            identifier=backend["name"],
+            host=backend["host"],
+            api_key=backend["api_key"],
+            weight=backend["weight"],
+        )
+        for backend in backends_settings
+    ]
+
+
+def create_capacity_tracker(enabled, window):
+    return BackendCapacityTracker(window=window) if enabled else None
+
+
+def create_hedging_policy(enabled, quantile, budget_percent, min_samples):
+    if not enabled:
+        return None
+
+    return HedgingPolicy(
+        quantile=quantile, budget_percent=budget_percent, min_samples=min_samples
+    )
+
+
+def create_bulkhead(
+    enabled,
+    max_concurrency,
+    max_queue_size,
+    max_queue_time,
+    limiter,
+    initial_limit,
+    min_limit,
+    latency_tolerance,
+    backoff_ratio,
+    weights,
+):
+    if not enabled:
+        return None
+
+    create_limiter = None
+
+    if limiter == "gradient":
+        create_limiter = functools.partial(
+            GradientLimiter,
+            initial_limit=initial_limit,
+            min_limit=min_limit,
+            max_limit=max_concurrency,
+            tolerance=latency_tolerance,
+            backoff_ratio=backoff_ratio,
+        )
+
+    return Bulkhead(
+        max_concurrency=max_concurrency,
+        max_queue_size=max_queue_size,
+        max_queue_time=max_queue_time,
+        create_limiter=create_limiter,
+        weights=weights,
+    )
+
+
+def create_gateway_metrics(enabled, directory, export_interval):
+    if not enabled:
+        return None
+
+    registry = MetricsRegistry()
+
+    return GatewayMetrics(
+        registry,
+        MetricsDirectory(directory, registry, export_interval) if directory else None,
+    )
+
+
+def create_usage_accounting_service(enabled, flush_interval, metrics):
+    if not enabled:
+        return None
+
+    return UsageAccountingService(flush_interval=flush_interval, metrics=metrics)
 
 
 def setup_dependency_container(app, modules=None, packages=None):
@@ -19,10 +128,144 @@ class DependencyContainer(containers.DeclarativeContainer):
     settings = providers.ThreadSafeSingleton(
         Settings
     )
-    circuit_breaker_repository = providers.ThreadSafeSingleton(
-        InMemoryCircuitBreakerRepository
+    circuit_breaker_repository = providers.Selector(
+        settings.provided.circuit_repository,
+        in_memory=providers.ThreadSafeSingleton(InMemoryCircuitBreakerRepository),
+        shared_memory=providers.ThreadSafeSingleton(
+            SharedMemoryCircuitBreakerRepository,
+            name=settings.provided.circuit_shared_memory_name,
+            slots=settings.provided.circuit_shared_memory_slots,
+        ),
+        redis=providers.ThreadSafeSingleton(
+            DistributedCircuitBreakerRepository,
+            store=providers.Factory(
+                RedisCircuitStore,
+                url=settings.provided.circuit_redis_url.get_secret_value.call(),
+            ),
+            sync_interval=settings.provided.circuit_sync_interval,
+        ),
+        sqlite=providers.ThreadSafeSingleton(
+            DistributedCircuitBreakerRepository,
+            store=providers.Factory(
+                SqliteCircuitStore, path=settings.provided.circuit_sqlite_path
+            ),
+            sync_interval=settings.provided.circuit_sync_interval,
+        ),
+    )
+    upstream_client_pool = providers.ThreadSafeSingleton(
+        UpstreamClientPool,
+        max_connections=settings.provided.upstream_max_connections,
+        max_keepalive_connections=settings.provided.upstream_max_keepalive_connections,
+        keepalive_expiry=settings.provided.upstream_keepalive_expiry,
+        http2=settings.provided.upstream_http2_enabled,
+        connect_timeout=settings.provided.upstream_connect_timeout,
+        read_timeout=settings.provided.upstream_read_timeout,
+    )
+    backend_selector = providers.Selector(
+        settings.provided.backend_selector,
+        weighted=providers.ThreadSafeSingleton(BackendSelector),
+        latency=providers.ThreadSafeSingleton(
+            LatencyAwareBackendSelector,
+            decay=settings.provided.backend_latency_decay,
+        ),
+    )
+    backend_capacity_tracker = providers.ThreadSafeSingleton(
+        create_capacity_tracker,
+        enabled=settings.provided.rate_limit_routing_enabled,
+        window=settings.provided.rate_limit_window,
+    )
+    hedging_policy = providers.ThreadSafeSingleton(
+        create_hedging_policy,
+        enabled=settings.provided.hedging_enabled,
+        quantile=settings.provided.hedging_quantile,
+        budget_percent=settings.provided.hedging_budget_percent,
+        min_samples=settings.provided.hedging_min_samples,
+    )
+    bulkhead = providers.ThreadSafeSingleton(
+        create_bulkhead,
+        enabled=settings.provided.bulkhead_enabled,
+        max_concurrency=settings.provided.bulkhead_max_concurrency,
+        max_queue_size=settings.provided.bulkhead_max_queue_size,
+        max_queue_time=settings.provided.bulkhead_max_queue_time,
+        limiter=settings.provided.bulkhead_limiter,
+        initial_limit=settings.provided.bulkhead_initial_limit,
+        min_limit=settings.provided.bulkhead_min_limit,
+        latency_tolerance=settings.provided.bulkhead_latency_tolerance,
+        backoff_ratio=settings.provided.bulkhead_backoff_ratio,
+        weights=settings.provided.priority_classes,
     )
-    circuit_breaker_service = providers.Factory(
+    gateway_metrics = providers.ThreadSafeSingleton(
+        create_gateway_metrics,
+        enabled=settings.provided.metrics_enabled,
+        directory=settings.provided.metrics_directory,
+        export_interval=settings.provided.metrics_export_interval,
+    )
+    usage_accounting_service = providers.ThreadSafeSingleton(
+        create_usage_accounting_service,
+        enabled=settings.provided.usage_accounting_enabled,
+        flush_interval=settings.provided.usage_flush_interval,
+        metrics=gateway_metrics,
+    )
+    circuit_breaker_service = providers.ThreadSafeSingleton(
         CircuitBreakerService,
-        repository=circuit_breaker_repository
+        repository=circuit_breaker_repository,
+        max_attempts=settings.provided.backend_pool_max_attempts,
+        selector=backend_selector,
+        capacity_tracker=backend_capacity_tracker,
+        max_queue_time=settings.provided.rate_limit_max_queue_time,
+        hedging_policy=hedging_policy,
+        bulkhead=bulkhead,
+        metrics=gateway_metrics,
+    )
+    backend_pool = providers.ThreadSafeSingleton(
+        BackendPool,
+        backends=providers.Callable(
+            create_backends, settings.provided.open_ai_backends
+        ),
+    )
+    fallback_backend = providers.ThreadSafeSingleton(
+        Backend,
+        identifier="fallback",
+        host=settings.provided.fallback_open_ai_host,
+        api_key=settings.provided.fallback_open_ai_api_key,
+    )
+    forwarding_service = providers.ThreadSafeSingleton(
+        ForwardingService,
+        upstream_client_pool=upstream_client_pool,
+        fallback_backend=fallback_backend,
+        capacity_tracker=backend_capacity_tracker,
+        metrics=gateway_metrics,
+        usage_accounting_service=usage_accounting_service,
+    )
+    response_cache_service = providers.ThreadSafeSingleton(
+        ResponseCacheService,
+        cache=providers.ThreadSafeSingleton(
+            LruResponseCache,
+            max_bytes=settings.provided.response_cache_max_bytes,
+            ttl=settings.provided.response_cache_ttl,
+        ),
+        enabled=settings.provided.response_cache_enabled,
+    )
+    request_coalescing_service = providers.ThreadSafeSingleton(
+        RequestCoalescingService,
+        enabled=settings.provided.request_coalescing_enabled,
+    )
+    priority_service = providers.ThreadSafeSingleton(
+        PriorityService,
+        weights=settings.provided.priority_classes,
+        default_class=settings.provided.priority_default_class,
+        api_keys=providers.Callable(
+            json.loads, settings.provided.priority_api_keys.get_secret_value.call()
+        ),
+        metrics=gateway_metrics,
+    )
+    tenant_quota_service = providers.ThreadSafeSingleton(
+        TenantQuotaService,
+        enabled=settings.provided.tenant_quotas_enabled,
+        requests_per_minute=settings.provided.tenant_requests_per_minute,
+        tokens_per_minute=settings.provided.tenant_tokens_per_minute,
+        quotas=settings.provided.tenant_quotas,
+        api_keys=providers.Callable(
+            json.loads, settings.provided.tenant_api_keys.get_secret_value.call()
+        ),
     )
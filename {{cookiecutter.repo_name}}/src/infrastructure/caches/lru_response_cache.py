@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from time import monotonic
+
+
+class CachedResponse:
+    """
+    Response kept in the cache.
+
+    It has the following attributes:
+        - status_code: http status code of the response
+        - headers: response headers as a dict
+        - content: response body as bytes
+        - size: number of bytes the response counts against the budget of the cache
+        - expires: monotonic time the response expires
+    """
+
+    __slots__ = ("status_code", "headers", "content", "size", "expires")
+
+    def __init__(self, status_code, headers: dict, content: bytes, expires=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.size = len(content) + sum(len(name) + len(value) for name, value in headers.items())
+        self.expires = expires
+
+
+class LruResponseCache:
+    """
+    In-memory cache of responses with a budget in bytes. Responses expire after ttl seconds, and the least recently
+    used responses are evicted once the cached responses exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._responses = OrderedDict()
+
+    def get(self, key) -> CachedResponse:
+        response = self._responses.get(key)
+
+        if response is None:
+            return None
+
+        if monotonic() >= response.expires:
+            self._remove(key)
+            return None
+
+        self._responses.move_to_end(key)
+        return response
+
+    def put(self, key, response: CachedResponse):
+        if response.size > self.max_bytes:
+            return
+
+        if key in self._responses:
+            self._remove(key)
+
+        response.expires = monotonic() + self.ttl
+        self._responses[key] = response
+        self.size += response.size
+
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._responses)))
+
+    def __len__(self):
+        return len(self._responses)
+
+    def _remove(self, key):
+        self.size -= self._responses.pop(key).size
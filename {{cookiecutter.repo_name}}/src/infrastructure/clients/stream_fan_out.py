@@ -0,0 +1,141 @@
+import asyncio
+from collections import deque
+
+
+class StreamFanOut:
+    """
+    Shares one streamed upstream response with several subscribers. Chunks are read from the upstream once, when the
+    fastest subscriber asks for them, and kept so slower subscribers receive the same chunks in the same order.
+    Once the number of subscribers is known, see expect, a chunk is dropped as soon as every subscriber has read it,
+    so a stream is only buffered as far as the slowest subscriber lags behind. The upstream stream is closed once
+    every subscriber closed its stream.
+    """
+
+    def __init__(self, stream):
+        self.status_code = stream.status_code
+        self.headers = stream.headers
+        self._stream = stream
+        self._iterator = stream.__aiter__()
+        self._chunks = deque()
+        # Index of the first chunk that is still kept
+        self._offset = 0
+        self._done = False
+        self._error = None
+        self._lock = asyncio.Lock()
+        self._subscribers = 0
+        self._positions = {}
+        # Subscribers that are expected but did not subscribe yet, None until the number is known
+        self._pending = None
+        self._closed = False
+
+    def subscribe(self):
+        subscriber = StreamSubscriber(self)
+        self._subscribers += 1
+        self._positions[subscriber] = self._offset
+
+        if self._pending:
+            self._pending -= 1
+
+        return subscriber
+
+    def expect(self, count):
+        """
+        Sets the number of subscribers the stream has in total, including those that subscribed already. Chunks are
+        only dropped from then on, and the upstream stream is closed right away if no subscriber is expected.
+        """
+        self._pending = max(count - self._subscribers, 0)
+        self._close_if_unused()
+
+    def forfeit(self):
+        """
+        Gives up the subscription of an expected subscriber, e.g. because its request was cancelled.
+        """
+        if self._pending:
+            self._pending -= 1
+
+        self._close_if_unused()
+
+    async def _get_chunk(self, subscriber, index):
+        """
+        Returns the chunk at the given index, or None once the upstream stream ended.
+        """
+        while index >= self._offset + len(self._chunks):
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+
+                return None
+
+            async with self._lock:
+                # Another subscriber may have read the chunk while this one waited for the lock
+                if index < self._offset + len(self._chunks) or self._done:
+                    continue
+
+                try:
+                    self._chunks.append(await self._iterator.__anext__())
+                except StopAsyncIteration:
+                    self._done = True
+                except Exception as e:
+                    self._error = e
+                    self._done = True
+
+        chunk = self._chunks[index - self._offset]
+        self._positions[subscriber] = index + 1
+        self._trim()
+        return chunk
+
+    def _trim(self):
+        if self._pending != 0:
+            return
+
+        position = min(self._positions.values(), default=self._offset + len(self._chunks))
+
+        while self._offset < position and self._chunks:
+            self._chunks.popleft()
+            self._offset += 1
+
+    async def _unsubscribe(self, subscriber):
+        self._subscribers -= 1
+        del self._positions[subscriber]
+        self._trim()
+
+        if self._subscribers == 0 and not self._pending:
+            await self._close()
+
+    def _close_if_unused(self):
+        if self._pending == 0 and self._subscribers == 0:
+            asyncio.ensure_future(self._close())
+
+    async def _close(self):
+        if not self._closed:
+            self._closed = True
+            await self._stream.aclose()
+
+
+class StreamSubscriber:
+    """
+    Stream of one subscriber of a StreamFanOut, with the same interface as an UpstreamStream.
+    """
+
+    def __init__(self, fan_out: StreamFanOut):
+        self.status_code = fan_out.status_code
+        self.headers = fan_out.headers
+        self._fan_out = fan_out
+        self._closed = False
+
+    async def __aiter__(self):
+        index = self._fan_out._positions[self]
+
+        while True:
+            chunk = await self._fan_out._get_chunk(self, index)
+
+            if chunk is None:
+                return
+
+            index += 1
+            yield chunk
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            await self._fan_out._unsubscribe(self)
@@ -0,0 +1,76 @@
+import logging
+from urllib.parse import urlparse
+
+import httpx
+
+
+class UpstreamClientPool:
+    """
+    Keeps one long-lived async http client, and thereby one connection pool, per upstream host.
+
+    Connections are kept alive between requests, so only the first request to a host pays
+    for the TCP and TLS handshake. The clients are closed when the application shuts down.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        max_connections=100,
+        max_keepalive_connections=20,
+        keepalive_expiry=30.0,
+        http2=False,
+        connect_timeout=5.0,
+        read_timeout=120.0,
+        transport=None,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise Exception(
+                    "UPSTREAM_HTTP2_ENABLED requires the 'h2' package, install it with 'pip install httpx[http2]'"
+                )
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http2 = http2
+        self._transport = transport
+        self._clients = {}
+
+    def get_client(self, host) -> httpx.AsyncClient:
+        client = self._clients.get(host)
+
+        if client is None:
+            client = self._create_client(host)
+
+        return client
+
+    def _create_client(self, host):
+        parsed_host = urlparse(host)
+        key = f"{parsed_host.scheme}://{parsed_host.netloc}"
+        client = self._clients.get(key)
+
+        if client is None:
+            self.logger.info("Creating upstream client for: %s", key)
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                transport=self._transport,
+            )
+            self._clients[key] = client
+
+        # Also register the client under the host as configured, so later lookups are a single dict access
+        self._clients[host] = client
+        return client
+
+    async def close(self):
+        for client in set(self._clients.values()):
+            await client.aclose()
+
+        self._clients.clear()
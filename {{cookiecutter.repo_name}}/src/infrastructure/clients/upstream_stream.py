@@ -0,0 +1,77 @@
+import httpx
+
+
+class UpstreamStream:
+    """
+    Streamed upstream response of which the status, the headers and the first chunk of the body have been received.
+
+    Receiving the first chunk before handing the stream to the client lets failures before the first byte be
+    handled like any other failed call, while the rest of the body is passed through as it arrives.
+
+    It has the following attributes:
+        - received_bytes: bytes of the body passed through so far
+    """
+
+    def __init__(self, response: httpx.Response, first_chunk: bytes, chunks):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.first_chunk = first_chunk
+        self._chunks = chunks
+        self.received_bytes = len(first_chunk)
+        self._chunk_callbacks = []
+        self._close_callbacks = []
+        self._closed = False
+
+    @classmethod
+    async def open(cls, response: httpx.Response):
+        chunks = response.aiter_bytes()
+
+        try:
+            first_chunk = await anext(chunks, b"")
+        except BaseException:
+            await response.aclose()
+            raise
+
+        return cls(response, first_chunk, chunks)
+
+    async def __aiter__(self):
+        chunk_callbacks = self._chunk_callbacks
+
+        if self.first_chunk:
+            for callback in chunk_callbacks:
+                callback(self.first_chunk)
+
+            yield self.first_chunk
+
+        async for chunk in self._chunks:
+            self.received_bytes += len(chunk)
+
+            for callback in chunk_callbacks:
+                callback(chunk)
+
+            yield chunk
+
+    def add_chunk_callback(self, callback):
+        """
+        Registers a function that is called with every chunk of the body before it is passed on.
+        """
+        self._chunk_callbacks.append(callback)
+
+    def add_close_callback(self, callback):
+        """
+        Registers a function that is called without arguments once the stream is closed.
+        """
+        self._close_callbacks.append(callback)
+
+    async def aclose(self):
+        if self._closed:
+            return
+
+        self._closed = True
+
+        try:
+            await self.response.aclose()
+        finally:
+            for callback in self._close_callbacks:
+                callback()
@@ -0,0 +1,52 @@
+import re
+
+# JSON fields and headers whose values must never reach the logs
+SECRET_FIELD_PATTERN = re.compile(
+    r'("(?:api[-_]?key|authorization|password|secret|token|access_token)"\s*:\s*")[^"]*"',
+    re.IGNORECASE,
+)
+BEARER_TOKEN_PATTERN = re.compile(r"(Bearer\s+)[\w.~+/=-]+", re.IGNORECASE)
+REDACTED = "***"
+
+
+class LogBody:
+    """
+    Request or response body passed to a log call as an argument. It is only turned into text once the record is
+    written, so a log call that is filtered out, sampled out or dropped costs nothing beyond this wrapper. The text
+    is truncated to max_length characters, and secrets in it are redacted.
+
+    It has the following attributes:
+        - body: the body as bytes or text
+        - max_length: characters of the body written to the logs, set once by setup_logging
+    """
+
+    __slots__ = ("body",)
+
+    max_length = 1024
+
+    def __init__(self, body):
+        self.body = body
+
+    def __str__(self):
+        body = self.body or b""
+        size = len(body)
+        # Decode only the part that is written, a prompt can be hundreds of kilobytes
+        text = body[: self.max_length]
+
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", errors="replace")
+
+        text = redact(text)
+
+        if size > self.max_length:
+            return f"{text}... ({size} bytes)"
+
+        return text
+
+
+def redact(text):
+    """
+    Replaces the values of secret JSON fields and bearer tokens in the text.
+    """
+    text = SECRET_FIELD_PATTERN.sub(rf'\g<1>{REDACTED}"', text)
+    return BEARER_TOKEN_PATTERN.sub(rf"\g<1>{REDACTED}", text)
@@ -0,0 +1,110 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from random import random
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through a share of the records below WARNING per category, so chatty loggers on the request path can be
+    thinned out without losing their warnings and errors. A category is a logger name, and applies to its child
+    loggers as well. The rate of the most specific category of a logger is used, 1.0 if there is none.
+    """
+
+    def __init__(self, rates: dict = None):
+        super().__init__()
+        self._rates = rates or {}
+        self._resolved_rates = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        rate = self._resolved_rates.get(record.name)
+
+        if rate is None:
+            rate = self._resolved_rates[record.name] = self._resolve(record.name)
+
+        return rate >= 1.0 or random() < rate
+
+    def _resolve(self, name):
+        while name:
+            if name in self._rates:
+                return self._rates[name]
+
+            name = name.rpartition(".")[0]
+
+        return 1.0
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records to a background thread that formats and writes them, so a log call on the event loop never waits
+    for I/O. The queue is bounded and never blocks. Once it fills up to the overload ratio, the handler is
+    overloaded and drops records below WARNING until the writer has caught up to half of that. If the queue is full,
+    any record is dropped.
+
+    Records are passed on as they are, their message is formatted by the writer. Arguments of a log call must
+    therefore not change after the call, which holds for the strings, numbers and bodies logged on the request path.
+
+    It has the following attributes:
+        - listener: background writer, passing the records to the given handlers
+        - overloaded: whether records below WARNING are dropped
+        - dropped_records: number of records dropped because of overload
+        - started: whether the writer is running
+    """
+
+    def __init__(self, handlers, queue_size=10_000, overload_ratio=0.8):
+        super().__init__(queue.Queue(queue_size))
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.overloaded = False
+        self.dropped_records = 0
+        self.started = False
+        self._overload_size = max(int(queue_size * overload_ratio), 1)
+        self._recover_size = self._overload_size // 2
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            self.listener.start()
+
+    def stop(self):
+        """
+        Writes the records in the queue and stops the writer.
+        """
+        if self.started:
+            self.started = False
+            self.listener.stop()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        size = self.queue.qsize()
+
+        if self.overloaded:
+            self.overloaded = size > self._recover_size
+        else:
+            self.overloaded = size >= self._overload_size
+
+        if self.overloaded and record.levelno < logging.WARNING:
+            self.dropped_records += 1
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+
+def install_log_pipeline(logger: logging.Logger, handler: LogQueueHandler):
+    """
+    Replaces the log pipeline of the logger, if it has one, with the given handler and starts its writer.
+    """
+    for installed in list(logger.handlers):
+        if isinstance(installed, LogQueueHandler):
+            logger.removeHandler(installed)
+            installed.stop()
+
+    logger.addHandler(handler)
+    handler.start()
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from src.infrastructure.metrics.metrics_registry import merge_snapshots, MetricsRegistry
+
+# Snapshot of the counters and histograms of the workers that exited
+EXITED_FILE = "exited.json"
+LOCK_FILE = ".lock"
+
+
+class MetricsDirectory:
+    """
+    Shares the metrics of the worker processes on a node through a directory, so a scrape of any worker returns
+    the metrics of all of them. Every worker writes a snapshot of its registry to a file named after its process
+    id every export_interval seconds, and right before it answers a scrape.
+
+    The counters and histograms of workers that exited are folded into one file when the metrics are collected,
+    so their totals do not go back when a worker is replaced. Their gauges are dropped. The first worker of a new
+    run of the service, which finds no snapshot of a live worker, clears the snapshots of the previous run. The
+    server process that starts the workers does not load the application, so it cannot clear them itself.
+
+    Snapshots are taken on the event loop, as the collectors read the state of the services, while the files are
+    read and written in the default executor.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, path, registry: MetricsRegistry, export_interval=5.0):
+        self.path = path
+        self._registry = registry
+        self._export_interval = export_interval
+        self._thread_lock = threading.Lock()
+        self._task = None
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+
+        with self._locked():
+            self._clear_previous_run()
+            # A worker that starts next must find this one alive
+            self._write(self._registry.snapshot())
+
+        self._task = asyncio.get_running_loop().create_task(self._export_periodically())
+
+    def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+        # Keep the final totals of this worker for the other workers
+        self._write(self._registry.snapshot())
+
+    async def export(self):
+        snapshot = self._registry.snapshot()
+        await asyncio.get_running_loop().run_in_executor(None, self._write, snapshot)
+
+    async def collect(self) -> dict:
+        """
+        Returns the merged metrics of all workers, including a fresh snapshot of this one.
+        """
+        snapshot = self._registry.snapshot()
+        return await asyncio.get_running_loop().run_in_executor(None, self._collect, snapshot)
+
+    def _collect(self, snapshot) -> dict:
+        self._write(snapshot)
+
+        with self._locked():
+            snapshots = []
+            exited = []
+            exited_snapshot = None
+
+            for name, worker_snapshot in self._read_snapshots():
+                if name == EXITED_FILE:
+                    exited_snapshot = worker_snapshot
+                elif _is_alive(worker_snapshot["pid"]):
+                    snapshots.append(worker_snapshot)
+                else:
+                    exited.append((name, worker_snapshot))
+
+            if exited:
+                exited_snapshot = self._fold_exited(exited, exited_snapshot)
+
+        if exited_snapshot is not None:
+            snapshots.append(exited_snapshot)
+
+        return merge_snapshots(snapshots)
+
+    def _fold_exited(self, exited, exited_snapshot) -> dict:
+        """
+        Adds the counters and histograms of the exited workers to the exited file and removes their snapshots.
+        Returns the new snapshot of the exited file.
+        """
+        snapshots = [_without_gauges(snapshot) for _, snapshot in exited]
+
+        if exited_snapshot is not None:
+            snapshots.append(exited_snapshot)
+
+        folded = _to_snapshot(merge_snapshots(snapshots))
+        _write_atomically(os.path.join(self.path, EXITED_FILE), folded)
+
+        for name, _ in exited:
+            os.remove(os.path.join(self.path, name))
+
+        return folded
+
+    def _clear_previous_run(self):
+        own_file = f"{os.getpid()}.json"
+        snapshots = self._read_snapshots()
+
+        if any(
+            name != EXITED_FILE and name != own_file and _is_alive(snapshot["pid"])
+            for name, snapshot in snapshots
+        ):
+            return
+
+        if snapshots:
+            self.logger.info("Clearing metrics of the previous run of the service from %s", self.path)
+
+        for name, _ in snapshots:
+            os.remove(os.path.join(self.path, name))
+
+    def _read_snapshots(self):
+        snapshots = []
+
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+
+            try:
+                with open(os.path.join(self.path, name)) as file:
+                    snapshots.append((name, json.load(file)))
+            except FileNotFoundError:
+                # Folded by another worker in the meantime
+                continue
+            except (OSError, ValueError) as e:
+                self.logger.warning("Failed to read metrics of a worker from %s: %s", name, e)
+
+        return snapshots
+
+    def _write(self, snapshot):
+        _write_atomically(os.path.join(self.path, f"{snapshot['pid']}.json"), snapshot)
+
+    def _locked(self):
+        return _DirectoryLock(self._thread_lock, os.path.join(self.path, LOCK_FILE))
+
+    async def _export_periodically(self):
+        while True:
+            await asyncio.sleep(self._export_interval)
+
+            try:
+                await self.export()
+            except OSError as e:
+                self.logger.warning("Failed to export metrics, retrying later: %s", e)
+
+
+def _write_atomically(path, snapshot):
+    temporary_path = f"{path}.tmp"
+
+    # Readers must never see a partially written file
+    with open(temporary_path, "w") as file:
+        json.dump(snapshot, file)
+
+    os.replace(temporary_path, path)
+
+
+def _without_gauges(snapshot) -> dict:
+    return {
+        **snapshot,
+        "metrics": {
+            name: metric for name, metric in snapshot["metrics"].items() if metric["type"] != "gauge"
+        },
+    }
+
+
+def _to_snapshot(metrics: dict) -> dict:
+    """
+    Returns merged metrics in the form of a snapshot, so they can be merged again.
+    """
+    return {
+        "pid": None,
+        "metrics": {
+            name: {
+                **{key: value for key, value in metric.items() if key != "values"},
+                "samples": [[list(label_values), value] for label_values, value in metric["values"].items()],
+            }
+            for name, metric in metrics.items()
+        },
+    }
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class _DirectoryLock:
+    """
+    Serializes the workers, and the threads within a worker, that fold or clear the snapshots of the directory.
+    """
+
+    def __init__(self, thread_lock, path):
+        self._thread_lock = thread_lock
+        self._path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+
+        if fcntl is not None:
+            self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+        self._thread_lock.release()
@@ -0,0 +1,229 @@
+import math
+import os
+from bisect import bisect_left
+
+# Upper bounds in seconds of the latency buckets, from a cached response to a long completion
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Metric:
+    """
+    Metric family with a value per combination of label values. Label values are passed as a tuple in the order
+    of the label names, so an update is a single dict operation without any lock. Metrics are only updated from
+    the event loop.
+
+    It has the following attributes:
+        - name: name of the metric
+        - help: description of the metric
+        - label_names: names of the labels
+        - aggregation: how the values of multiple workers are combined, "sum" or "max"
+        - values: value per tuple of label values
+    """
+
+    type = "untyped"
+
+    __slots__ = ("name", "help", "label_names", "aggregation", "values")
+
+    def __init__(self, name, help, label_names=(), aggregation="sum"):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.aggregation = aggregation
+        self.values = {}
+
+    def set(self, label_values=(), value=0.0):
+        self.values[label_values] = value
+
+    def samples(self):
+        return [[list(label_values), value] for label_values, value in list(self.values.items())]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    __slots__ = ()
+
+    def inc(self, label_values=(), amount=1):
+        values = self.values
+        values[label_values] = values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    __slots__ = ()
+
+    def inc(self, label_values=(), amount=1):
+        values = self.values
+        values[label_values] = values.get(label_values, 0) + amount
+
+    def dec(self, label_values=(), amount=1):
+        values = self.values
+        values[label_values] = values.get(label_values, 0) - amount
+
+
+class Histogram(Metric):
+    """
+    Histogram of observed values. The value per tuple of label values is a list of the number of observations per
+    bucket, not cumulated, followed by the sum of the observations.
+    """
+
+    type = "histogram"
+
+    __slots__ = ("buckets",)
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, label_values, value):
+        counts = self.values.get(label_values)
+
+        if counts is None:
+            # One count per bucket, one for +Inf and the sum
+            counts = self.values[label_values] = [0] * (len(self.buckets) + 2)
+
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        return [[list(label_values), list(counts)] for label_values, counts in list(self.values.items())]
+
+
+class MetricsRegistry:
+    """
+    Metrics of a worker process. A snapshot of all metrics can be merged with the snapshots of other workers and
+    rendered in the Prometheus text format. Collectors are called before every snapshot, to set the metrics that
+    are read from other components, e.g. the state of the circuits, instead of being updated on every request.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, help, label_names=(), aggregation="sum") -> Counter:
+        return self._register(Counter(name, help, label_names, aggregation))
+
+    def gauge(self, name, help, label_names=(), aggregation="sum") -> Gauge:
+        return self._register(Gauge(name, help, label_names, aggregation))
+
+    def histogram(self, name, help, label_names=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, label_names, buckets))
+
+    def add_collector(self, collector):
+        """
+        Registers a function that is called without arguments before every snapshot.
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        for collector in self._collectors:
+            collector()
+
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                metric.name: {
+                    "type": metric.type,
+                    "help": metric.help,
+                    "label_names": list(metric.label_names),
+                    "aggregation": metric.aggregation,
+                    "buckets": list(getattr(metric, "buckets", ())),
+                    "samples": metric.samples(),
+                }
+                for metric in self._metrics.values()
+            },
+        }
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def merge_snapshots(snapshots) -> dict:
+    """
+    Combines the metrics of the snapshots of multiple workers into one, by their aggregation. Histograms are
+    summed bucket by bucket.
+    """
+    merged = {}
+
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            target = merged.get(name)
+
+            if target is None:
+                target = merged[name] = {key: metric[key] for key in metric if key != "samples"}
+                target["values"] = {}
+
+            values = target["values"]
+
+            for label_values, value in metric["samples"]:
+                key = tuple(label_values)
+                current = values.get(key)
+
+                if current is None:
+                    values[key] = value
+                elif metric["type"] == "histogram":
+                    values[key] = [a + b for a, b in zip(current, value)]
+                elif metric["aggregation"] == "max":
+                    values[key] = max(current, value)
+                else:
+                    values[key] = current + value
+
+    return merged
+
+
+def render(metrics: dict) -> str:
+    """
+    Returns merged metrics in the Prometheus text exposition format.
+    """
+    lines = []
+
+    for name, metric in metrics.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        label_names = metric["label_names"]
+
+        for label_values, value in metric["values"].items():
+            labels = _format_labels(label_names, label_values)
+
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_wrap(labels)} {_format_value(value)}")
+                continue
+
+            cumulative = 0
+
+            for bound, count in zip([*metric["buckets"], math.inf], value):
+                cumulative += count
+                bucket_labels = f'{labels},le="{_format_value(bound)}"' if labels else f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+
+            lines.append(f"{name}_sum{_wrap(labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_wrap(labels)} {cumulative}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(label_names, label_values):
+    return ",".join(
+        f'{label_name}="{_escape(str(label_value))}"'
+        for label_name, label_value in zip(label_names, label_values)
+    )
+
+
+def _wrap(labels):
+    return f"{{{labels}}}" if labels else ""
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+
+    return repr(float(value))
@@ -14,3 +14,37 @@ class CircuitBreakerRepository(ABC):
     @abstractmethod
     def get(self, circuit_id: str):
         raise NotImplementedError()
+
+    def modify(self, circuit_id: str, operation):
+        """
+        Applies the operation to the stored circuit and returns its result. Repositories that share circuits
+        between processes override this to make the read, the operation and the write one atomic update.
+        """
+        circuit = self.get(circuit_id)
+        result = operation(circuit)
+        self.update(circuit)
+        return result
+
+    def compare_and_set(self, circuit_id: str, generation, operation):
+        """
+        Applies the operation to the stored circuit only if the circuit is still in the given generation, as one
+        atomic update. Returns whether the operation was applied, and its result.
+        """
+
+        def apply(circuit: Circuit):
+            if circuit.generation != generation:
+                return False, None
+
+            return True, operation(circuit)
+
+        return self.modify(circuit_id, apply)
+
+    def start(self):
+        """
+        Called once when the application starts, before requests are served.
+        """
+
+    def stop(self):
+        """
+        Called once when the application shuts down.
+        """
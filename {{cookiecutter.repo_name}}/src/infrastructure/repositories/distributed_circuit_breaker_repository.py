@@ -0,0 +1,167 @@
+import logging
+import math
+import threading
+
+from src.core.model.circuit import Circuit, CircuitState
+from src.infrastructure.repositories.circuit_breaker_repository import (
+    CircuitBreakerRepository,
+)
+from src.infrastructure.stores.circuit_store import CircuitDelta, CircuitStore
+
+
+class DistributedCircuitBreakerRepository(CircuitBreakerRepository):
+    """
+    Repository that shares circuits between gateway nodes through a circuit store, without putting the store on
+    the request path.
+
+    Reads and updates work on a local snapshot of the circuits. The outcomes recorded locally are collected as
+    deltas and flushed to the store by a background thread (write-behind), which refreshes the snapshot with
+    the merged state of all nodes in the same round trip. The store is synchronized every sync_interval seconds,
+    or as soon as it notifies a change.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, store: CircuitStore, sync_interval=1.0):
+        self._store = store
+        self._sync_interval = sync_interval
+        self._circuits = {}
+        self._deltas = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, circuit: Circuit):
+        with self._lock:
+            self._circuits[circuit.identifier] = circuit
+
+    def update(self, circuit: Circuit):
+        """
+        Circuits are shared with the caller, so there is nothing to write locally. Outcomes are only shared with
+        other nodes when they are recorded through modify.
+        """
+
+    def get(self, circuit_id: str):
+        return self._circuits.get(circuit_id)
+
+    def modify(self, circuit_id: str, operation):
+        with self._lock:
+            circuit = self._circuits[circuit_id]
+            last_failure = circuit.last_failure
+            open_until = circuit.open_until
+            result = operation(circuit)
+
+            if circuit.last_failure != last_failure:
+                self._record_outcome(circuit, circuit.open_until != open_until)
+
+            return result
+
+    def _record_outcome(self, circuit: Circuit, throttled):
+        delta = self._deltas.get(circuit.identifier)
+
+        if delta is None:
+            # A circuit with a window decides on this node when it opens, the shared failure count never opens it
+            failure_threshold = circuit.failure_threshold if circuit.window is None else math.inf
+            delta = CircuitDelta(failure_threshold)
+            self._deltas[circuit.identifier] = delta
+
+        if circuit.last_failure is None:
+            delta.record_success()
+        elif throttled and circuit.open_until is not None:
+            delta.record_throttle(circuit.last_failure, circuit.open_until)
+        else:
+            delta.record_failure(
+                circuit.last_failure,
+                circuit.state is CircuitState.OPEN,
+                circuit.open_count,
+            )
+
+    def synchronize(self):
+        """
+        Flushes the recorded outcomes to the store and refreshes the local circuits with the shared state.
+        """
+        with self._lock:
+            deltas = self._deltas
+            self._deltas = {}
+            circuit_ids = list(self._circuits)
+
+        try:
+            records = self._store.synchronize(circuit_ids, deltas)
+        except Exception as e:
+            self.logger.warning("Failed to synchronize circuits, retrying later: %s", e)
+
+            with self._lock:
+                # Keep the outcomes, followed by everything recorded while the flush was running
+                for circuit_id, delta in deltas.items():
+                    later = self._deltas.get(circuit_id)
+                    self._deltas[circuit_id] = delta.combine(later) if later else delta
+
+            return
+
+        with self._lock:
+            for circuit_id, record in records.items():
+                circuit = self._circuits.get(circuit_id)
+
+                # Outcomes recorded during the flush are newer than the record, keep them until the next round
+                if circuit is None or circuit_id in self._deltas:
+                    continue
+
+                self._apply(circuit, record)
+
+    @staticmethod
+    def _apply(circuit: Circuit, record):
+        shared_open = record.state == "OPEN"
+
+        if (
+            circuit.open == shared_open
+            and circuit.failure_count == record.failure_count
+            and circuit.open_count == record.open_count
+            and circuit.last_failure == record.last_failure
+            and circuit.open_until == record.open_until
+        ):
+            # Nothing changed, keep local state such as half open probes
+            return
+
+        state = CircuitState.OPEN if shared_open else CircuitState.CLOSED
+
+        if circuit.state is not state:
+            # Calls admitted before another node changed the state must not record their outcomes
+            circuit.generation += 1
+
+        circuit.state = state
+        circuit.failure_count = record.failure_count
+        circuit.open_count = record.open_count
+        circuit.last_failure = record.last_failure
+        circuit.open_until = record.open_until
+        circuit.probes_in_flight = 0
+
+    def start(self):
+        # Load the shared state once before serving requests
+        self.synchronize()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="circuit-synchronization", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout=self._sync_interval * 2)
+            self._thread = None
+
+        # Flush the last outcomes before shutting down
+        self.synchronize()
+        self._store.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._store.wait_for_change(self._sync_interval, self._stopped)
+            except Exception as e:
+                self.logger.warning("Failed to wait for circuit changes: %s", e)
+                self._stopped.wait(self._sync_interval)
+
+            if not self._stopped.is_set():
+                self.synchronize()
@@ -1,3 +1,5 @@
+import threading
+
 from src.infrastructure.repositories.circuit_breaker_repository import (
     CircuitBreakerRepository,
 )
@@ -7,6 +9,8 @@ from src.core.model.circuit import Circuit
 class InMemoryCircuitBreakerRepository(CircuitBreakerRepository):
     def __init__(self):
         self.store = {}
+        # Serializes modifications by concurrent threads
+        self._lock = threading.Lock()
 
     def add(self, circuit: Circuit):
         self.store[circuit.identifier] = circuit
@@ -22,3 +26,7 @@ class InMemoryCircuitBreakerRepository(CircuitBreakerRepository):
             return self.store[circuit_id]
         else:
             return None
+
+    def modify(self, circuit_id: str, operation):
+        with self._lock:
+            return operation(self.store[circuit_id])
@@ -0,0 +1,257 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from src.core.model.circuit import Circuit, CircuitState
+from src.infrastructure.repositories.circuit_breaker_repository import (
+    CircuitBreakerRepository,
+)
+
+# Segment layout: a header followed by a fixed number of circuit slots.
+HEADER = struct.Struct("<4sII")
+MAGIC = b"GGCB"
+LAYOUT_VERSION = 1
+
+# Slot layout: identifier, state, failure_count, open_count, probes_in_flight, failure_threshold,
+# half_open_max_probes, last_failure, retry_timeout, backoff_multiplier, max_retry_timeout, open_until, generation,
+# probe_lease, probe_started.
+SLOT = struct.Struct("<64sB3xiiiiidddddQdd")
+IDENTIFIER_SIZE = 64
+
+STATES = [CircuitState.CLOSED, CircuitState.OPEN, CircuitState.HALF_OPEN]
+STATE_INDEXES = {state: index for index, state in enumerate(STATES)}
+
+
+def default_shared_memory_directory():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedMemoryCircuitBreakerRepository(CircuitBreakerRepository):
+    """
+    Repository that keeps the circuits in a fixed-layout memory mapped segment, so all worker processes on a node
+    share one circuit state without an external service.
+
+    Every read and write takes an exclusive file lock on the segment, which makes each update atomic across
+    processes. Probes hold a lease, so the probes of a worker that died while half open expire instead of keeping
+    the circuit from being probed, even though the segment outlives the worker. Circuits are returned as
+    snapshots, so changes have to be written back with update or, to apply them atomically, made through modify.
+    Circuit windows are not shared, every process keeps its own window and opens the shared circuit when its
+    window trips.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, name="genai-gateway-circuits", slots=64, directory=None):
+        if fcntl is None:
+            raise Exception(
+                "The shared memory circuit breaker repository requires a POSIX platform"
+            )
+
+        self.path = os.path.join(directory or default_shared_memory_directory(), name)
+        self.slots = slots
+        self.size = HEADER.size + slots * SLOT.size
+        self._indexes = {}
+        self._windows = {}
+        # File locks are held per process, the thread lock serializes threads within this process
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        with self._locked():
+            self._initialize_segment()
+
+        self._memory = mmap.mmap(self._fd, self.size)
+
+    def _initialize_segment(self):
+        if os.fstat(self._fd).st_size == 0:
+            self.logger.info("Creating shared circuit segment: %s", self.path)
+            self._create_segment()
+            return
+
+        magic, version, slots = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+
+        if magic != MAGIC or version != LAYOUT_VERSION or slots != self.slots:
+            raise Exception(
+                f"Shared circuit segment '{self.path}' has an incompatible layout: version {version} with {slots} "
+                f"slots, expected version {LAYOUT_VERSION} with {self.slots} slots"
+            )
+
+    def _create_segment(self):
+        os.ftruncate(self._fd, self.size)
+        os.pwrite(self._fd, HEADER.pack(MAGIC, LAYOUT_VERSION, self.slots), 0)
+
+    def _locked(self):
+        return _SegmentLock(self._thread_lock, self._fd)
+
+    def add(self, circuit: Circuit):
+        if circuit.window is not None:
+            self._windows[circuit.identifier] = circuit.window
+
+        with self._locked():
+            index = self._find(circuit.identifier)
+
+            if index is not None:
+                # Another worker registered the circuit already, keep its state and only refresh the configuration
+                stored = self._read(index)
+                stored.failure_threshold = circuit.failure_threshold
+                stored.retry_timeout = circuit.retry_timeout
+                stored.half_open_max_probes = circuit.half_open_max_probes
+                stored.backoff_multiplier = circuit.backoff_multiplier
+                stored.max_retry_timeout = circuit.max_retry_timeout
+                stored.probe_lease = circuit.probe_lease
+                self._write(index, stored)
+                return
+
+            index = self._find("")
+
+            if index is None:
+                raise Exception(
+                    f"Shared circuit segment '{self.path}' has no free slot for circuit '{circuit.identifier}'"
+                )
+
+            self._write(index, circuit)
+            self._indexes[circuit.identifier] = index
+
+    def update(self, circuit: Circuit):
+        with self._locked():
+            index = self._find(circuit.identifier)
+
+            if index is not None:
+                self._write(index, circuit)
+
+    def get(self, circuit_id: str):
+        with self._locked():
+            index = self._find(circuit_id)
+
+            if index is None:
+                return None
+
+            return self._read(index)
+
+    def modify(self, circuit_id: str, operation):
+        with self._locked():
+            index = self._find(circuit_id)
+
+            if index is None:
+                raise Exception(f"Circuit '{circuit_id}' does not exist")
+
+            circuit = self._read(index)
+            result = operation(circuit)
+            self._write(index, circuit)
+            return result
+
+    def close(self):
+        self._memory.close()
+        os.close(self._fd)
+
+    def _find(self, circuit_id):
+        index = self._indexes.get(circuit_id)
+
+        if index is not None:
+            return index
+
+        encoded_id = _encode_identifier(circuit_id)
+
+        for index in range(self.slots):
+            offset = HEADER.size + index * SLOT.size
+
+            if self._memory[offset:offset + IDENTIFIER_SIZE] == encoded_id:
+                if circuit_id:
+                    self._indexes[circuit_id] = index
+
+                return index
+
+        return None
+
+    def _read(self, index) -> Circuit:
+        (
+            identifier,
+            state,
+            failure_count,
+            open_count,
+            probes_in_flight,
+            failure_threshold,
+            half_open_max_probes,
+            last_failure,
+            retry_timeout,
+            backoff_multiplier,
+            max_retry_timeout,
+            open_until,
+            generation,
+            probe_lease,
+            probe_started,
+        ) = SLOT.unpack_from(self._memory, HEADER.size + index * SLOT.size)
+
+        circuit = Circuit(
+            identifier.rstrip(b"\0").decode("utf-8"),
+            failure_threshold=failure_threshold,
+            retry_timeout=retry_timeout,
+            last_failure=None if math.isnan(last_failure) else last_failure,
+            failure_count=failure_count,
+            half_open_max_probes=half_open_max_probes,
+            backoff_multiplier=backoff_multiplier,
+            max_retry_timeout=max_retry_timeout,
+            probe_lease=probe_lease,
+        )
+        circuit.state = STATES[state]
+        circuit.open_count = open_count
+        circuit.probes_in_flight = probes_in_flight
+        circuit.open_until = None if math.isnan(open_until) else open_until
+        circuit.generation = generation
+        circuit.probe_started = None if math.isnan(probe_started) else probe_started
+        circuit.window = self._windows.get(circuit.identifier)
+        return circuit
+
+    def _write(self, index, circuit: Circuit):
+        SLOT.pack_into(
+            self._memory,
+            HEADER.size + index * SLOT.size,
+            _encode_identifier(circuit.identifier),
+            STATE_INDEXES[circuit.state],
+            circuit.failure_count,
+            circuit.open_count,
+            circuit.probes_in_flight,
+            circuit.failure_threshold,
+            circuit.half_open_max_probes,
+            math.nan if circuit.last_failure is None else circuit.last_failure,
+            circuit.retry_timeout,
+            circuit.backoff_multiplier,
+            circuit.max_retry_timeout,
+            math.nan if circuit.open_until is None else circuit.open_until,
+            circuit.generation,
+            circuit.probe_lease,
+            math.nan if circuit.probe_started is None else circuit.probe_started,
+        )
+
+
+def _encode_identifier(identifier):
+    encoded = identifier.encode("utf-8")
+
+    if len(encoded) > IDENTIFIER_SIZE:
+        raise Exception(
+            f"Circuit identifier '{identifier}' is longer than {IDENTIFIER_SIZE} bytes"
+        )
+
+    return encoded.ljust(IDENTIFIER_SIZE, b"\0")
+
+
+class _SegmentLock:
+    def __init__(self, thread_lock, fd):
+        self._thread_lock = thread_lock
+        self._fd = fd
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
@@ -0,0 +1,155 @@
+import threading
+from abc import ABC, abstractmethod
+
+
+class CircuitRecord:
+    """
+    Circuit state as shared between gateway nodes. Half open is decided locally by every node, so a shared
+    circuit is either CLOSED or OPEN.
+    """
+
+    __slots__ = ("state", "failure_count", "open_count", "last_failure", "open_until")
+
+    def __init__(
+        self, state="CLOSED", failure_count=0, open_count=0, last_failure=None, open_until=None
+    ):
+        self.state = state
+        self.failure_count = failure_count
+        self.open_count = open_count
+        self.last_failure = last_failure
+        self.open_until = open_until
+
+    def __eq__(self, other):
+        return isinstance(other, CircuitRecord) and (
+            self.state,
+            self.failure_count,
+            self.open_count,
+            self.last_failure,
+            self.open_until,
+        ) == (
+            other.state,
+            other.failure_count,
+            other.open_count,
+            other.last_failure,
+            other.open_until,
+        )
+
+
+class CircuitDelta:
+    """
+    Outcomes a node recorded for a circuit since its last flush.
+
+    It has the following attributes:
+        - reset: flag set to true if the circuit was reset by a successful call before the recorded failures.
+        - failures: number of failures recorded after the last reset.
+        - last_failure: time of the last recorded failure.
+        - tripped: flag set to true if the circuit was opened on this node after the last reset.
+        - open_count: number of times the circuit opened, as known by this node.
+        - failure_threshold: failure threshold of the circuit.
+        - open_until: latest time a throttled backend asked to be retried after the last reset.
+    """
+
+    __slots__ = (
+        "reset",
+        "failures",
+        "last_failure",
+        "tripped",
+        "open_count",
+        "failure_threshold",
+        "open_until",
+    )
+
+    def __init__(self, failure_threshold):
+        self.reset = False
+        self.failures = 0
+        self.last_failure = None
+        self.tripped = False
+        self.open_count = 0
+        self.failure_threshold = failure_threshold
+        self.open_until = None
+
+    def record_success(self):
+        self.reset = True
+        self.failures = 0
+        self.last_failure = None
+        self.tripped = False
+        self.open_count = 0
+        self.open_until = None
+
+    def record_failure(self, last_failure, tripped, open_count):
+        self.failures += 1
+        self.last_failure = last_failure
+        self.tripped = self.tripped or tripped
+        self.open_count = open_count
+
+    def record_throttle(self, last_failure, open_until):
+        self.last_failure = last_failure
+        self.open_until = max(self.open_until or 0, open_until)
+
+    def combine(self, later: "CircuitDelta"):
+        """
+        Returns a delta with the outcomes of this delta followed by the outcomes of the later delta.
+        """
+        if later.reset:
+            return later
+
+        self.failures += later.failures
+        self.last_failure = later.last_failure or self.last_failure
+        self.tripped = self.tripped or later.tripped
+        self.open_count = max(self.open_count, later.open_count)
+        self.failure_threshold = later.failure_threshold
+
+        if later.open_until is not None:
+            self.open_until = max(self.open_until or 0, later.open_until)
+
+        return self
+
+
+def merge(record: CircuitRecord, delta: CircuitDelta) -> CircuitRecord:
+    """
+    Merges the outcomes one node recorded into the shared record. A success proves the backend recovered and
+    closes the circuit, failures are added to the shared count and open the circuit once it reaches the threshold.
+    A throttle opens the circuit until the latest time the backend asked to be retried.
+    """
+    if record is None or delta.reset:
+        record = CircuitRecord()
+
+    if delta.failures:
+        record.failure_count += delta.failures
+        record.last_failure = max(record.last_failure or 0, delta.last_failure)
+
+        if delta.tripped or record.failure_count >= delta.failure_threshold:
+            record.state = "OPEN"
+            record.open_count = max(record.open_count, delta.open_count, 1)
+            # Failures open the circuit with the backoff of the retry timeout, not for a throttle window
+            record.open_until = None
+
+    if delta.open_until is not None:
+        record.state = "OPEN"
+        record.open_until = max(record.open_until or 0, delta.open_until)
+        record.last_failure = max(record.last_failure or 0, delta.last_failure)
+
+    return record
+
+
+class CircuitStore(ABC):
+    """
+    Networked or file based storage for circuit records that is shared by several gateway nodes.
+    """
+
+    @abstractmethod
+    def synchronize(self, circuit_ids, deltas) -> dict:
+        """
+        Atomically merges the deltas into the stored records and returns the records of all given circuits.
+        """
+        raise NotImplementedError()
+
+    def wait_for_change(self, timeout, stopped: threading.Event):
+        """
+        Blocks until another node may have changed a record, the timeout in seconds has passed or stopped is set.
+        Stores without change notifications are polled every timeout.
+        """
+        stopped.wait(timeout)
+
+    def close(self):
+        pass
@@ -0,0 +1,89 @@
+import threading
+
+from src.infrastructure.stores.circuit_store import CircuitRecord, CircuitStore, merge
+
+
+class RedisCircuitStore(CircuitStore):
+    """
+    Circuit store in Redis, or any server speaking the Redis protocol. Every record is a hash, merges run in a
+    WATCH/MULTI transaction and every change is announced on a pub/sub channel, so other nodes refresh right away.
+    """
+
+    def __init__(self, client=None, url=None, prefix="genai-gateway:circuit:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise Exception(
+                    "The redis circuit store requires the 'redis' package, install it with 'pip install redis'"
+                )
+
+            client = redis.Redis.from_url(url)
+
+        self._client = client
+        self._prefix = prefix
+        self._channel = f"{prefix}changes"
+        self._pubsub = None
+
+    def synchronize(self, circuit_ids, deltas) -> dict:
+        keys = [self._prefix + circuit_id for circuit_id in circuit_ids]
+
+        def transaction(pipe):
+            records = {}
+
+            for circuit_id, key in zip(circuit_ids, keys):
+                record = self._decode(pipe.hgetall(key))
+
+                if record is not None:
+                    records[circuit_id] = record
+
+            pipe.multi()
+
+            for circuit_id, delta in deltas.items():
+                record = merge(records.get(circuit_id), delta)
+                records[circuit_id] = record
+                pipe.hset(self._prefix + circuit_id, mapping=self._encode(record))
+
+            if deltas:
+                pipe.publish(self._channel, "changed")
+
+            return records
+
+        return self._client.transaction(transaction, *keys, value_from_callable=True)
+
+    def wait_for_change(self, timeout, stopped: threading.Event):
+        if self._pubsub is None:
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self._channel)
+
+        self._pubsub.get_message(timeout=timeout)
+
+    def close(self):
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+        self._client.close()
+
+    @staticmethod
+    def _encode(record: CircuitRecord):
+        return {
+            "state": record.state,
+            "failure_count": record.failure_count,
+            "open_count": record.open_count,
+            "last_failure": "" if record.last_failure is None else repr(record.last_failure),
+            "open_until": "" if record.open_until is None else repr(record.open_until),
+        }
+
+    @staticmethod
+    def _decode(values):
+        if not values:
+            return None
+
+        values = {key.decode(): value.decode() for key, value in values.items()}
+        return CircuitRecord(
+            state=values["state"],
+            failure_count=int(values["failure_count"]),
+            open_count=int(values["open_count"]),
+            last_failure=float(values["last_failure"]) if values["last_failure"] else None,
+            open_until=float(values["open_until"]) if values.get("open_until") else None,
+        )
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+
+from src.infrastructure.stores.circuit_store import CircuitRecord, CircuitStore, merge
+
+
+class SqliteCircuitStore(CircuitStore):
+    """
+    Circuit store in a SQLite database in WAL mode, for nodes that share a volume but have no Redis available.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS circuits ("
+            "identifier TEXT PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "failure_count INTEGER NOT NULL, "
+            "open_count INTEGER NOT NULL, "
+            "last_failure REAL, "
+            "open_until REAL)"
+        )
+
+    def synchronize(self, circuit_ids, deltas) -> dict:
+        with self._lock:
+            cursor = self._connection.cursor()
+            # Take the write lock up front, so the merge is based on the latest records
+            cursor.execute("BEGIN IMMEDIATE" if deltas else "BEGIN")
+
+            try:
+                records = self._read(cursor, circuit_ids)
+
+                for circuit_id, delta in deltas.items():
+                    record = merge(records.get(circuit_id), delta)
+                    records[circuit_id] = record
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO circuits "
+                        "(identifier, state, failure_count, open_count, last_failure, open_until) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            circuit_id,
+                            record.state,
+                            record.failure_count,
+                            record.open_count,
+                            record.last_failure,
+                            record.open_until,
+                        ),
+                    )
+
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+        return records
+
+    def _read(self, cursor, circuit_ids):
+        placeholders = ", ".join("?" for _ in circuit_ids)
+        rows = cursor.execute(
+            "SELECT identifier, state, failure_count, open_count, last_failure, open_until "
+            f"FROM circuits WHERE identifier IN ({placeholders})",
+            list(circuit_ids),
+        )
+
+        return {row[0]: CircuitRecord(*row[1:]) for row in rows}
+
+    def close(self):
+        self._connection.close()
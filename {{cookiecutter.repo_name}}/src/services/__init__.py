@@ -1,4 +1,5 @@
+from .backend_selector import BackendSelector, LatencyAwareBackendSelector
 from .circuit_breaker_service import CircuitBreakerService
 
 
-__all__ = ["CircuitBreakerService"]
+__all__ = ["BackendSelector", "CircuitBreakerService", "LatencyAwareBackendSelector"]
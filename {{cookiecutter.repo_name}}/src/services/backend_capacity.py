@@ -0,0 +1,134 @@
+import re
+from time import time
+
+from src.core.model.backend import Backend
+
+REMAINING_TOKENS_HEADER = "x-ratelimit-remaining-tokens"
+REMAINING_REQUESTS_HEADER = "x-ratelimit-remaining-requests"
+
+# Rough number of bytes per prompt token, good enough to keep a request away from a nearly exhausted quota
+BYTES_PER_TOKEN = 4
+# Completion tokens assumed for requests without max_tokens
+DEFAULT_MAX_TOKENS = 512
+
+MAX_TOKENS_PATTERN = re.compile(rb'"max_tokens"\s*:\s*(\d+)')
+
+
+def estimate_cost(body: bytes, json_body: dict = None):
+    """
+    Estimates the tokens a request counts against the quota of a backend: the prompt, estimated from the size of
+    the body, plus the maximum number of completion tokens. The maximum is taken from the decoded body if it was
+    decoded already, otherwise the body is searched, not decoded.
+    """
+    if json_body is not None:
+        max_tokens = json_body.get("max_tokens")
+
+        if not isinstance(max_tokens, int) or isinstance(max_tokens, bool):
+            max_tokens = DEFAULT_MAX_TOKENS
+    else:
+        match = MAX_TOKENS_PATTERN.search(body)
+        max_tokens = int(match.group(1)) if match else DEFAULT_MAX_TOKENS
+
+    return len(body) // BYTES_PER_TOKEN + max_tokens
+
+
+class BackendCapacity:
+    """
+    Remaining quota of a backend, as last reported by its rate limit headers.
+
+    It has the following attributes:
+        - remaining_tokens: tokens left in the current rate limit window, minus the cost of the calls made since.
+        - remaining_requests: requests left in the current rate limit window, minus the calls made since.
+        - expires: time the window is assumed to have been replenished.
+    """
+
+    __slots__ = ("remaining_tokens", "remaining_requests", "expires")
+
+    def __init__(self, remaining_tokens, remaining_requests, expires):
+        self.remaining_tokens = remaining_tokens
+        self.remaining_requests = remaining_requests
+        self.expires = expires
+
+
+class BackendCapacityTracker:
+    """
+    Tracks the remaining quota of every backend from the x-ratelimit-remaining headers of its responses, so
+    requests can be routed away from a backend before it starts to throttle. A backend that did not report its
+    quota, or whose last report is older than the rate limit window, is assumed to have capacity.
+    """
+
+    def __init__(self, window=60.0):
+        self._window = window
+        self._capacities = {}
+
+    def observe(self, backend: Backend, headers, replenished_in=None):
+        """
+        Records the quota reported by a response. If the backend told when its quota is replenished, e.g. in the
+        retry-after header of a throttled response, that time replaces the rate limit window.
+        """
+        remaining_tokens = _parse_int(headers.get(REMAINING_TOKENS_HEADER))
+        remaining_requests = _parse_int(headers.get(REMAINING_REQUESTS_HEADER))
+
+        if remaining_tokens is None and remaining_requests is None:
+            return
+
+        if replenished_in is None:
+            replenished_in = self._window
+
+        self._capacities[backend.identifier] = BackendCapacity(
+            remaining_tokens, remaining_requests, time() + replenished_in
+        )
+
+    def reserve(self, backend: Backend, cost):
+        """
+        Returns true and subtracts the cost from the remaining quota if the backend can serve a request of the
+        given cost, otherwise returns false.
+        """
+        capacity = self._capacities.get(backend.identifier)
+
+        if capacity is None:
+            return True
+
+        if time() >= capacity.expires:
+            del self._capacities[backend.identifier]
+            return True
+
+        if (capacity.remaining_requests is not None and capacity.remaining_requests < 1) or (
+            capacity.remaining_tokens is not None and capacity.remaining_tokens < cost
+        ):
+            return False
+
+        if capacity.remaining_requests is not None:
+            capacity.remaining_requests -= 1
+
+        if capacity.remaining_tokens is not None:
+            capacity.remaining_tokens -= cost
+
+        return True
+
+    def replenished_at(self, backend: Backend):
+        """
+        Returns the time the quota of the backend is assumed to be replenished, or None if it is not tracked.
+        """
+        capacity = self._capacities.get(backend.identifier)
+        return capacity.expires if capacity is not None else None
+
+    def capacities(self) -> dict:
+        return {
+            identifier: {
+                "remaining_tokens": capacity.remaining_tokens,
+                "remaining_requests": capacity.remaining_requests,
+                "expires": capacity.expires,
+            }
+            for identifier, capacity in self._capacities.items()
+        }
+
+
+def _parse_int(value):
+    if value is None:
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        return None
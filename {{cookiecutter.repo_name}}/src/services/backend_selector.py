@@ -0,0 +1,143 @@
+import random
+from math import exp
+from time import perf_counter
+
+from src.core.model.backend import Backend
+from src.core.model.backend_pool import BackendPool
+
+
+class BackendSelector:
+    """
+    Decides which backends of a pool a request is sent to. The circuit breaker service reports the start and the
+    completion of every call, so selectors can take the observed behaviour of the backends into account.
+
+    The default selector follows the weighted schedule of the pool.
+    """
+
+    name = "weighted"
+
+    def select(self, pool: BackendPool):
+        """
+        Yields the backends to try for a request, in order.
+        """
+        return pool.select()
+
+    def start(self, backend: Backend):
+        pass
+
+    def complete(self, backend: Backend, latency=None):
+        """
+        Records the end of a call. The latency in seconds is None if the call failed or was cancelled.
+        """
+
+    def scores(self, pool: BackendPool) -> dict:
+        return {
+            backend.identifier: {
+                "weight": backend.weight,
+                "available": backend in pool.available,
+            }
+            for backend in pool.backends
+        }
+
+
+class BackendStatistics:
+    """
+    Latency statistics of a backend.
+
+    It has the following attributes:
+        - latency: exponentially weighted moving average of the latency in seconds, decaying over time.
+        - in_flight: number of calls currently sent to the backend.
+        - updated: time of the last latency observation.
+    """
+
+    __slots__ = ("latency", "in_flight", "updated")
+
+    def __init__(self):
+        self.latency = 0.0
+        self.in_flight = 0
+        self.updated = None
+
+
+class LatencyAwareBackendSelector(BackendSelector):
+    """
+    Selector that prefers fast backends with few calls in flight. For every request it compares two random
+    available backends by their cost, the latency average multiplied by the calls in flight and divided by the
+    weight, and picks the cheaper one (power of two choices). Slow backends keep receiving some traffic, so their
+    average follows when they recover.
+
+    The latency average decays with a time constant of decay seconds, so old observations lose their influence
+    even if a backend receives few calls.
+    """
+
+    name = "latency"
+
+    def __init__(self, decay=10.0, random_generator=None):
+        self._decay = decay
+        self._random = random_generator or random.Random()
+        self._statistics = {}
+
+    def select(self, pool: BackendPool):
+        available = pool.refresh()
+
+        if not available:
+            return
+
+        if len(available) == 1:
+            first = available[0]
+        else:
+            first, second = self._random.sample(available, 2)
+
+            if self._cost(second) < self._cost(first):
+                first = second
+
+        yield first
+
+        for backend in available:
+            if backend is not first:
+                yield backend
+
+    def start(self, backend: Backend):
+        self._get_statistics(backend).in_flight += 1
+
+    def complete(self, backend: Backend, latency=None):
+        statistics = self._get_statistics(backend)
+        statistics.in_flight -= 1
+
+        if latency is None:
+            return
+
+        now = perf_counter()
+
+        if statistics.updated is None:
+            statistics.latency = latency
+        else:
+            weight = exp(-(now - statistics.updated) / self._decay)
+            statistics.latency = statistics.latency * weight + latency * (1 - weight)
+
+        statistics.updated = now
+
+    def scores(self, pool: BackendPool) -> dict:
+        scores = super().scores(pool)
+
+        for backend in pool.backends:
+            statistics = self._get_statistics(backend)
+            scores[backend.identifier].update(
+                latency=statistics.latency,
+                in_flight=statistics.in_flight,
+                cost=self._cost(backend),
+            )
+
+        return scores
+
+    def _cost(self, backend: Backend):
+        statistics = self._get_statistics(backend)
+        return statistics.latency * (statistics.in_flight + 1) / backend.weight
+
+    def _get_statistics(self, backend: Backend) -> BackendStatistics:
+        statistics = self._statistics.get(backend.identifier)
+
+        if statistics is None:
+            statistics = BackendStatistics()
+            self._statistics[backend.identifier] = statistics
+
+        return statistics
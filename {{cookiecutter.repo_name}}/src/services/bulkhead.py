@@ -0,0 +1,266 @@
+import asyncio
+import heapq
+import itertools
+import math
+from time import monotonic
+
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.concurrency_limiter import StaticLimiter
+
+# Compartment of the calls to the fallback backend, which is not part of the pool
+FALLBACK = "fallback"
+
+
+class Compartment:
+    """
+    Calls of one backend that are in flight or waiting for a slot.
+
+    It has the following attributes:
+        - limiter: limit of the calls in flight
+        - in_flight: number of calls holding a slot
+        - queue: heap of the calls waiting for a slot, as [finish tag, sequence number, future, weight] lists
+        - virtual_time: finish tag of the call that got a slot last
+        - finish_tags: finish tag of the call that was queued last, per priority class
+        - queued_calls: number of calls that had to wait for a slot
+        - rejected_calls: number of calls refused because the queue was full
+        - evicted_calls: number of waiting calls that made room for a call of a higher priority class
+        - timed_out_calls: number of calls that gave up waiting for a slot
+        - waited_calls: number of calls that got a slot after waiting
+        - wait_time: seconds the calls that got a slot after waiting spent in the queue, in total
+        - max_wait_time: longest time a call spent in the queue before it got a slot
+    """
+
+    __slots__ = (
+        "limiter",
+        "in_flight",
+        "queue",
+        "virtual_time",
+        "finish_tags",
+        "queued_calls",
+        "rejected_calls",
+        "evicted_calls",
+        "timed_out_calls",
+        "waited_calls",
+        "wait_time",
+        "max_wait_time",
+    )
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.in_flight = 0
+        self.queue = []
+        self.virtual_time = 0.0
+        self.finish_tags = {}
+        self.queued_calls = 0
+        self.rejected_calls = 0
+        self.evicted_calls = 0
+        self.timed_out_calls = 0
+        self.waited_calls = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+
+class Bulkhead:
+    """
+    Limits the calls in flight to every backend, so a traffic spike cannot open an unbounded number of upstream
+    calls. Calls beyond the limit wait for a slot in a queue of at most max_queue_size calls, for at most
+    max_queue_time seconds. A call that finds the queue full, or does not get a slot in time, is refused, so the
+    caller can fail over to another backend or shed the request.
+
+    Calls belong to priority classes, and the queue hands out the slots by weighted fair queuing: while several
+    classes wait, every class gets a share of the slots in proportion to the weight it has in weights, and the
+    calls of a class get them in the order they arrived. Classes without a weight have a weight of 1. A call that
+    finds the queue full takes the place of the last waiting call of the lowest class below its own, so under
+    pressure the calls of lower classes are the first to fail over and be shed.
+
+    A slot is held until the call ends, or for a streamed response until the stream is closed. The limit of every
+    backend is kept by a limiter the create_limiter function returns, a static limit of max_concurrency by default.
+    An adaptive limiter learns the limit from the latencies and drops reported with record and drop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=100,
+        max_queue_size=100,
+        max_queue_time=5.0,
+        create_limiter=None,
+        weights: dict = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.max_queue_time = max_queue_time
+        self._create_limiter = create_limiter or (lambda: StaticLimiter(max_concurrency))
+        self._weights = weights or {}
+        self._sequence = itertools.count()
+        self._compartments = {}
+
+    def try_acquire(self, identifier):
+        """
+        Takes a slot of the backend if one is free and no call is waiting for it, returns false otherwise.
+        """
+        compartment = self._get_compartment(identifier)
+
+        if compartment.in_flight >= compartment.limiter.limit or compartment.queue:
+            return False
+
+        compartment.in_flight += 1
+        return True
+
+    async def acquire(self, identifier, timeout=None, priority=None):
+        """
+        Takes a slot of the backend for a call of the given priority class, waiting in its queue if none is free, at
+        most max_queue_time seconds or the given timeout if it is shorter. Returns false if the queue is full, the
+        call made room for a call of a higher class or did not get a slot in time.
+        """
+        if self.try_acquire(identifier):
+            return True
+
+        compartment = self._compartments[identifier]
+        timeout = self.max_queue_time if timeout is None else min(timeout, self.max_queue_time)
+        weight = self._weights.get(priority, 1)
+
+        if timeout <= 0 or (
+            len(compartment.queue) >= self.max_queue_size and not _evict(compartment, weight)
+        ):
+            compartment.rejected_calls += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        finish_tag = max(compartment.virtual_time, compartment.finish_tags.get(priority, 0.0)) + 1 / weight
+        compartment.finish_tags[priority] = finish_tag
+        heapq.heappush(compartment.queue, [finish_tag, next(self._sequence), waiter, weight])
+        compartment.queued_calls += 1
+        started = monotonic()
+
+        try:
+            # Unlike wait_for, wait does not cancel the waiter, so a slot handed over on time is never lost
+            await asyncio.wait((waiter,), timeout=timeout)
+        except BaseException:
+            self._leave_queue(identifier, waiter)
+            raise
+
+        if not waiter.done():
+            self._leave_queue(identifier, waiter)
+            compartment.timed_out_calls += 1
+            return False
+
+        if not waiter.result():
+            return False
+
+        wait_time = monotonic() - started
+        compartment.waited_calls += 1
+        compartment.wait_time += wait_time
+        compartment.max_wait_time = max(compartment.max_wait_time, wait_time)
+        return True
+
+    def release(self, identifier):
+        """
+        Frees a slot of the backend, handing it over to the next waiting call.
+        """
+        compartment = self._compartments[identifier]
+        compartment.in_flight -= 1
+        self._hand_over(compartment)
+
+    def record(self, identifier, latency):
+        """
+        Reports the latency of a successful call to the limiter of the backend.
+        """
+        compartment = self._compartments[identifier]
+        compartment.limiter.record(latency, compartment.in_flight)
+        # The limit may have grown, which frees slots for the calls that are waiting
+        self._hand_over(compartment)
+
+    def drop(self, identifier):
+        """
+        Reports a call the backend throttled or that timed out to the limiter of the backend.
+        """
+        self._compartments[identifier].limiter.drop()
+
+    def release_after(self, identifier, response):
+        """
+        Frees a slot of the backend once the response is done with: right away, or for a streamed response once
+        the stream is closed.
+        """
+        if isinstance(response, UpstreamStream):
+            response.add_close_callback(lambda: self.release(identifier))
+        else:
+            self.release(identifier)
+
+    def retry_after(self):
+        """
+        Returns the seconds a refused client is asked to wait, the time the queue takes to turn over.
+        """
+        return max(math.ceil(self.max_queue_time), 1)
+
+    def statistics(self) -> dict:
+        return {
+            identifier: {
+                **compartment.limiter.statistics(),
+                "in_flight": compartment.in_flight,
+                "queue_depth": len(compartment.queue),
+                "queued_calls": compartment.queued_calls,
+                "rejected_calls": compartment.rejected_calls,
+                "evicted_calls": compartment.evicted_calls,
+                "timed_out_calls": compartment.timed_out_calls,
+                "average_wait_time": (
+                    compartment.wait_time / compartment.waited_calls if compartment.waited_calls else 0.0
+                ),
+                "max_wait_time": compartment.max_wait_time,
+            }
+            for identifier, compartment in self._compartments.items()
+        }
+
+    def _get_compartment(self, identifier):
+        compartment = self._compartments.get(identifier)
+
+        if compartment is None:
+            compartment = Compartment(self._create_limiter())
+            self._compartments[identifier] = compartment
+
+        return compartment
+
+    @staticmethod
+    def _hand_over(compartment: Compartment):
+        # Calls beyond a limit that shrank are not replaced
+        while compartment.queue and compartment.in_flight < compartment.limiter.limit:
+            finish_tag, _, waiter, _ = heapq.heappop(compartment.queue)
+            compartment.virtual_time = finish_tag
+            compartment.in_flight += 1
+            waiter.set_result(True)
+
+    def _leave_queue(self, identifier, waiter):
+        if waiter.done():
+            # The slot was handed over just as the call stopped waiting, so it is passed on
+            if waiter.result():
+                self.release(identifier)
+
+            return
+
+        waiter.cancel()
+        queue = self._compartments[identifier].queue
+        queue[:] = [entry for entry in queue if entry[2] is not waiter]
+        heapq.heapify(queue)
+
+
+def _evict(compartment: Compartment, weight):
+    """
+    Refuses the last waiting call of the lowest priority class below the given weight, returns false if there is
+    none.
+    """
+    queue = compartment.queue
+    evicted = None
+
+    for entry in queue:
+        if entry[3] < weight and (
+            evicted is None or (entry[3], -entry[0]) < (evicted[3], -evicted[0])
+        ):
+            evicted = entry
+
+    if evicted is None:
+        return False
+
+    queue[:] = [entry for entry in queue if entry is not evicted]
+    heapq.heapify(queue)
+    evicted[2].set_result(False)
+    compartment.evicted_calls += 1
+    return True
@@ -1,18 +1,45 @@
+import asyncio
 import logging
+from time import perf_counter, time
 
 from fastapi import HTTPException
 
-from src.core.model.circuit import Circuit
+from src.core.exceptions.throttled_exception import ThrottledException
+from src.core.model.backend_pool import BackendPool
+from src.core.model.circuit import Circuit, CircuitState
+from src.core.model.deadline import Deadline
 from src.infrastructure.repositories.circuit_breaker_repository import (
     CircuitBreakerRepository,
 )
+from src.services.backend_capacity import BackendCapacityTracker
+from src.services.backend_selector import BackendSelector
+from src.services.bulkhead import FALLBACK, Bulkhead
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.hedging_policy import HedgingPolicy
 
 
 class CircuitBreakerService:
     logger = logging.getLogger(__name__)
 
-    def __init__(self, repository: CircuitBreakerRepository):
+    def __init__(
+        self,
+        repository: CircuitBreakerRepository,
+        max_attempts=2,
+        selector: BackendSelector = None,
+        capacity_tracker: BackendCapacityTracker = None,
+        max_queue_time=0.0,
+        hedging_policy: HedgingPolicy = None,
+        bulkhead: Bulkhead = None,
+        metrics: GatewayMetrics = None,
+    ):
         self._repository: CircuitBreakerRepository = repository
+        self._max_attempts = max_attempts
+        self._max_queue_time = max_queue_time
+        self.selector = selector or BackendSelector()
+        self.capacity_tracker = capacity_tracker
+        self.hedging_policy = hedging_policy
+        self.bulkhead = bulkhead
+        self.metrics = metrics
 
     def add_circuit(self, circuit: Circuit):
         self._repository.add(circuit)
@@ -20,27 +47,460 @@ class CircuitBreakerService:
     def get_circuit(self, circuit_id: str) -> Circuit:
         return self._repository.get(circuit_id)
 
-    async def execute(self, circuit_id, function, fallback_function):
+    async def execute(self, circuit_id, function, fallback_function, *args):
+        """
+        Calls the function, or the fallback function if the circuit is open, the bulkhead refuses the call or the
+        function fails. Both functions are called with the given args.
+        """
         circuit = self._repository.get(circuit_id)
 
         if circuit is None:
             raise HTTPException(status_code=500, detail="Circuit does not exist")
 
-        if circuit.is_callable():
+        generation, _ = self._modify(circuit_id, _admit)
+
+        if generation is not None and not await self._acquire_slot(circuit_id, generation):
+            return await self._call_fallback(fallback_function, args, None)
+
+        if generation is not None:
+            started = perf_counter()
+
             try:
-                self.logger.info(f"Calling function for: {circuit}")
-                response = await function()
-                self.logger.info(f"Function call succeeded for circuit '{circuit_id}'")
-                circuit.handle_successful_call()
-                self._repository.update(circuit)
-                return response
+                self.logger.debug("Calling function for circuit '%s'", circuit_id)
+                response = await function(*args)
+            except ThrottledException as e:
+                self.logger.info(
+                    "Function call throttled for circuit '%s', falling back: %s", circuit_id, e
+                )
+                self._release_slot(circuit_id, None, error=e)
+                self._compare_and_set(circuit_id, generation, _throttle(e.retry_after))
             except Exception as e:
                 self.logger.info(
-                    f"Function call failed for circuit '{circuit_id}', falling back: {e}"
+                    "Function call failed for circuit '%s', falling back: %s", circuit_id, e
+                )
+                self._release_slot(circuit_id, None, error=e)
+                self._compare_and_set(circuit_id, generation, Circuit.handle_failed_call)
+            except BaseException:
+                # The call was cancelled, free its probe slot without recording an outcome
+                self._release_slot(circuit_id, None)
+                self._compare_and_set(
+                    circuit_id, generation, Circuit.handle_abandoned_call
                 )
-                circuit.handle_failed_call()
-                self._repository.update(circuit)
-                return await fallback_function()
+                raise
+            else:
+                self.logger.debug("Function call succeeded for circuit '%s'", circuit_id)
+                self._release_slot(circuit_id, response, latency=perf_counter() - started)
+                self._compare_and_set(
+                    circuit_id, generation, Circuit.handle_successful_call
+                )
+                return response
+
+            return await self._call_fallback(fallback_function, args, None)
         else:
-            self.logger.info(f"Circuit '{circuit_id}' is tripped, calling fallback")
-            return await fallback_function()
+            self.logger.info("Circuit '%s' is tripped, calling fallback", circuit_id)
+            return await self._call_fallback(fallback_function, args, None)
+
+    async def execute_pool(
+        self,
+        pool: BackendPool,
+        function,
+        fallback_function,
+        *args,
+        cost=0,
+        hedge_function=None,
+        deadline: Deadline = None,
+        priority=None,
+    ):
+        """
+        Calls the function with a backend of the pool, followed by the given args. Backends are tried in the order
+        the selector picks them, skipping those whose circuit is open or whose quota cannot cover the estimated cost
+        of the request, for at most max_attempts calls. If only the quota kept the request from being sent, it waits
+        up to max_queue_time seconds for a quota to be replenished. The fallback function is called with the given
+        args if no backend could serve the request.
+
+        With a hedging policy, the hedge function is called with the given args as well if the first backend is
+        slower than the delay of the policy. The first successful response is returned and the other call cancelled.
+
+        With a deadline, every call to a backend is limited to the budget left for the pool, and a call that runs out
+        of time counts as a failure. The fallback function is limited to the rest of the budget, which includes the
+        reserve of the deadline. A HTTPException with status 504 is raised if it runs out of time as well.
+
+        With a bulkhead, a backend whose calls in flight and queue are full is skipped like a backend with an open
+        circuit. The request is shed with a HTTPException with status 503 if the bulkhead refuses the fallback call
+        as well. The calls wait for a slot in the queues of the bulkhead with the given priority class.
+        """
+        served, response, replenished_at = await self._call_pool(
+            pool, function, hedge_function, args, cost, deadline, priority
+        )
+
+        if not served and replenished_at is not None:
+            delay = replenished_at - time()
+
+            if delay <= self._max_queue_time and (
+                deadline is None or delay < deadline.attempt_timeout()
+            ):
+                self.logger.info("No backend has quota left, waiting %.3fs", delay)
+                await asyncio.sleep(max(delay, 0))
+                served, response, _ = await self._call_pool(
+                    pool, function, hedge_function, args, cost, deadline, priority
+                )
+
+        if served:
+            return response
+
+        self.logger.info("No backend of the pool served the request, calling fallback")
+        return await self._call_fallback(fallback_function, args, deadline, priority)
+
+    async def _call_fallback(self, fallback_function, args, deadline: Deadline, priority=None):
+        timeout = deadline.fallback_timeout() if deadline is not None else None
+
+        if timeout is not None and timeout <= 0:
+            self.logger.info("Deadline leaves no time to call the fallback")
+            raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+        bulkhead = self.bulkhead
+
+        if bulkhead is not None and not await bulkhead.acquire(FALLBACK, timeout, priority):
+            self.logger.info("Bulkhead refused the fallback call, shedding the request")
+
+            if self.metrics is not None:
+                self.metrics.shed_requests.inc()
+
+            raise HTTPException(
+                status_code=503,
+                detail="The gateway is overloaded",
+                headers={"Retry-After": str(bulkhead.retry_after())},
+            )
+
+        if self.metrics is not None:
+            self.metrics.fallback_calls.inc()
+
+        response = None
+        started = perf_counter()
+
+        try:
+            if timeout is not None:
+                # The wait for a slot used part of the budget
+                timeout = deadline.fallback_timeout()
+
+            response = await asyncio.wait_for(fallback_function(*args), timeout)
+
+            if bulkhead is not None:
+                bulkhead.record(FALLBACK, perf_counter() - started)
+
+            return response
+        except asyncio.TimeoutError:
+            if deadline is None:
+                raise
+
+            self.logger.info("Fallback function call exceeded the deadline")
+            raise HTTPException(status_code=504, detail="Request deadline exceeded")
+        finally:
+            if bulkhead is not None:
+                bulkhead.release_after(FALLBACK, response)
+
+    async def _call_pool(
+        self, pool: BackendPool, function, hedge_function, args, cost, deadline, priority
+    ):
+        """
+        Returns whether a backend served the request and its response. If no backend was called because their
+        quota was exhausted, it also returns the earliest time a quota is replenished.
+        """
+        selector = self.selector
+        capacity_tracker = self.capacity_tracker
+        hedging_policy = self.hedging_policy if hedge_function is not None else None
+        attempts = 0
+        replenished_at = None
+
+        for backend in selector.select(pool):
+            circuit_id = backend.identifier
+            timeout = deadline.attempt_timeout() if deadline is not None else None
+
+            if timeout is not None and timeout <= 0:
+                self.logger.info("Deadline leaves no time to call another backend")
+                break
+
+            if self._repository.get(circuit_id) is None:
+                raise HTTPException(status_code=500, detail="Circuit does not exist")
+
+            generation, retry_at = self._modify(circuit_id, _admit)
+
+            if generation is None:
+                self.logger.info("Circuit '%s' is tripped, skipping backend", circuit_id)
+
+                if retry_at is not None:
+                    pool.mark_unavailable(backend, retry_at)
+
+                continue
+
+            if not await self._acquire_slot(circuit_id, generation, timeout, priority):
+                continue
+
+            # Quota is only reserved for calls the circuit admitted, so refused calls do not use it up
+            if capacity_tracker is not None and not capacity_tracker.reserve(backend, cost):
+                self.logger.info("Backend '%s' has no quota left, skipping backend", circuit_id)
+                self._release_slot(circuit_id, None)
+                self._compare_and_set(
+                    circuit_id, generation, Circuit.handle_abandoned_call
+                )
+                backend_replenished_at = capacity_tracker.replenished_at(backend)
+
+                if replenished_at is None or backend_replenished_at < replenished_at:
+                    replenished_at = backend_replenished_at
+
+                continue
+
+            if timeout is not None:
+                # The wait for a slot used part of the budget
+                timeout = deadline.attempt_timeout()
+
+            attempts += 1
+            # Only the first attempt is hedged, later attempts already follow a failure
+            hedge_delay = hedging_policy.delay(backend) if hedging_policy and attempts == 1 else None
+            selector.start(backend)
+            started = perf_counter()
+
+            try:
+                self.logger.debug("Calling function for backend: %s", backend)
+
+                if hedge_delay is None:
+                    response = await asyncio.wait_for(function(backend, *args), timeout)
+                    error, hedge_won = None, False
+                else:
+                    response, error, hedge_won = await asyncio.wait_for(
+                        self._call_hedged(hedge_delay, function(backend, *args), hedge_function(*args)),
+                        timeout,
+                    )
+            except Exception as e:
+                # A call that exceeded the deadline counts as a failure as well
+                self.logger.info("Function call failed for circuit '%s': %r", circuit_id, e)
+                self._release_slot(circuit_id, None, error=e)
+                selector.complete(backend)
+                self._handle_failed_call(pool, backend, generation, e)
+
+                if attempts >= self._max_attempts:
+                    break
+
+                continue
+            except BaseException:
+                # The call was cancelled, free its probe slot without recording an outcome
+                self._release_slot(circuit_id, None)
+                selector.complete(backend)
+                self._compare_and_set(
+                    circuit_id, generation, Circuit.handle_abandoned_call
+                )
+                raise
+
+            latency = perf_counter() - started
+
+            if hedge_won:
+                # The response is the one of the hedge, the call to the backend already ended
+                self._release_slot(circuit_id, None)
+                selector.complete(backend)
+
+                if error is not None:
+                    self._handle_failed_call(pool, backend, generation, error)
+                else:
+                    # The backend was only slower than the hedge, which is no failure
+                    hedging_policy.record(backend, latency)
+                    self._compare_and_set(
+                        circuit_id, generation, Circuit.handle_abandoned_call
+                    )
+
+                return True, response, None
+
+            if hedging_policy is not None:
+                hedging_policy.record(backend, latency)
+
+            self._release_slot(circuit_id, response, latency=latency)
+            selector.complete(backend, latency)
+            self.logger.debug("Function call succeeded for circuit '%s'", circuit_id)
+            applied, _ = self._compare_and_set(
+                circuit_id, generation, _record_success(latency)
+            )
+
+            # The outcome of a call that outlived a transition of the circuit says nothing about its current state
+            if applied:
+                pool.mark_available(backend)
+
+            return True, response, None
+
+        return False, None, replenished_at if attempts == 0 else None
+
+    def _modify(self, circuit_id, operation):
+        if self.metrics is not None:
+            operation = self.metrics.count_transitions(circuit_id, operation)
+
+        return self._repository.modify(circuit_id, operation)
+
+    def _compare_and_set(self, circuit_id, generation, operation):
+        if self.metrics is not None:
+            operation = self.metrics.count_transitions(circuit_id, operation)
+
+        return self._repository.compare_and_set(circuit_id, generation, operation)
+
+    async def _acquire_slot(self, circuit_id, generation, timeout=None, priority=None):
+        """
+        Takes a slot of the bulkhead for a call the circuit admitted. If the bulkhead refuses the call, the admission
+        is given up and false returned.
+        """
+        if self.bulkhead is None or await self.bulkhead.acquire(circuit_id, timeout, priority):
+            return True
+
+        self.logger.info("Bulkhead of backend '%s' is full, skipping backend", circuit_id)
+        self._compare_and_set(circuit_id, generation, Circuit.handle_abandoned_call)
+        return False
+
+    def _release_slot(self, circuit_id, response, latency=None, error=None):
+        """
+        Frees the slot of a call, reporting its latency if it succeeded, or a drop if it was throttled or timed out,
+        to the limiter of the backend.
+        """
+        bulkhead = self.bulkhead
+
+        if bulkhead is None:
+            return
+
+        if latency is not None:
+            bulkhead.record(circuit_id, latency)
+        elif isinstance(error, (ThrottledException, asyncio.TimeoutError)):
+            bulkhead.drop(circuit_id)
+
+        bulkhead.release_after(circuit_id, response)
+
+    def _acquire_hedge(self):
+        """
+        Takes a hedge from the budget of the hedging policy and a slot of the fallback, if it is free right away.
+        """
+        bulkhead = self.bulkhead
+
+        if bulkhead is not None and not bulkhead.try_acquire(FALLBACK):
+            return False
+
+        if self.hedging_policy.acquire_hedge():
+            return True
+
+        if bulkhead is not None:
+            bulkhead.release(FALLBACK)
+
+        return False
+
+    def _release_hedge(self, hedge_task: asyncio.Task):
+        if hedge_task.cancelled() or hedge_task.exception() is not None:
+            self.bulkhead.release(FALLBACK)
+        else:
+            self.bulkhead.release_after(FALLBACK, hedge_task.result())
+
+    def _handle_failed_call(self, pool: BackendPool, backend, generation, error):
+        if isinstance(error, ThrottledException):
+            operation = _throttle(error.retry_after)
+        else:
+            operation = _record_failure
+
+        _, retry_at = self._compare_and_set(backend.identifier, generation, operation)
+
+        if retry_at is not None:
+            pool.mark_unavailable(backend, retry_at)
+
+    async def _call_hedged(self, delay, call, hedge_call):
+        """
+        Awaits the call, and starts the hedge call if the call takes longer than delay seconds and the hedging budget
+        allows it. Returns the first successful response, the error of the call if it failed and whether the hedge
+        won. Raises the error of the call if neither succeeded.
+        """
+        task = asyncio.ensure_future(call)
+        hedge_task = None
+        winner = None
+
+        try:
+            done, _ = await asyncio.wait([task], timeout=delay)
+
+            if not done and self._acquire_hedge():
+                self.logger.info("Call slower than %.3fs, sending hedge", delay)
+                hedge_task = asyncio.ensure_future(hedge_call)
+
+                if self.bulkhead is not None:
+                    hedge_task.add_done_callback(self._release_hedge)
+                pending = {task, hedge_task}
+
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+
+                    if task in done and task.exception() is None:
+                        winner = task
+                        return task.result(), None, False
+
+                    if hedge_task in done and hedge_task.exception() is None:
+                        winner = hedge_task
+                        self.hedging_policy.hedges_won += 1
+                        error = task.exception() if task.done() else None
+                        return hedge_task.result(), error, True
+
+            winner = task
+            return await task, None, False
+        finally:
+            if hedge_task is None:
+                hedge_call.close()
+
+            for loser in (task, hedge_task):
+                if loser is not None and loser is not winner:
+                    _discard(loser)
+
+
+def _retry_at(circuit: Circuit):
+    """
+    Returns the time an open circuit may be called again.
+    """
+    retry_at = circuit.retry_at
+    return retry_at if retry_at is not None else time() + circuit.current_retry_timeout
+
+
+def _admit(circuit: Circuit):
+    """
+    Returns the generation the call is admitted under, or None and the retry time if it is not admitted.
+    """
+    if circuit.is_callable():
+        return circuit.generation, None
+
+    # A half open circuit is already being probed, its backend stays in the pool until the probe fails
+    return None, _retry_at(circuit) if circuit.state is CircuitState.OPEN else None
+
+
+def _record_success(latency):
+    def record_success(circuit: Circuit):
+        circuit.handle_successful_call(latency)
+
+    return record_success
+
+
+def _record_failure(circuit: Circuit):
+    circuit.handle_failed_call()
+    return _retry_at(circuit) if circuit.state is CircuitState.OPEN else None
+
+
+def _throttle(retry_after):
+    def throttle(circuit: Circuit):
+        circuit.handle_throttled_call(retry_after)
+        return _retry_at(circuit)
+
+    return throttle
+
+
+def _discard(task: asyncio.Task):
+    """
+    Cancels a call that lost the race, or closes its response if it completed anyway.
+    """
+    if not task.done():
+        task.cancel()
+        return
+
+    # Retrieve the exception, so it is not reported as never retrieved
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    response = task.result()
+
+    if hasattr(response, "aclose"):
+        asyncio.ensure_future(response.aclose())
@@ -0,0 +1,115 @@
+import math
+
+# Weight of a new latency in the short-term average, which follows the current load
+LATENCY_SMOOTHING = 0.2
+# Weight of a new latency in the baseline, which follows the latency of the backend over hundreds of calls
+BASELINE_SMOOTHING = 0.01
+
+
+class StaticLimiter:
+    """
+    Fixed limit of the calls in flight to a backend.
+    """
+
+    __slots__ = ("limit",)
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def record(self, latency, in_flight):
+        pass
+
+    def drop(self):
+        pass
+
+    def statistics(self) -> dict:
+        return {"limit": self.limit}
+
+
+class GradientLimiter:
+    """
+    Limit of the calls in flight to a backend that adapts to its latency. Every successful call compares the
+    short-term average latency with a long-term baseline. As long as the latency stays within tolerance times the
+    baseline, the limit grows by its square root, a queue the backend is assumed to absorb. Beyond it, the limit
+    shrinks by the ratio of the two, to at most half. A throttled or timed out call is a drop, which shrinks the
+    limit by backoff_ratio, so the limit follows the capacity of the backend like additive increase, multiplicative
+    decrease.
+
+    It has the following attributes:
+        - limit: current limit, between min_limit and max_limit
+        - min_limit: lowest limit, so a backend is never cut off
+        - max_limit: highest limit
+        - tolerance: factor by which the latency may exceed the baseline before the limit shrinks
+        - backoff_ratio: factor the limit is multiplied with on a drop
+        - smoothing: weight of a new limit in the limit, so single calls do not swing it
+        - latency: short-term average latency in seconds, None before the first call
+        - baseline: long-term average latency in seconds, None before the first call
+    """
+
+    __slots__ = (
+        "limit",
+        "min_limit",
+        "max_limit",
+        "tolerance",
+        "backoff_ratio",
+        "smoothing",
+        "latency",
+        "baseline",
+    )
+
+    def __init__(
+        self,
+        initial_limit=20,
+        min_limit=1,
+        max_limit=100,
+        tolerance=2.0,
+        backoff_ratio=0.9,
+        smoothing=0.2,
+    ):
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.smoothing = smoothing
+        self.latency = None
+        self.baseline = None
+
+    def record(self, latency, in_flight):
+        """
+        Adapts the limit to the latency of a successful call, made with in_flight calls to the backend in flight.
+        """
+        if self.latency is None:
+            self.latency = self.baseline = latency
+            return
+
+        self.latency += (latency - self.latency) * LATENCY_SMOOTHING
+        self.baseline += (latency - self.baseline) * BASELINE_SMOOTHING
+
+        # A baseline far above the latency, e.g. left over from a slow period, would let the limit grow unchecked
+        if self.baseline > 2 * self.latency:
+            self.baseline *= 0.95
+
+        # A limit far above the calls in flight was not tested by them, so it must not grow any further
+        if in_flight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.baseline / self.latency))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self._set(self.limit * (1 - self.smoothing) + new_limit * self.smoothing)
+
+    def drop(self):
+        """
+        Shrinks the limit after a call was throttled or timed out.
+        """
+        self._set(self.limit * self.backoff_ratio)
+
+    def statistics(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "latency": self.latency,
+            "baseline_latency": self.baseline,
+        }
+
+    def _set(self, limit):
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
@@ -0,0 +1,199 @@
+import logging
+from email.utils import parsedate_to_datetime
+from time import perf_counter, time
+
+from fastapi import HTTPException, status
+
+from src.core.exceptions.throttled_exception import ThrottledException
+from src.core.model.backend import Backend
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.infrastructure.logs.log_body import LogBody
+from src.services.backend_capacity import BackendCapacityTracker
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.usage_accounting_service import UsageAccountingService
+
+# Headers describing the encoding of the upstream body. The body is returned decoded, so these no longer apply.
+EXCLUDED_RESPONSE_HEADERS = ["connection", "content-encoding", "content-length"]
+
+
+class ForwardingService:
+    """
+    Forwards requests to the backends of the pool and the fallback backend. The backends are resolved once,
+    so the bound forward methods can be handed to the circuit breaker without building a closure per request.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        upstream_client_pool: UpstreamClientPool,
+        fallback_backend: Backend,
+        capacity_tracker: BackendCapacityTracker = None,
+        metrics: GatewayMetrics = None,
+        usage_accounting_service: UsageAccountingService = None,
+    ):
+        self._upstream_client_pool = upstream_client_pool
+        self._capacity_tracker = capacity_tracker
+        self._metrics = metrics
+        self._usage_accounting_service = usage_accounting_service
+        self.fallback_backend = fallback_backend
+
+    async def forward_to_fallback(self, upstream_request: UpstreamRequest):
+        return await self.forward(self.fallback_backend, upstream_request, False)
+
+    async def hedge_to_fallback(self, upstream_request: UpstreamRequest):
+        # A failed hedge must not win the race against the backend it hedges, so its status code is checked
+        return await self.forward(self.fallback_backend, upstream_request)
+
+    async def forward(
+        self, backend: Backend, upstream_request: UpstreamRequest, check_status_code=True
+    ):
+        url = backend.base_url + upstream_request.target
+        stream = upstream_request.stream
+
+        # Bodies are only logged at DEBUG, truncated and redacted once the record is written
+        self.logger.debug(
+            "Making request to url: '%s'\nMethod: %s\nBody: %s",
+            url,
+            upstream_request.method,
+            LogBody(upstream_request.body),
+        )
+
+        client = self._upstream_client_pool.get_client(backend.host)
+        downstream_request = client.build_request(
+            upstream_request.method,
+            url,
+            headers=backend.headers + upstream_request.headers,
+            content=upstream_request.body,
+        )
+        metrics = self._metrics
+
+        if metrics is None:
+            downstream_response = await client.send(downstream_request, stream=stream)
+            return await self._receive(backend, upstream_request, downstream_response, check_status_code)
+
+        identifier = backend.identifier
+        metrics.start_upstream_call(identifier, upstream_request.body)
+        started = perf_counter()
+
+        try:
+            downstream_response = await client.send(downstream_request, stream=stream)
+        except BaseException:
+            metrics.observe_upstream_response(identifier, "error", perf_counter() - started)
+            metrics.end_upstream_call(identifier)
+            raise
+
+        metrics.observe_upstream_response(
+            identifier, str(downstream_response.status_code), perf_counter() - started
+        )
+
+        if not stream:
+            metrics.end_upstream_call(identifier, len(downstream_response.content))
+            return await self._receive(backend, upstream_request, downstream_response, check_status_code)
+
+        try:
+            upstream_stream = await self._receive(backend, upstream_request, downstream_response, check_status_code)
+        except BaseException:
+            metrics.end_upstream_call(identifier)
+            raise
+
+        # A streamed call is in flight until the client has received the whole body
+        upstream_stream.add_close_callback(
+            lambda: metrics.end_upstream_call(identifier, upstream_stream.received_bytes)
+        )
+        return upstream_stream
+
+    async def _receive(
+        self, backend: Backend, upstream_request: UpstreamRequest, downstream_response, check_status_code
+    ):
+        stream = upstream_request.stream
+
+        if stream:
+            self.logger.debug("Got streamed response status: %s", downstream_response.status_code)
+        else:
+            self.logger.debug(
+                "Got response status: %s\nBody: %s",
+                downstream_response.status_code,
+                LogBody(downstream_response.content),
+            )
+
+        throttled = downstream_response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        retry_after = parse_retry_after(downstream_response.headers) if throttled else None
+
+        if self._capacity_tracker is not None:
+            self._capacity_tracker.observe(
+                backend, downstream_response.headers, replenished_in=retry_after
+            )
+
+        # Only raise the exception if a backend of the pool returns an error, to force the fallback mechanism.
+        # If the fallback API returns an error, return this to the client as-is.
+        if check_status_code and (throttled or downstream_response.status_code >= 500):
+            if stream:
+                try:
+                    await downstream_response.aread()
+                finally:
+                    await downstream_response.aclose()
+
+            if throttled:
+                raise ThrottledException(
+                    status_code=downstream_response.status_code,
+                    detail=downstream_response.text,
+                    retry_after=retry_after,
+                )
+
+            raise HTTPException(
+                status_code=downstream_response.status_code,
+                detail=downstream_response.text,
+            )
+
+        # Remove the Connection and body encoding headers before returning the downstream response,
+        # as they cannot be returned
+        for header in EXCLUDED_RESPONSE_HEADERS:
+            downstream_response.headers.pop(header, None)
+
+        usage_accounting_service = self._usage_accounting_service
+
+        if stream:
+            # Wait for the first chunk, so failures up to the first byte still trigger the fallback
+            upstream_stream = await UpstreamStream.open(downstream_response)
+
+            if usage_accounting_service is not None:
+                usage_accounting_service.scan_stream(backend.identifier, upstream_request, upstream_stream)
+
+            return upstream_stream
+
+        if usage_accounting_service is not None:
+            usage_accounting_service.record_response(backend.identifier, upstream_request, downstream_response)
+
+        return downstream_response
+
+
+def parse_retry_after(headers):
+    """
+    Returns the number of seconds a throttled backend asks to wait, from the retry-after-ms header or the
+    retry-after header in seconds or as an http date, or None if neither is present or valid.
+    """
+    retry_after_ms = headers.get("retry-after-ms")
+
+    if retry_after_ms is not None:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+
+    if retry_after is None:
+        return None
+
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time(), 0.0)
+    except (TypeError, ValueError):
+        return None
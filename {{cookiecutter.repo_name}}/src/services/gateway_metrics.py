@@ -0,0 +1,161 @@
+from src.core.model.circuit import Circuit, CircuitState
+from src.infrastructure.metrics.metrics_directory import MetricsDirectory
+from src.infrastructure.metrics.metrics_registry import merge_snapshots, MetricsRegistry, render
+
+
+class GatewayMetrics:
+    """
+    Metrics of the gateway in the Prometheus format. The calls to the backends are measured as they happen, with a
+    dict update per metric. The state of the circuits, bulkheads and priority classes is read when the metrics are
+    collected, so it costs nothing per request.
+
+    The circuit states are combined over the workers by their maximum, as shared circuits are reported by every
+    worker. The transitions of a circuit are counted by the worker that made them, while it changes the circuit,
+    and summed over the workers.
+    """
+
+    def __init__(self, registry: MetricsRegistry = None, directory: MetricsDirectory = None):
+        self.registry = registry or MetricsRegistry()
+        self.directory = directory
+
+        registry = self.registry
+        self.upstream_latency = registry.histogram(
+            "gateway_upstream_request_duration_seconds",
+            "Seconds until the response headers of a backend were received",
+            ("backend", "status"),
+        )
+        self.upstream_in_flight = registry.gauge(
+            "gateway_upstream_requests_in_flight",
+            "Calls to a backend of which the response has not been received completely",
+            ("backend",),
+        )
+        self.sent_bytes = registry.counter(
+            "gateway_upstream_sent_bytes_total", "Bytes of request bodies sent to a backend", ("backend",)
+        )
+        self.received_bytes = registry.counter(
+            "gateway_upstream_received_bytes_total",
+            "Bytes of response bodies received from a backend",
+            ("backend",),
+        )
+        self.fallback_calls = registry.counter(
+            "gateway_fallback_calls_total", "Requests that were passed to the fallback backend"
+        )
+        self.shed_requests = registry.counter(
+            "gateway_shed_requests_total", "Requests refused with status 503 because the gateway is overloaded"
+        )
+        self.circuit_state = registry.gauge(
+            "gateway_circuit_state",
+            "Whether a circuit is in the state, 1, or not, 0",
+            ("circuit", "state"),
+            aggregation="max",
+        )
+        self.circuit_transitions = registry.counter(
+            "gateway_circuit_transitions_total", "State transitions of a circuit", ("circuit",)
+        )
+        self.bulkhead_in_flight = registry.gauge(
+            "gateway_bulkhead_in_flight", "Calls holding a slot of a bulkhead compartment", ("compartment",)
+        )
+        self.bulkhead_queue_depth = registry.gauge(
+            "gateway_bulkhead_queue_depth", "Calls waiting for a slot of a bulkhead compartment", ("compartment",)
+        )
+        self.bulkhead_limit = registry.gauge(
+            "gateway_bulkhead_limit", "Slots of a bulkhead compartment", ("compartment",)
+        )
+        self.bulkhead_rejected_calls = registry.counter(
+            "gateway_bulkhead_rejected_calls_total",
+            "Calls refused, evicted or timed out by a bulkhead compartment",
+            ("compartment", "reason"),
+        )
+        self.tokens = registry.counter(
+            "gateway_tokens_total",
+            "Tokens the backends reported in the usage of their responses",
+            ("backend", "deployment", "type"),
+        )
+        self.priority_requests = registry.counter(
+            "gateway_priority_requests_total", "Requests served per priority class", ("priority",)
+        )
+        self.priority_latency = registry.histogram(
+            "gateway_priority_request_duration_seconds",
+            "Seconds until a request of a priority class was answered, or its stream started",
+            ("priority",),
+        )
+
+    def start_upstream_call(self, backend_id, body):
+        self.upstream_in_flight.inc((backend_id,))
+
+        if body:
+            self.sent_bytes.inc((backend_id,), len(body))
+
+    def observe_upstream_response(self, backend_id, status, latency):
+        self.upstream_latency.observe((backend_id, status), latency)
+
+    def end_upstream_call(self, backend_id, received_bytes=0):
+        self.upstream_in_flight.dec((backend_id,))
+
+        if received_bytes:
+            self.received_bytes.inc((backend_id,), received_bytes)
+
+    def record_usage(self, backend_id, deployment, prompt_tokens, completion_tokens):
+        self.tokens.inc((backend_id, deployment, "prompt"), prompt_tokens)
+        self.tokens.inc((backend_id, deployment, "completion"), completion_tokens)
+
+    def count_transitions(self, circuit_id, operation):
+        """
+        Returns the operation on a circuit, counting the state transitions it makes. Every transition starts a new
+        generation of the circuit.
+        """
+
+        def counted(circuit: Circuit):
+            generation = circuit.generation
+            result = operation(circuit)
+
+            if circuit.generation != generation:
+                self.circuit_transitions.inc((circuit_id,), circuit.generation - generation)
+
+            return result
+
+        return counted
+
+    def watch(self, circuit_breaker_service, circuit_ids, priority_service=None):
+        """
+        Collects the state of the circuits with the given ids, the bulkhead of the circuit breaker service and the
+        priority classes with every snapshot.
+        """
+
+        def collect():
+            for circuit_id in circuit_ids:
+                circuit = circuit_breaker_service.get_circuit(circuit_id)
+
+                if circuit is None:
+                    continue
+
+                for state in CircuitState:
+                    self.circuit_state.set((circuit_id, state.value), int(circuit.state is state))
+
+            bulkhead = circuit_breaker_service.bulkhead
+
+            if bulkhead is not None:
+                for compartment, statistics in bulkhead.statistics().items():
+                    self.bulkhead_in_flight.set((compartment,), statistics["in_flight"])
+                    self.bulkhead_queue_depth.set((compartment,), statistics["queue_depth"])
+                    self.bulkhead_limit.set((compartment,), statistics["limit"])
+
+                    for reason in ["rejected", "evicted", "timed_out"]:
+                        self.bulkhead_rejected_calls.set(
+                            (compartment, reason), statistics[f"{reason}_calls"]
+                        )
+
+            if priority_service is not None:
+                for priority, statistics in priority_service.statistics().items():
+                    self.priority_requests.set((priority,), statistics["requests"])
+
+        self.registry.add_collector(collect)
+
+    async def render(self) -> str:
+        """
+        Returns the metrics of all workers sharing the metrics directory, or of this worker without one.
+        """
+        if self.directory is not None:
+            return render(await self.directory.collect())
+
+        return render(merge_snapshots([self.registry.snapshot()]))
@@ -0,0 +1,98 @@
+from array import array
+
+from src.core.model.backend import Backend
+
+# Hedges that may be saved up while traffic is low, so a burst of slow calls can still be hedged
+MAX_SAVED_HEDGES = 10
+# The budget is kept in percent of a hedge, so it adds up without rounding errors
+HEDGE = 100.0
+
+
+class LatencyWindow:
+    """
+    Latencies of the most recent calls of a backend, in a fixed-size ring buffer.
+    """
+
+    __slots__ = ("latencies", "next_index", "count", "cached_quantile", "quantile_value")
+
+    def __init__(self, size):
+        self.latencies = array("d", bytes(8 * size))
+        self.next_index = 0
+        self.count = 0
+        self.cached_quantile = None
+        self.quantile_value = None
+
+    def record(self, latency):
+        self.latencies[self.next_index] = latency
+        self.next_index = (self.next_index + 1) % len(self.latencies)
+        self.count = min(self.count + 1, len(self.latencies))
+        self.cached_quantile = None
+
+    def quantile(self, quantile):
+        if self.cached_quantile != quantile:
+            latencies = sorted(self.latencies[: self.count])
+            self.quantile_value = latencies[min(int(quantile * self.count), self.count - 1)]
+            self.cached_quantile = quantile
+
+        return self.quantile_value
+
+
+class HedgingPolicy:
+    """
+    Decides when a call to a slow backend is hedged with a call to the fallback backend. The hedge is sent once the
+    call has taken longer than the given quantile of the recent latencies of the backend. Hedges are limited to
+    budget_percent of the calls, so hedging cannot double the load when all calls are slow.
+    """
+
+    def __init__(self, quantile=0.95, budget_percent=5.0, min_samples=20, window=256):
+        self._quantile = quantile
+        self._budget_percent = budget_percent
+        self._min_samples = min_samples
+        self._window = window
+        self._windows = {}
+        self._budget = 0.0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def delay(self, backend: Backend):
+        """
+        Returns the seconds after which a call to the backend is hedged, or None if it has too few recorded calls.
+        Every call asking for a delay adds to the hedge budget.
+        """
+        self._budget = min(self._budget + self._budget_percent, MAX_SAVED_HEDGES * HEDGE)
+        window = self._windows.get(backend.identifier)
+
+        if window is None or window.count < self._min_samples:
+            return None
+
+        return window.quantile(self._quantile)
+
+    def acquire_hedge(self):
+        """
+        Takes a hedge from the budget, returns false if the budget is used up.
+        """
+        if self._budget < HEDGE:
+            return False
+
+        self._budget -= HEDGE
+        self.hedges += 1
+        return True
+
+    def record(self, backend: Backend, latency):
+        window = self._windows.get(backend.identifier)
+
+        if window is None:
+            window = LatencyWindow(self._window)
+            self._windows[backend.identifier] = window
+
+        window.record(latency)
+
+    def statistics(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "delays": {
+                identifier: window.quantile(self._quantile) if window.count else None
+                for identifier, window in self._windows.items()
+            },
+        }
@@ -0,0 +1,87 @@
+from fastapi import HTTPException
+
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.hedging_policy import LatencyWindow
+from src.services.request_key import get_api_key
+
+# Client header naming the priority class of a request
+PRIORITY_HEADER = "x-priority"
+
+LATENCY_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+class PriorityService:
+    """
+    Classifies requests into priority classes, e.g. interactive chat traffic and batch jobs, and keeps the latency
+    of the requests of every class, which is also observed in a histogram per class if metrics are enabled. The
+    weight of a class is its share of the slots of a backend while its calls compete with other classes for them,
+    see Bulkhead.
+
+    A request is classified by its api key if the key is mapped to a class, otherwise by its x-priority header,
+    otherwise it belongs to the default class. Mapped keys take precedence, so their clients cannot raise the
+    priority of their own requests.
+    """
+
+    def __init__(
+        self,
+        weights: dict,
+        default_class,
+        api_keys: dict = None,
+        window=1024,
+        metrics: GatewayMetrics = None,
+    ):
+        self.weights = weights
+        self.default_class = default_class
+        self._api_keys = api_keys or {}
+        self._window = window
+        self._metrics = metrics
+        self._latencies = {priority: LatencyWindow(window) for priority in weights}
+        self._requests = dict.fromkeys(weights, 0)
+
+    def classify(self, headers):
+        """
+        Returns the priority class of a request with the given headers. Raises a HTTPException with status 400 if
+        the x-priority header names an unknown class.
+        """
+        if self._api_keys:
+            priority = self._api_keys.get(get_api_key(headers))
+
+            if priority is not None:
+                return priority
+
+        priority = headers.get(PRIORITY_HEADER)
+
+        if priority is None:
+            return self.default_class
+
+        if priority not in self.weights:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{PRIORITY_HEADER} must be one of: {', '.join(self.weights)}",
+            )
+
+        return priority
+
+    def record(self, priority, latency):
+        self._requests[priority] += 1
+        self._latencies[priority].record(latency)
+
+        if self._metrics is not None:
+            self._metrics.priority_latency.observe((priority,), latency)
+
+    def statistics(self) -> dict:
+        return {
+            priority: {
+                "weight": weight,
+                "requests": self._requests[priority],
+                **{
+                    name: _quantile(self._latencies[priority], quantile)
+                    for name, quantile in LATENCY_QUANTILES.items()
+                },
+            }
+            for priority, weight in self.weights.items()
+        }
+
+
+def _quantile(window: LatencyWindow, quantile):
+    return window.quantile(quantile) if window.count else None
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.clients.stream_fan_out import StreamFanOut
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.request_key import create_request_key
+from src.services.response_cache_service import has_deterministic_response
+
+
+class Flight:
+    """
+    A call in flight, shared by the requests waiting for it.
+
+    It has the following attributes:
+        - task: task of the call
+        - waiters: number of requests waiting for the call, that were not cancelled
+        - settled: flag set to true once the call ended and its requests were counted
+    """
+
+    __slots__ = ("task", "waiters", "settled")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+        self.settled = False
+
+
+class RequestCoalescingService:
+    """
+    Lets concurrent identical requests share one upstream call (single flight). The first request with a key makes
+    the call, requests with the same key that arrive while it is in flight wait for it and receive the same
+    response. Streamed responses are fanned out, so every request receives all chunks.
+
+    Only requests with a deterministic response are coalesced, like the response cache, as sampled requests would
+    all receive the same sample. Requests of different tenants never share a call, since the usage of a call is
+    accounted to the tenant of the request that made it.
+
+    The call runs as its own task, so it keeps serving the other requests if the request that started it is
+    cancelled.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self._flights = {}
+
+    def create_key(self, upstream_request: UpstreamRequest):
+        """
+        Returns the key identical requests share a call by, or None if the request must not be coalesced.
+        """
+        if upstream_request.method != "POST":
+            return None
+
+        body = upstream_request.json_body
+
+        if body is None or not has_deterministic_response(upstream_request, body):
+            return None
+
+        return create_request_key(upstream_request, body, upstream_request.tenant or "")
+
+    async def execute(self, key, function, *args, **kwargs):
+        """
+        Calls the function with the given args, or waits for the call in flight with the same key.
+        """
+        if key is None:
+            return await function(*args, **kwargs)
+
+        flight = self._flights.get(key)
+
+        if flight is None:
+            self.upstream_calls += 1
+            flight = Flight(asyncio.ensure_future(self._call(function, args, kwargs)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._end_flight(key, flight))
+        else:
+            self.coalesced_calls += 1
+            self.logger.info("Coalescing request with the call in flight: %s", key)
+
+        flight.waiters += 1
+
+        try:
+            response = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            self._leave_flight(flight)
+            raise
+
+        if isinstance(response, StreamFanOut):
+            return response.subscribe()
+
+        return response
+
+    def statistics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": len(self._flights),
+        }
+
+    @staticmethod
+    async def _call(function, args, kwargs):
+        response = await function(*args, **kwargs)
+
+        if isinstance(response, UpstreamStream):
+            return StreamFanOut(response)
+
+        return response
+
+    def _end_flight(self, key, flight: Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+        flight.settled = True
+        task = flight.task
+
+        # Retrieve the exception, so it is not reported as never retrieved when all requests were cancelled
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        response = task.result()
+
+        if isinstance(response, StreamFanOut):
+            # No request can join the flight anymore, so the stream knows how many subscribers to keep chunks for
+            response.expect(flight.waiters)
+
+    @staticmethod
+    def _leave_flight(flight: Flight):
+        if not flight.settled:
+            flight.waiters -= 1
+            return
+
+        task = flight.task
+
+        if not task.cancelled() and task.exception() is None and isinstance(task.result(), StreamFanOut):
+            task.result().forfeit()
@@ -0,0 +1,35 @@
+import hashlib
+import json
+from urllib.parse import parse_qs
+
+from src.core.model.upstream_request import UpstreamRequest
+
+# Client headers carrying the api key of a request
+API_KEY_HEADER = "api-key"
+AUTHORIZATION_HEADER = "authorization"
+
+
+def create_request_key(upstream_request: UpstreamRequest, body: dict, scope=""):
+    """
+    Returns a hash that is equal for requests to the same deployment path and api version with the same JSON body,
+    regardless of the order of its keys and its whitespace. Requests of different scopes have different keys.
+    """
+    path, _, query = upstream_request.target.partition("?")
+    api_version = parse_qs(query).get("api-version", [""])[0]
+    normalized_body = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    key = "\n".join([upstream_request.method, path, api_version, scope, normalized_body])
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_api_key(headers):
+    """
+    Returns the api key the client sent in the api-key header or as bearer token, or None if it sent none.
+    """
+    api_key = headers.get(API_KEY_HEADER)
+
+    if api_key is not None:
+        return api_key
+
+    scheme, _, token = headers.get(AUTHORIZATION_HEADER, "").partition(" ")
+    return token if scheme.lower() == "bearer" else None
@@ -0,0 +1,65 @@
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.caches.lru_response_cache import CachedResponse, LruResponseCache
+from src.services.request_key import create_request_key
+
+CACHE_STATUS_HEADER = "x-cache-status"
+
+# Cache-Control directives a client sends to skip the cache for a single request
+BYPASS_DIRECTIVES = ["no-cache", "no-store"]
+
+
+class ResponseCacheService:
+    """
+    Serves repeated deterministic requests from a cache, so they use no upstream quota. Requests are keyed by a hash
+    of their deployment path, api version and normalized JSON body. Only requests whose sampling parameters make the
+    output deterministic are cached: temperature 0 with a single choice, or embeddings.
+    """
+
+    def __init__(self, cache: LruResponseCache, enabled=False):
+        self._cache = cache
+        self.enabled = enabled
+
+    def create_key(self, upstream_request: UpstreamRequest):
+        """
+        Returns the cache key of the request, or None if its response must not be cached.
+        """
+        if upstream_request.method != "POST" or upstream_request.stream:
+            return None
+
+        body = upstream_request.json_body
+
+        if body is None:
+            return None
+
+        if not has_deterministic_response(upstream_request, body):
+            return None
+
+        return create_request_key(upstream_request, body)
+
+    def get(self, key) -> CachedResponse:
+        return self._cache.get(key)
+
+    def put(self, key, status_code, headers, content: bytes):
+        if status_code != 200:
+            return
+
+        self._cache.put(key, CachedResponse(status_code, dict(headers), content))
+
+
+def is_deterministic(body: dict):
+    return body.get("temperature") == 0 and body.get("n", 1) == 1
+
+
+def has_deterministic_response(upstream_request: UpstreamRequest, body: dict):
+    """
+    Returns whether the request always has the same response, so it may be answered with the response of another.
+    """
+    return upstream_request.target.partition("?")[0].endswith("/embeddings") or is_deterministic(body)
+
+
+def is_bypassed(cache_control):
+    if not cache_control:
+        return False
+
+    directives = [directive.strip().lower() for directive in cache_control.split(",")]
+    return any(directive in BYPASS_DIRECTIVES for directive in directives)
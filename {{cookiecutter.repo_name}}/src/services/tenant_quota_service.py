@@ -0,0 +1,209 @@
+import math
+from collections import OrderedDict
+from time import monotonic
+
+from fastapi import HTTPException
+
+from src.services.request_key import get_api_key
+
+# Client header naming the tenant of a request whose api key is not mapped to a tenant
+TENANT_HEADER = "x-tenant-id"
+# Tenant of the requests that name none
+ANONYMOUS_TENANT = "anonymous"
+
+
+class TenantQuota:
+    """
+    Token buckets of a tenant, one for its requests and one for its tokens per minute. The buckets are refilled
+    lazily when they are used, so checking a request takes constant time.
+
+    It has the following attributes:
+        - requests_per_minute: requests the tenant may make per minute, 0 for no limit
+        - tokens_per_minute: tokens the tenant may use per minute, 0 for no limit
+        - requests: requests left in the bucket
+        - tokens: tokens left in the bucket, negative while the tenant used more tokens than estimated
+        - updated: monotonic time the buckets were refilled last
+        - accepted_requests: number of requests within the quota
+        - rejected_requests: number of requests over the quota
+        - used_tokens: tokens the responses to the tenant reported, or were estimated to use if they did not
+    """
+
+    __slots__ = (
+        "requests_per_minute",
+        "tokens_per_minute",
+        "requests",
+        "tokens",
+        "updated",
+        "accepted_requests",
+        "rejected_requests",
+        "used_tokens",
+    )
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.updated = monotonic()
+        self.accepted_requests = 0
+        self.rejected_requests = 0
+        self.used_tokens = 0
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.requests + elapsed * self.requests_per_minute / 60, self.requests_per_minute)
+        self.tokens = min(self.tokens + elapsed * self.tokens_per_minute / 60, self.tokens_per_minute)
+
+    def wait_time(self, tokens):
+        """
+        Returns the seconds until the buckets hold a request and the given tokens, 0 if they do now.
+        """
+        wait_time = 0.0
+
+        if self.requests_per_minute and self.requests < 1:
+            wait_time = (1 - self.requests) * 60 / self.requests_per_minute
+
+        if self.tokens_per_minute and self.tokens < tokens:
+            wait_time = max(wait_time, (tokens - self.tokens) * 60 / self.tokens_per_minute)
+
+        return wait_time
+
+
+class TenantQuotaService:
+    """
+    Enforces quotas per tenant at the gateway, so a single consumer cannot use up the quota of the backends for
+    everyone. Every tenant has a bucket of requests per minute and one of tokens per minute. A request takes one
+    request and its estimated tokens from the buckets of its tenant, and is refused with status 429 if they do not
+    hold them. Once the response reports the tokens it used, the difference to the estimate is given back or taken
+    as well.
+
+    A request belongs to the tenant its api key is mapped to, otherwise to the tenant in its x-tenant-id header,
+    otherwise to the anonymous tenant. Only tenants identified by their api key have buckets of their own, with
+    their quota or the default limits. The header is a claim of the client, which could get fresh buckets by naming
+    a new tenant with every request, so tenants named by it only label the usage of their requests and share the
+    buckets of the anonymous tenant. The buckets of at most max_tenants tenants are kept, those used least recently
+    are dropped first.
+    """
+
+    def __init__(
+        self,
+        enabled=False,
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        quotas: dict = None,
+        api_keys: dict = None,
+        max_tenants=10_000,
+    ):
+        self.enabled = enabled
+        self._default_limits = (requests_per_minute, tokens_per_minute)
+        self._limits = {
+            tenant: (quota.get("requests_per_minute", 0), quota.get("tokens_per_minute", 0))
+            for tenant, quota in (quotas or {}).items()
+        }
+        self._api_keys = api_keys or {}
+        self._max_tenants = max_tenants
+        self._quotas = OrderedDict()
+
+    def identify(self, headers):
+        """
+        Returns the tenant of a request with the given headers, and whether it was identified by its api key.
+        """
+        if self._api_keys:
+            tenant = self._api_keys.get(get_api_key(headers))
+
+            if tenant is not None:
+                return tenant, True
+
+        return headers.get(TENANT_HEADER) or ANONYMOUS_TENANT, False
+
+    def reserve(self, tenant, cost, authenticated=True):
+        """
+        Takes a request and the estimated cost from the buckets of the tenant, or of the anonymous tenant if the
+        tenant was not identified by its api key, and returns the quota and the tokens taken, to reconcile them with
+        the tokens the response reports. Returns None if the tenant has no limits. Raises a HTTPException with
+        status 429 and the seconds until the buckets are refilled in the Retry-After header if the request exceeds
+        the quota.
+        """
+        if not authenticated:
+            tenant = ANONYMOUS_TENANT
+
+        quota = self._get_quota(tenant)
+
+        if quota is None:
+            return None
+
+        quota.refill(monotonic())
+        # A request larger than the whole bucket would never fit, it is let through once the bucket is full
+        tokens = min(cost, quota.tokens_per_minute) if quota.tokens_per_minute else 0
+        wait_time = quota.wait_time(tokens)
+
+        if wait_time > 0:
+            quota.rejected_requests += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Quota of tenant '{tenant}' exceeded",
+                headers={"Retry-After": str(math.ceil(wait_time))},
+            )
+
+        if quota.requests_per_minute:
+            quota.requests -= 1
+
+        quota.tokens -= tokens
+        quota.accepted_requests += 1
+        return quota, tokens
+
+    @staticmethod
+    def reconcile(reservation, used_tokens):
+        """
+        Settles a reservation with the tokens the response reported, or keeps the estimate if it reported none.
+        """
+        if reservation is None:
+            return
+
+        quota, tokens = reservation
+
+        if used_tokens is None:
+            used_tokens = tokens
+        elif quota.tokens_per_minute:
+            quota.tokens = min(quota.tokens + tokens - used_tokens, quota.tokens_per_minute)
+
+        quota.used_tokens += used_tokens
+
+    def statistics(self) -> dict:
+        now = monotonic()
+        statistics = {}
+
+        for tenant, quota in self._quotas.items():
+            quota.refill(now)
+            statistics[tenant] = {
+                "requests_per_minute": quota.requests_per_minute,
+                "tokens_per_minute": quota.tokens_per_minute,
+                "remaining_requests": math.floor(quota.requests),
+                "remaining_tokens": math.floor(quota.tokens),
+                "accepted_requests": quota.accepted_requests,
+                "rejected_requests": quota.rejected_requests,
+                "used_tokens": quota.used_tokens,
+            }
+
+        return statistics
+
+    def _get_quota(self, tenant):
+        quota = self._quotas.get(tenant)
+
+        if quota is not None:
+            self._quotas.move_to_end(tenant)
+            return quota
+
+        requests_per_minute, tokens_per_minute = self._limits.get(tenant, self._default_limits)
+
+        if not requests_per_minute and not tokens_per_minute:
+            return None
+
+        quota = TenantQuota(requests_per_minute, tokens_per_minute)
+        self._quotas[tenant] = quota
+
+        if len(self._quotas) > self._max_tenants:
+            self._quotas.popitem(last=False)
+
+        return quota
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.tenant_quota_service import ANONYMOUS_TENANT
+
+USAGE_KEY = b'"usage"'
+# Lines of a stream longer than this cannot be the final chunk with the usage, so they are not kept
+MAX_LINE_LENGTH = 64 * 1024
+# Extension of a response that holds its parsed usage
+USAGE_EXTENSION = "gateway_usage"
+
+_decoder = json.JSONDecoder()
+
+
+class Usage:
+    """
+    Tokens a completion reports in its usage.
+    """
+
+    __slots__ = ("prompt_tokens", "completion_tokens")
+
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+
+def parse_usage(body: bytes):
+    """
+    Returns the usage a response body or stream event reports, or None if it reports none. The usage is the last
+    key of a completion, so only the part of the body after it is decoded. Quotes within JSON strings are escaped,
+    so the key cannot be matched within the content of a message.
+    """
+    index = body.rfind(USAGE_KEY)
+
+    if index < 0:
+        return None
+
+    tail = body[index + len(USAGE_KEY) :].lstrip()
+
+    # Streams report "usage": null in every event but the final one
+    if not tail.startswith(b":") or tail[1:].lstrip().startswith(b"null"):
+        return None
+
+    try:
+        usage, _ = _decoder.raw_decode(tail[1:].decode().lstrip())
+        return Usage(int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0))
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def get_usage(response):
+    """
+    Returns the usage the body of a response reports. It is parsed once per response and kept in its extensions,
+    so the usage accounting and the tenant quota share it.
+    """
+    extensions = response.extensions
+
+    if USAGE_EXTENSION not in extensions:
+        extensions[USAGE_EXTENSION] = parse_usage(response.content)
+
+    return extensions[USAGE_EXTENSION]
+
+
+class UsageScanner:
+    """
+    Finds the usage in the final event of a stream, while the chunks pass through. Only the incomplete last line of
+    the chunks is kept, and a complete line is only decoded if it contains the usage key.
+
+    It has the following attributes:
+        - usage: usage of the stream, None until an event reported it
+    """
+
+    __slots__ = ("usage", "_tail")
+
+    def __init__(self):
+        self.usage = None
+        self._tail = b""
+
+    @property
+    def total_tokens(self):
+        return self.usage.total_tokens if self.usage is not None else None
+
+    def feed(self, chunk: bytes):
+        data = self._tail + chunk if self._tail else chunk
+        end = data.rfind(b"\n")
+
+        if end < 0:
+            self._tail = data if len(data) <= MAX_LINE_LENGTH else b""
+            return
+
+        self._tail = data[end + 1 :]
+
+        if USAGE_KEY not in data[:end]:
+            return
+
+        for line in reversed(data[:end].split(b"\n")):
+            if line.startswith(b"data:") and USAGE_KEY in line:
+                usage = parse_usage(line)
+
+                if usage is not None:
+                    self.usage = usage
+                    return
+
+
+class UsageAccountingService:
+    """
+    Accounts for the tokens the backends report in the usage of their responses, per backend, deployment and
+    tenant. Every call to a backend is accounted once, also when it is shared by coalesced requests or a hedge
+    was sent alongside it. A response only adds to the aggregates of the current period, which are flushed into the
+    totals, the log and the metrics every flush_interval seconds.
+
+    Streams only report their usage in their final event if the client asked for it, with stream_options
+    include_usage. Streams without usage are counted as requests without tokens.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, flush_interval=60.0, metrics: GatewayMetrics = None):
+        self._flush_interval = flush_interval
+        self._metrics = metrics
+        # Requests, prompt tokens and completion tokens per backend, deployment and tenant
+        self._pending = {}
+        self._totals = {}
+        self._task = None
+
+    def record(self, backend_id, upstream_request: UpstreamRequest, usage: Usage):
+        key = (
+            backend_id,
+            get_deployment(upstream_request.target),
+            upstream_request.tenant or ANONYMOUS_TENANT,
+        )
+        counts = self._pending.get(key)
+
+        if counts is None:
+            counts = self._pending[key] = [0, 0, 0]
+
+        counts[0] += 1
+
+        if usage is not None:
+            counts[1] += usage.prompt_tokens
+            counts[2] += usage.completion_tokens
+
+    def record_response(self, backend_id, upstream_request: UpstreamRequest, response):
+        self.record(backend_id, upstream_request, get_usage(response))
+
+    def scan_stream(self, backend_id, upstream_request: UpstreamRequest, upstream_stream: UpstreamStream):
+        """
+        Records the usage of the stream once it is closed.
+        """
+        scanner = UsageScanner()
+        upstream_stream.add_chunk_callback(scanner.feed)
+        upstream_stream.add_close_callback(lambda: self.record(backend_id, upstream_request, scanner.usage))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        self.flush()
+
+    def flush(self):
+        pending = self._pending
+        self._pending = {}
+
+        for key, (requests, prompt_tokens, completion_tokens) in pending.items():
+            totals = self._totals.get(key)
+
+            if totals is None:
+                totals = self._totals[key] = [0, 0, 0]
+
+            totals[0] += requests
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+            backend_id, deployment, tenant = key
+            self.logger.info(
+                "Token usage of backend '%s', deployment '%s', tenant '%s': %s requests, %s prompt tokens, "
+                "%s completion tokens",
+                backend_id,
+                deployment,
+                tenant,
+                requests,
+                prompt_tokens,
+                completion_tokens,
+            )
+
+            if self._metrics is not None:
+                self._metrics.record_usage(backend_id, deployment, prompt_tokens, completion_tokens)
+
+    def statistics(self) -> dict:
+        """
+        Returns the totals including the current period, per backend, deployment and tenant, and in sum.
+        """
+        usage = []
+        total = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        for key in self._totals.keys() | self._pending.keys():
+            totals = self._totals.get(key, (0, 0, 0))
+            pending = self._pending.get(key, (0, 0, 0))
+            requests, prompt_tokens, completion_tokens = (a + b for a, b in zip(totals, pending))
+            backend_id, deployment, tenant = key
+            row = {
+                "requests": requests,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            usage.append({"backend": backend_id, "deployment": deployment, "tenant": tenant, **row})
+
+            for name, value in row.items():
+                total[name] += value
+
+        usage.sort(key=lambda row: (row["backend"], row["deployment"], row["tenant"]))
+        return {"total": total, "usage": usage}
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            self.flush()
+
+
+def get_deployment(target):
+    """
+    Returns the deployment an /openai/deployments/<deployment>/... target addresses, or an empty string.
+    """
+    parts = target.split("/", 4)
+
+    if len(parts) > 3 and parts[2] == "deployments":
+        return parts[3].partition("?")[0]
+
+    return ""
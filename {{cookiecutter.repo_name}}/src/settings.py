@@ -1,20 +1,140 @@
+import json
 import os
 
 from pydantic import SecretStr
 
 
+def get_bool_env(name, default=False):
+    value = os.getenv(name)
+
+    if value is None:
+        return default
+
+    return value.lower() in ["true", "yes", "1"]
+
+
+def get_backends_env(name):
+    value = os.getenv(name)
+
+    if value is None:
+        return None
+
+    try:
+        backends = json.loads(value)
+    except ValueError:
+        raise Exception(f"{name} must be a JSON list of backends")
+
+    if not isinstance(backends, list) or not backends:
+        raise Exception(f"{name} must be a non-empty JSON list of backends")
+
+    names = set()
+
+    for backend in backends:
+        if not isinstance(backend, dict) or not all(
+            backend.get(key) for key in ["name", "host", "api_key"]
+        ):
+            raise Exception(f"Every backend in {name} must have a name, host and api_key")
+
+        if backend["name"] in names:
+            raise Exception(f"Backend names in {name} must be unique")
+
+        weight = backend.get("weight", 1)
+
+        if not isinstance(weight, int) or weight < 1:
+            raise Exception(f"Backend weights in {name} must be positive integers")
+
+        names.add(backend["name"])
+        backend["api_key"] = SecretStr(backend["api_key"])
+        backend["weight"] = weight
+
+    return backends
+
+
+def get_sample_rates_env(name):
+    try:
+        rates = json.loads(os.getenv(name, "{}"))
+    except ValueError:
+        raise Exception(f"{name} must be a JSON object of loggers and their sample rates")
+
+    if not isinstance(rates, dict) or not all(
+        isinstance(rate, (int, float)) and 0 <= rate <= 1 for rate in rates.values()
+    ):
+        raise Exception(f"{name} must map every logger to a sample rate between 0 and 1")
+
+    return rates
+
+
+def get_priority_classes_env(name, default):
+    try:
+        classes = json.loads(os.getenv(name, default))
+    except ValueError:
+        raise Exception(f"{name} must be a JSON object of priority classes and their weights")
+
+    if (
+        not isinstance(classes, dict)
+        or not classes
+        or not all(isinstance(weight, int) and weight >= 1 for weight in classes.values())
+    ):
+        raise Exception(f"{name} must map every priority class to a positive integer weight")
+
+    return classes
+
+
+def get_priority_api_keys_env(name, classes):
+    value = os.getenv(name, "{}")
+
+    try:
+        api_keys = json.loads(value)
+    except ValueError:
+        raise Exception(f"{name} must be a JSON object of api keys and their priority classes")
+
+    if not isinstance(api_keys, dict) or not all(
+        priority in classes for priority in api_keys.values()
+    ):
+        raise Exception(f"{name} must map api keys to priority classes")
+
+    return SecretStr(value)
+
+
+def get_tenant_quotas_env(name):
+    try:
+        quotas = json.loads(os.getenv(name, "{}"))
+    except ValueError:
+        raise Exception(f"{name} must be a JSON object of tenants and their quotas")
+
+    if not isinstance(quotas, dict) or not all(
+        isinstance(quota, dict)
+        and set(quota) <= {"requests_per_minute", "tokens_per_minute"}
+        and all(isinstance(limit, int) and limit >= 0 for limit in quota.values())
+        for quota in quotas.values()
+    ):
+        raise Exception(
+            f"{name} must map every tenant to non-negative requests_per_minute and tokens_per_minute"
+        )
+
+    return quotas
+
+
+def get_tenant_api_keys_env(name):
+    value = os.getenv(name, "{}")
+
+    try:
+        api_keys = json.loads(value)
+    except ValueError:
+        raise Exception(f"{name} must be a JSON object of api keys and their tenants")
+
+    if not isinstance(api_keys, dict) or not all(
+        isinstance(tenant, str) and tenant for tenant in api_keys.values()
+    ):
+        raise Exception(f"{name} must map api keys to tenant names")
+
+    return SecretStr(value)
+
+
 class Settings:
     def __init__(self):
         self.app_version = os.getenv("APP_VERSION", "UNKNOWN_VERSION")
-        app_insights_enabled = os.getenv("APPLICATION_INSIGHTS_ENABLED")
-        if app_insights_enabled is not None:
-            self.app_insights_enabled = app_insights_enabled.lower() in [
-                "true",
-                "yes",
-                "1",
-            ]
-        else:
-            self.app_insights_enabled = False
+        self.app_insights_enabled = get_bool_env("APPLICATION_INSIGHTS_ENABLED")
         self.app_insights_connection_string: SecretStr = SecretStr(
             os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
         )
@@ -23,6 +143,71 @@ class Settings:
             os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3")
         )
         self.circuit_retry_timeout = int(os.getenv("CIRCUIT_RETRY_TIMEOUT", "10"))
+        self.circuit_half_open_max_probes = int(
+            os.getenv("CIRCUIT_HALF_OPEN_MAX_PROBES", "1")
+        )
+        self.circuit_backoff_multiplier = float(
+            os.getenv("CIRCUIT_BACKOFF_MULTIPLIER", "2")
+        )
+        self.circuit_max_retry_timeout = int(
+            os.getenv("CIRCUIT_MAX_RETRY_TIMEOUT", "300")
+        )
+        self.circuit_probe_lease = float(os.getenv("CIRCUIT_PROBE_LEASE", "120"))
+        # Policy that opens the circuits: "consecutive" failures, or the failure and slow call rates in a "window"
+        self.circuit_policy = os.getenv("CIRCUIT_POLICY", "consecutive")
+        self.circuit_window = float(os.getenv("CIRCUIT_WINDOW", "60"))
+        self.circuit_window_buckets = int(os.getenv("CIRCUIT_WINDOW_BUCKETS", "10"))
+        self.circuit_failure_rate_threshold = float(
+            os.getenv("CIRCUIT_FAILURE_RATE_THRESHOLD", "0.5")
+        )
+        self.circuit_slow_call_duration = float(
+            os.getenv("CIRCUIT_SLOW_CALL_DURATION", "30")
+        )
+        self.circuit_slow_call_rate_threshold = float(
+            os.getenv("CIRCUIT_SLOW_CALL_RATE_THRESHOLD", "0.8")
+        )
+        self.circuit_minimum_calls = int(os.getenv("CIRCUIT_MINIMUM_CALLS", "10"))
+
+        # Storage of the circuits: "in_memory" per worker process, "shared_memory" for all workers on a node,
+        # or "redis" / "sqlite" for all nodes of a deployment
+        self.circuit_repository = os.getenv("CIRCUIT_REPOSITORY", "in_memory")
+        self.circuit_shared_memory_name = os.getenv(
+            "CIRCUIT_SHARED_MEMORY_NAME", "genai-gateway-circuits"
+        )
+        self.circuit_shared_memory_slots = int(
+            os.getenv("CIRCUIT_SHARED_MEMORY_SLOTS", "64")
+        )
+        self.circuit_redis_url: SecretStr = SecretStr(
+            os.getenv("CIRCUIT_REDIS_URL", "redis://localhost:6379/0")
+        )
+        self.circuit_sqlite_path = os.getenv("CIRCUIT_SQLITE_PATH", "circuits.db")
+        self.circuit_sync_interval = float(os.getenv("CIRCUIT_SYNC_INTERVAL", "1"))
+
+        # Connection pool and timeouts of the long-lived upstream http clients
+        self.upstream_max_connections = int(
+            os.getenv("UPSTREAM_MAX_CONNECTIONS", "100")
+        )
+        self.upstream_max_keepalive_connections = int(
+            os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20")
+        )
+        self.upstream_keepalive_expiry = float(
+            os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30")
+        )
+        self.upstream_http2_enabled = get_bool_env("UPSTREAM_HTTP2_ENABLED")
+        self.upstream_connect_timeout = float(
+            os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5")
+        )
+        self.upstream_read_timeout = float(os.getenv("UPSTREAM_READ_TIMEOUT", "120"))
+
+        # Cache of responses to deterministic requests, e.g. with temperature 0
+        self.response_cache_enabled = get_bool_env("RESPONSE_CACHE_ENABLED")
+        self.response_cache_max_bytes = int(
+            os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+        )
+        self.response_cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+        # Sharing of one upstream call by concurrent identical requests
+        self.request_coalescing_enabled = get_bool_env("REQUEST_COALESCING_ENABLED")
 
         self.primary_open_ai_host = os.getenv("PRIMARY_OPENAI_HOST")
         self.primary_open_ai_api_key: SecretStr = SecretStr(
@@ -33,15 +218,148 @@ class Settings:
             os.getenv("FALLBACK_OPENAI_API_KEY")
         )
 
+        # Pool of backends that share the traffic according to their weight, as a JSON list of
+        # {"name": ..., "host": ..., "api_key": ..., "weight": ...} objects. Defaults to the primary backend.
+        self.open_ai_backends = get_backends_env("OPENAI_BACKENDS")
+        self.backend_pool_max_attempts = int(
+            os.getenv("BACKEND_POOL_MAX_ATTEMPTS", "2")
+        )
+        # Selection of the backend per request: "weighted" round robin, or "latency" aware by power of two choices
+        self.backend_selector = os.getenv("BACKEND_SELECTOR", "weighted")
+        self.backend_latency_decay = float(os.getenv("BACKEND_LATENCY_DECAY", "10"))
+        # Routing by the quota the backends report in their x-ratelimit-remaining headers
+        self.rate_limit_routing_enabled = get_bool_env("RATE_LIMIT_ROUTING_ENABLED", True)
+        self.rate_limit_window = float(os.getenv("RATE_LIMIT_WINDOW", "60"))
+        self.rate_limit_max_queue_time = float(
+            os.getenv("RATE_LIMIT_MAX_QUEUE_TIME", "1")
+        )
+        # Time budget of a request across all its calls, which clients can override with the x-request-timeout header
+        self.request_timeout = float(os.getenv("REQUEST_TIMEOUT", "60"))
+        self.request_max_timeout = float(os.getenv("REQUEST_MAX_TIMEOUT", "300"))
+        self.fallback_min_timeout = float(os.getenv("FALLBACK_MIN_TIMEOUT", "10"))
+        # Hedging of calls slower than the given quantile of the latencies of their backend with the fallback
+        self.hedging_enabled = get_bool_env("HEDGING_ENABLED")
+        self.hedging_quantile = float(os.getenv("HEDGING_QUANTILE", "0.95"))
+        self.hedging_budget_percent = float(os.getenv("HEDGING_BUDGET_PERCENT", "5"))
+        self.hedging_min_samples = int(os.getenv("HEDGING_MIN_SAMPLES", "20"))
+        # Limit of the calls in flight per backend, with a bounded queue of calls waiting for a slot
+        self.bulkhead_enabled = get_bool_env("BULKHEAD_ENABLED")
+        self.bulkhead_max_concurrency = int(os.getenv("BULKHEAD_MAX_CONCURRENCY", "100"))
+        self.bulkhead_max_queue_size = int(os.getenv("BULKHEAD_MAX_QUEUE_SIZE", "100"))
+        self.bulkhead_max_queue_time = float(os.getenv("BULKHEAD_MAX_QUEUE_TIME", "5"))
+        # Limit per backend: "static", or learned from the latencies and throttles of the backend by "gradient"
+        self.bulkhead_limiter = os.getenv("BULKHEAD_LIMITER", "static")
+        self.bulkhead_initial_limit = int(os.getenv("BULKHEAD_INITIAL_LIMIT", "20"))
+        self.bulkhead_min_limit = int(os.getenv("BULKHEAD_MIN_LIMIT", "1"))
+        self.bulkhead_latency_tolerance = float(
+            os.getenv("BULKHEAD_LATENCY_TOLERANCE", "2")
+        )
+        self.bulkhead_backoff_ratio = float(os.getenv("BULKHEAD_BACKOFF_RATIO", "0.9"))
+        # Priority classes of the requests and their weights, as a JSON object, and the api keys mapped to a class
+        self.priority_classes = get_priority_classes_env(
+            "PRIORITY_CLASSES", '{"interactive": 4, "default": 2, "batch": 1}'
+        )
+        self.priority_default_class = os.getenv("PRIORITY_DEFAULT_CLASS", "default")
+        self.priority_api_keys: SecretStr = get_priority_api_keys_env(
+            "PRIORITY_API_KEYS", self.priority_classes
+        )
+
+        # Quotas per tenant in requests and estimated tokens per minute, 0 for no limit
+        self.tenant_quotas_enabled = get_bool_env("TENANT_QUOTAS_ENABLED")
+        self.tenant_requests_per_minute = int(os.getenv("TENANT_REQUESTS_PER_MINUTE", "0"))
+        self.tenant_tokens_per_minute = int(os.getenv("TENANT_TOKENS_PER_MINUTE", "0"))
+        self.tenant_quotas = get_tenant_quotas_env("TENANT_QUOTAS")
+        self.tenant_api_keys: SecretStr = get_tenant_api_keys_env("TENANT_API_KEYS")
+
+        # Logs of the gateway are written by a background thread, bodies are truncated to LOG_BODY_MAX_LENGTH
+        self.log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        self.log_body_max_length = int(os.getenv("LOG_BODY_MAX_LENGTH", "1024"))
+        self.log_sample_rates = get_sample_rates_env("LOG_SAMPLE_RATES")
+
+        # Metrics at /metrics, shared by the workers on a node through METRICS_DIRECTORY if it is set
+        self.metrics_enabled = get_bool_env("METRICS_ENABLED", default=True)
+        self.metrics_directory = os.getenv("METRICS_DIRECTORY", "")
+        self.metrics_export_interval = float(os.getenv("METRICS_EXPORT_INTERVAL", "5.0"))
+
+        # Tokens reported in the usage of the responses, flushed to the log and metrics every interval
+        self.usage_accounting_enabled = get_bool_env("USAGE_ACCOUNTING_ENABLED", default=True)
+        self.usage_flush_interval = float(os.getenv("USAGE_FLUSH_INTERVAL", "60.0"))
+
         # Validate all config vars
+        if self.circuit_repository not in ["in_memory", "shared_memory", "redis", "sqlite"]:
+            raise Exception(
+                "CIRCUIT_REPOSITORY must be 'in_memory', 'shared_memory', 'redis' or 'sqlite'"
+            )
+
+        if self.circuit_policy not in ["consecutive", "window"]:
+            raise Exception("CIRCUIT_POLICY must be 'consecutive' or 'window'")
+
+        if self.circuit_window <= 0 or self.circuit_window_buckets < 1:
+            raise Exception("CIRCUIT_WINDOW and CIRCUIT_WINDOW_BUCKETS must be positive")
+
         if self.fallback_open_ai_host is None:
             raise Exception("FALLBACK_OPENAI_HOST must be set")
 
         if self.fallback_open_ai_api_key.get_secret_value() is None:
             raise Exception("FALLBACK_OPENAI_API_KEY must be set")
 
-        if self.primary_open_ai_host is None:
-            raise Exception("PRIMARY_OPENAI_HOST must be set")
+        if self.backend_selector not in ["weighted", "latency"]:
+            raise Exception("BACKEND_SELECTOR must be 'weighted' or 'latency'")
+
+        if self.request_timeout <= 0 or self.request_max_timeout < self.request_timeout:
+            raise Exception("REQUEST_TIMEOUT must be positive and at most REQUEST_MAX_TIMEOUT")
+
+        if not 0 < self.hedging_quantile < 1:
+            raise Exception("HEDGING_QUANTILE must be between 0 and 1")
+
+        if self.bulkhead_max_concurrency < 1 or self.bulkhead_max_queue_size < 0:
+            raise Exception(
+                "BULKHEAD_MAX_CONCURRENCY must be positive and BULKHEAD_MAX_QUEUE_SIZE not negative"
+            )
+
+        if self.bulkhead_limiter not in ["static", "gradient"]:
+            raise Exception("BULKHEAD_LIMITER must be 'static' or 'gradient'")
+
+        if not 1 <= self.bulkhead_min_limit <= self.bulkhead_max_concurrency:
+            raise Exception("BULKHEAD_MIN_LIMIT must be between 1 and BULKHEAD_MAX_CONCURRENCY")
+
+        if not 0 < self.bulkhead_backoff_ratio < 1:
+            raise Exception("BULKHEAD_BACKOFF_RATIO must be between 0 and 1")
 
-        if self.primary_open_ai_api_key.get_secret_value() is None:
-            raise Exception("PRIMARY_OPENAI_API_KEY must be set")
+        if self.priority_default_class not in self.priority_classes:
+            raise Exception("PRIORITY_DEFAULT_CLASS must be one of the PRIORITY_CLASSES")
+
+        if self.tenant_requests_per_minute < 0 or self.tenant_tokens_per_minute < 0:
+            raise Exception("TENANT_REQUESTS_PER_MINUTE and TENANT_TOKENS_PER_MINUTE must not be negative")
+
+        if self.log_level not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
+            raise Exception("LOG_LEVEL must be 'DEBUG', 'INFO', 'WARNING', 'ERROR' or 'CRITICAL'")
+
+        if self.log_queue_size < 1 or self.log_body_max_length < 0:
+            raise Exception("LOG_QUEUE_SIZE must be positive and LOG_BODY_MAX_LENGTH not negative")
+
+        if self.usage_flush_interval <= 0:
+            raise Exception("USAGE_FLUSH_INTERVAL must be positive")
+
+        if self.metrics_export_interval <= 0:
+            raise Exception("METRICS_EXPORT_INTERVAL must be positive")
+
+        if self.backend_pool_max_attempts < 1:
+            raise Exception("BACKEND_POOL_MAX_ATTEMPTS must be at least 1")
+
+        if self.open_ai_backends is None:
+            if self.primary_open_ai_host is None:
+                raise Exception("PRIMARY_OPENAI_HOST must be set")
+
+            if self.primary_open_ai_api_key.get_secret_value() is None:
+                raise Exception("PRIMARY_OPENAI_API_KEY must be set")
+
+            self.open_ai_backends = [
+                {
+                    "name": "primary",
+                    "host": self.primary_open_ai_host,
+                    "api_key": self.primary_open_ai_api_key,
+                    "weight": 1,
+                }
+            ]
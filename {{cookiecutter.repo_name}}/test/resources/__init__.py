@@ -1,7 +1,8 @@
 from .test_base import TestBase
-from .stubs import SettingsStub
+from .stubs import SettingsStub, UpstreamStub
 
 __all__ = [
     "SettingsStub",
-    "TestBase"
-]
\ No newline at end of file
+    "TestBase",
+    "UpstreamStub"
+]
@@ -1,4 +1,5 @@
 from .settings_stub import SettingsStub
+from .upstream_stub import UpstreamStub
 
 
-__all__ = ["SettingsStub"]
+__all__ = ["SettingsStub", "UpstreamStub"]
@@ -0,0 +1,38 @@
+import httpx
+
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+
+
+class UpstreamStub:
+    """
+    Stub for the upstream OpenAI hosts. Records every forwarded request and answers with the
+    configured responses, or raises the configured exceptions, in order.
+    """
+
+    def __init__(self, *responses):
+        self.requests = []
+        self.responses = list(responses)
+        self.transport = httpx.MockTransport(self._handle)
+
+    def install(self, container):
+        """
+        Routes all upstream calls of the application in the container to this stub.
+        """
+        container.upstream_client_pool.override(
+            UpstreamClientPool(transport=self.transport)
+        )
+        # The forwarding service holds on to the client pool it was created with
+        container.forwarding_service.reset()
+
+    @property
+    def call_count(self):
+        return len(self.requests)
+
+    def _handle(self, request: httpx.Request):
+        self.requests.append(request)
+        response = self.responses[0] if len(self.responses) == 1 else self.responses.pop(0)
+
+        if isinstance(response, Exception):
+            raise response
+
+        return response
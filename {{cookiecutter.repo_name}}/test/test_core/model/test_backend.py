@@ -0,0 +1,20 @@
+from unittest import TestCase
+
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+
+
+class Test(TestCase):
+    def test_computes_static_request_data(self):
+        backend = Backend("primary", "https://some-host:8443", SecretStr("some-key"))
+
+        self.assertEqual("https://some-host:8443", backend.base_url)
+        self.assertEqual(
+            [("host", "some-host"), ("api-key", "some-key")], backend.headers
+        )
+
+    def test_str_does_not_contain_api_key(self):
+        backend = Backend("primary", "https://some-host", SecretStr("some-key"))
+
+        self.assertTrue("some-key" not in str(backend))
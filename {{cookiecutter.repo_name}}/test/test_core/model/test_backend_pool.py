@@ -0,0 +1,84 @@
+from collections import Counter
+from time import time
+from unittest import TestCase
+
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+from src.core.model.backend_pool import BackendPool
+
+
+def create_backend(identifier, weight=1):
+    return Backend(identifier, f"https://{identifier}", SecretStr("some-key"), weight)
+
+
+def first_selected(pool: BackendPool, count):
+    return [next(pool.select()).identifier for _ in range(count)]
+
+
+class Test(TestCase):
+    def test_select_spreads_traffic_according_to_weights(self):
+        pool = BackendPool([create_backend("east", 3), create_backend("west", 1)])
+
+        selected = Counter(first_selected(pool, 400))
+
+        self.assertEqual({"east": 300, "west": 100}, selected)
+
+    def test_select_interleaves_backends(self):
+        pool = BackendPool([create_backend("east", 2), create_backend("west", 2)])
+
+        self.assertEqual(["east", "west", "east", "west"], first_selected(pool, 4))
+
+    def test_select_yields_other_available_backends_after_the_first(self):
+        pool = BackendPool(
+            [create_backend("east"), create_backend("west"), create_backend("north")]
+        )
+
+        selected = [backend.identifier for backend in pool.select()]
+
+        self.assertEqual(["east", "west", "north"], selected)
+
+    def test_select_skips_unavailable_backends(self):
+        east = create_backend("east", 3)
+        pool = BackendPool([east, create_backend("west")])
+
+        pool.mark_unavailable(east, time() + 60)
+
+        self.assertEqual(["west"] * 4, first_selected(pool, 4))
+        self.assertEqual(["west"], [backend.identifier for backend in pool.select()])
+
+    def test_select_yields_all_backends_given_backends_leave_during_selection(self):
+        pool = BackendPool([create_backend("a"), create_backend("b"), create_backend("c")])
+        selected = []
+
+        for backend in pool.select():
+            selected.append(backend.identifier)
+            pool.mark_unavailable(backend, time() + 60)
+
+        self.assertEqual(["a", "b", "c"], selected)
+
+    def test_select_yields_nothing_given_no_available_backends(self):
+        east = create_backend("east")
+        pool = BackendPool([east])
+
+        pool.mark_unavailable(east, time() + 60)
+
+        self.assertEqual([], list(pool.select()))
+
+    def test_unavailable_backend_rejoins_at_retry_time(self):
+        east = create_backend("east")
+        pool = BackendPool([east, create_backend("west")])
+
+        pool.mark_unavailable(east, time() - 1)
+
+        self.assertEqual({"east", "west"}, set(first_selected(pool, 2)))
+        self.assertEqual({}, pool.unavailable)
+
+    def test_mark_available_restores_backend_order(self):
+        east = create_backend("east")
+        pool = BackendPool([east, create_backend("west")])
+
+        pool.mark_unavailable(east, time() + 60)
+        pool.mark_available(east)
+
+        self.assertEqual(["east", "west"], [backend.identifier for backend in pool.available])
@@ -1,6 +1,7 @@
 from time import time
 from unittest import TestCase
-from src.core.model.circuit import Circuit
+from src.core.model.circuit import Circuit, CircuitState
+from src.core.model.circuit_window import CircuitWindow
 from unittest.mock import patch
 
 
@@ -93,6 +94,15 @@ class Test(TestCase):
         assert circuit.last_failure is None
         assert circuit.failure_count == 0
 
+    def test_reset_closed_circuit_is_not_a_transition(self):
+        circuit = Circuit(identifier="test", failure_count=2)
+
+        with self.assertNoLogs("src.core.model.circuit", "INFO"):
+            circuit.reset_circuit()
+
+        assert circuit.failure_count == 0
+        assert circuit.generation == 0
+
     def test_is_retry_time(self):
         circuit = Circuit(
             identifier="test",
@@ -108,3 +118,172 @@ class Test(TestCase):
         assert circuit.is_retry_time()
         circuit.last_failure = time() - 10
         assert not circuit.is_retry_time()
+
+    def test_half_open_admits_bounded_number_of_probes(self):
+        circuit = Circuit(
+            identifier="test",
+            failure_threshold=1,
+            retry_timeout=10,
+            half_open_max_probes=2,
+        )
+
+        circuit.handle_failed_call()
+        assert circuit.state == CircuitState.OPEN
+        circuit.last_failure = time() - 10
+
+        assert circuit.is_callable()
+        assert circuit.state == CircuitState.HALF_OPEN
+        assert circuit.is_callable()
+        assert not circuit.is_callable()
+        assert not circuit.is_callable()
+        assert circuit.probes_in_flight == 2
+
+    def test_successful_probe_closes_circuit(self):
+        circuit = Circuit(identifier="test", failure_threshold=1, retry_timeout=10)
+
+        circuit.handle_failed_call()
+        circuit.last_failure = time() - 10
+        assert circuit.is_callable()
+
+        circuit.handle_successful_call()
+        assert circuit.state == CircuitState.CLOSED
+        assert circuit.open_count == 0
+        assert circuit.is_callable()
+        assert circuit.is_callable()
+
+    def test_failed_probe_reopens_circuit_with_backoff(self):
+        circuit = Circuit(
+            identifier="test",
+            failure_threshold=1,
+            retry_timeout=10,
+            backoff_multiplier=2,
+            max_retry_timeout=30,
+        )
+
+        circuit.handle_failed_call()
+        assert circuit.current_retry_timeout == 10
+
+        circuit.last_failure = time() - 10
+        assert circuit.is_callable()
+        circuit.handle_failed_call()
+        assert circuit.state == CircuitState.OPEN
+        assert circuit.current_retry_timeout == 20
+
+        circuit.last_failure = time() - 10
+        assert not circuit.is_callable()
+        circuit.last_failure = time() - 20
+        assert circuit.is_callable()
+        circuit.handle_failed_call()
+        assert circuit.current_retry_timeout == 30
+
+        circuit.last_failure = time() - 30
+        assert circuit.is_callable()
+        circuit.handle_failed_call()
+        assert circuit.current_retry_timeout == 30
+
+    def test_abandoned_probe_frees_probe_slot(self):
+        circuit = Circuit(identifier="test", failure_threshold=1, retry_timeout=10)
+
+        circuit.handle_failed_call()
+        circuit.last_failure = time() - 10
+        assert circuit.is_callable()
+        assert not circuit.is_callable()
+
+        circuit.handle_abandoned_call()
+        assert circuit.state == CircuitState.HALF_OPEN
+        assert circuit.is_callable()
+
+    def test_expired_probe_lease_admits_new_probe(self):
+        circuit = Circuit("test", retry_timeout=0, probe_lease=60)
+        circuit.trip()
+        circuit.last_failure = time()
+        self.assertTrue(circuit.is_callable())
+        self.assertFalse(circuit.is_callable())
+
+        circuit.probe_started = time() - 61
+
+        self.assertTrue(circuit.is_callable())
+        self.assertEqual(1, circuit.probes_in_flight)
+
+    def test_throttled_call_opens_circuit_for_retry_after(self):
+        circuit = Circuit(identifier="test", failure_threshold=3, retry_timeout=10)
+
+        circuit.handle_throttled_call(2)
+
+        assert circuit.state == CircuitState.OPEN
+        assert circuit.failure_count == 0
+        assert circuit.open_count == 0
+        assert not circuit.is_callable()
+
+        circuit.open_until = time()
+        assert circuit.is_callable()
+        assert circuit.state == CircuitState.HALF_OPEN
+
+    def test_throttled_call_without_retry_after_uses_retry_timeout(self):
+        circuit = Circuit(identifier="test", retry_timeout=10)
+
+        circuit.handle_throttled_call()
+
+        assert circuit.open_until == circuit.last_failure + 10
+
+    def test_throttled_call_is_capped_at_max_retry_timeout(self):
+        circuit = Circuit(identifier="test", retry_timeout=10, max_retry_timeout=30)
+
+        circuit.handle_throttled_call(3600)
+
+        assert circuit.open_until == circuit.last_failure + 30
+
+    def test_failed_probe_after_throttle_uses_backoff(self):
+        circuit = Circuit(identifier="test", retry_timeout=10)
+        circuit.handle_throttled_call(1)
+        circuit.open_until = time()
+        assert circuit.is_callable()
+
+        circuit.handle_failed_call()
+
+        assert circuit.state == CircuitState.OPEN
+        assert circuit.open_until is None
+        assert circuit.retry_at == circuit.last_failure + 10
+
+
+class TestCircuitWithWindow(TestCase):
+    def test_interleaved_failures_trip_circuit(self):
+        circuit = Circuit(
+            "test",
+            failure_threshold=3,
+            window=CircuitWindow(failure_rate_threshold=0.4, minimum_calls=10),
+        )
+
+        for _ in range(5):
+            circuit.handle_successful_call()
+            circuit.handle_failed_call()
+
+        self.assertEqual(CircuitState.OPEN, circuit.state)
+        self.assertIsNotNone(circuit.retry_at)
+
+    def test_slow_successful_calls_trip_circuit(self):
+        circuit = Circuit(
+            "test",
+            window=CircuitWindow(
+                slow_call_duration=1.0, slow_call_rate_threshold=0.5, minimum_calls=2
+            ),
+        )
+
+        circuit.handle_successful_call(latency=0.1)
+        self.assertEqual(CircuitState.CLOSED, circuit.state)
+        circuit.handle_successful_call(latency=2.0)
+
+        self.assertEqual(CircuitState.OPEN, circuit.state)
+        self.assertIsNotNone(circuit.last_failure)
+
+    def test_successful_probe_closes_circuit_and_clears_window(self):
+        window = CircuitWindow(minimum_calls=1)
+        circuit = Circuit("test", retry_timeout=0, window=window)
+        circuit.handle_failed_call()
+        self.assertEqual(CircuitState.OPEN, circuit.state)
+
+        self.assertTrue(circuit.is_callable())
+        circuit.handle_successful_call()
+
+        self.assertEqual(CircuitState.CLOSED, circuit.state)
+        self.assertFalse(window.should_trip())
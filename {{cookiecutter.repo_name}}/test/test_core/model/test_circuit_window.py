@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from src.core.model.circuit_window import CircuitWindow
+
+
+class TestCircuitWindow(TestCase):
+    def test_trips_on_failure_rate(self):
+        window = CircuitWindow(failure_rate_threshold=0.4, minimum_calls=5)
+
+        outcomes = [window.record(failed, now=100.0) for failed in [False, True, False, True]]
+        self.assertEqual([False] * 4, outcomes)
+        self.assertTrue(window.record(False, now=100.0))
+
+    def test_does_not_trip_below_minimum_calls(self):
+        window = CircuitWindow(minimum_calls=3)
+
+        self.assertFalse(window.record(True, now=100.0))
+        self.assertFalse(window.record(True, now=100.0))
+        self.assertTrue(window.record(True, now=100.0))
+
+    def test_trips_on_slow_call_rate(self):
+        window = CircuitWindow(
+            slow_call_duration=2.0, slow_call_rate_threshold=0.5, minimum_calls=2
+        )
+
+        self.assertFalse(window.record(False, latency=5.0, now=100.0))
+        self.assertTrue(window.record(False, latency=0.1, now=100.0))
+        self.assertEqual(0.5, window.statistics(now=100.0)["slow_call_rate"])
+
+    def test_drops_calls_that_slid_out_of_window(self):
+        window = CircuitWindow(duration=10.0, bucket_count=10, minimum_calls=1)
+        window.record(True, now=100.0)
+        window.record(False, now=105.0)
+
+        self.assertEqual(2, window.statistics(now=109.9)["calls"])
+        self.assertEqual(
+            {"calls": 1, "failure_rate": 0.0, "slow_call_rate": 0.0, "average_latency": 0.0},
+            window.statistics(now=110.5),
+        )
+        self.assertEqual(0, window.statistics(now=1000.0)["calls"])
+
+    def test_reset_clears_window(self):
+        window = CircuitWindow(minimum_calls=1)
+        window.record(True, latency=1.0, now=100.0)
+
+        window.reset()
+
+        self.assertFalse(window.should_trip())
+        self.assertEqual(0, window.statistics(now=100.0)["calls"])
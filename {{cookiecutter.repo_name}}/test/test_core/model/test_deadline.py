@@ -0,0 +1,23 @@
+from unittest import TestCase
+
+from src.core.model.deadline import Deadline
+
+
+class TestDeadline(TestCase):
+    def test_attempt_timeout_keeps_fallback_reserve(self):
+        deadline = Deadline(10.0, fallback_reserve=3.0)
+
+        self.assertTrue(6.9 < deadline.attempt_timeout() <= 7.0)
+        self.assertTrue(9.9 < deadline.fallback_timeout() <= 10.0)
+
+    def test_reserve_is_capped_at_half_of_budget(self):
+        deadline = Deadline(2.0, fallback_reserve=10.0)
+
+        self.assertEqual(1.0, deadline.fallback_reserve)
+        self.assertTrue(0.9 < deadline.attempt_timeout() <= 1.0)
+
+    def test_fallback_does_not_run_past_budget(self):
+        deadline = Deadline(-1.0, fallback_reserve=3.0)
+
+        self.assertTrue(deadline.attempt_timeout() < 0)
+        self.assertTrue(deadline.fallback_timeout() < 0)
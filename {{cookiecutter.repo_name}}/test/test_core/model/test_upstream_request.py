@@ -0,0 +1,23 @@
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.core.model.upstream_request import UpstreamRequest
+
+
+class Test(TestCase):
+    def test_decodes_json_body_once(self):
+        request = UpstreamRequest("POST", "/openai/deployments/gpt-4/chat/completions", b'{"stream": true}', [])
+        self.assertFalse(request.decoded)
+
+        with patch("src.core.model.upstream_request.json.loads", wraps=json.loads) as loads:
+            self.assertEqual({"stream": True}, request.json_body)
+            self.assertEqual({"stream": True}, request.json_body)
+
+        self.assertTrue(request.decoded)
+        self.assertEqual(1, loads.call_count)
+
+    def test_json_body_is_none_given_no_json_object(self):
+        self.assertIsNone(UpstreamRequest("POST", "/", b"text", []).json_body)
+        self.assertIsNone(UpstreamRequest("POST", "/", b"[1]", []).json_body)
+        self.assertIsNone(UpstreamRequest("POST", "/", b"\xff", []).json_body)
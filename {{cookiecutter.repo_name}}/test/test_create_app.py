@@ -1,6 +1,15 @@
+import json
+
 import pytest
 
 from src.create_app import create_app
+from src.services.backend_selector import LatencyAwareBackendSelector
+from src.infrastructure.repositories.distributed_circuit_breaker_repository import (
+    DistributedCircuitBreakerRepository,
+)
+from src.infrastructure.repositories.shared_memory_circuit_breaker_repository import (
+    SharedMemoryCircuitBreakerRepository,
+)
 
 
 def test_root_raises_exception_given_primary_openai_host_not_set(monkeypatch):
@@ -37,3 +46,109 @@ def test_root_raises_exception_given_fallback_openai_apikey_not_set(monkeypatch)
 
     with pytest.raises(Exception):
         create_app()
+
+
+def test_circuit_breaker_service_is_singleton(monkeypatch):
+    monkeypatch.setenv("PRIMARY_OPENAI_HOST", "dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("PRIMARY_OPENAI_API_KEY", "dummy_api_key")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+
+    app = create_app()
+
+    assert app.container.circuit_breaker_service() is app.container.circuit_breaker_service()
+
+
+def test_selects_shared_memory_circuit_repository(monkeypatch, tmp_path):
+    monkeypatch.setenv("PRIMARY_OPENAI_HOST", "dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("PRIMARY_OPENAI_API_KEY", "dummy_api_key")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+    monkeypatch.setenv("CIRCUIT_REPOSITORY", "shared_memory")
+    monkeypatch.setenv("CIRCUIT_SHARED_MEMORY_NAME", str(tmp_path / "circuits"))
+
+    app = create_app()
+
+    repository = app.container.circuit_breaker_repository()
+    assert isinstance(repository, SharedMemoryCircuitBreakerRepository)
+    assert repository.get("primary") is not None
+
+
+def test_selects_distributed_circuit_repository(monkeypatch, tmp_path):
+    monkeypatch.setenv("PRIMARY_OPENAI_HOST", "dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("PRIMARY_OPENAI_API_KEY", "dummy_api_key")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+    monkeypatch.setenv("CIRCUIT_REPOSITORY", "sqlite")
+    monkeypatch.setenv("CIRCUIT_SQLITE_PATH", str(tmp_path / "circuits.db"))
+
+    app = create_app()
+
+    repository = app.container.circuit_breaker_repository()
+    assert isinstance(repository, DistributedCircuitBreakerRepository)
+    assert repository.get("primary") is not None
+
+
+def test_adds_circuit_per_configured_backend(monkeypatch):
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+    monkeypatch.setenv(
+        "OPENAI_BACKENDS",
+        json.dumps(
+            [
+                {"name": "east", "host": "https://east", "api_key": "east_key", "weight": 2},
+                {"name": "west", "host": "https://west", "api_key": "west_key"},
+            ]
+        ),
+    )
+
+    app = create_app()
+
+    pool = app.container.backend_pool()
+    assert [(backend.identifier, backend.weight) for backend in pool.backends] == [
+        ("east", 2),
+        ("west", 1),
+    ]
+    repository = app.container.circuit_breaker_repository()
+    assert repository.get("east") is not None
+    assert repository.get("west") is not None
+
+
+def test_root_raises_exception_given_invalid_backends(monkeypatch):
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+    monkeypatch.setenv(
+        "OPENAI_BACKENDS",
+        json.dumps([{"name": "east", "host": "https://east", "weight": 0}]),
+    )
+
+    with pytest.raises(Exception):
+        create_app()
+
+
+def test_selects_latency_aware_backend_selector(monkeypatch):
+    monkeypatch.setenv("PRIMARY_OPENAI_HOST", "dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("PRIMARY_OPENAI_API_KEY", "dummy_api_key")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+    monkeypatch.setenv("BACKEND_SELECTOR", "latency")
+
+    app = create_app()
+
+    selector = app.container.circuit_breaker_service().selector
+    assert isinstance(selector, LatencyAwareBackendSelector)
+
+
+def test_creates_circuits_with_window_policy(monkeypatch):
+    monkeypatch.setenv("PRIMARY_OPENAI_HOST", "dummy_host")
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", "fallback_dummy_host")
+    monkeypatch.setenv("PRIMARY_OPENAI_API_KEY", "dummy_api_key")
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", "fallback_dummy_api_key")
+    monkeypatch.setenv("CIRCUIT_POLICY", "window")
+    monkeypatch.setenv("CIRCUIT_MINIMUM_CALLS", "20")
+
+    app = create_app()
+
+    window = app.container.circuit_breaker_repository().get("primary").window
+    assert window.minimum_calls == 20
+    assert window.slow_call_duration == 30.0
@@ -120,10 +120,84 @@ class E2ETests(TestCase):
             "app_insights_connection_string": "",
             "circuit_failure_threshold": 3,
             "circuit_retry_timeout": 10,
+            "circuit_half_open_max_probes": 1,
+            "circuit_backoff_multiplier": 2.0,
+            "circuit_max_retry_timeout": 300,
+            "circuit_probe_lease": 120.0,
+            "circuit_policy": "consecutive",
+            "circuit_window": 60.0,
+            "circuit_window_buckets": 10,
+            "circuit_failure_rate_threshold": 0.5,
+            "circuit_slow_call_duration": 30.0,
+            "circuit_slow_call_rate_threshold": 0.8,
+            "circuit_minimum_calls": 10,
+            "circuit_repository": "in_memory",
+            "circuit_shared_memory_name": "genai-gateway-circuits",
+            "circuit_shared_memory_slots": 64,
+            "circuit_redis_url": "**********",
+            "circuit_sqlite_path": "circuits.db",
+            "circuit_sync_interval": 1.0,
+            "upstream_max_connections": 100,
+            "upstream_max_keepalive_connections": 20,
+            "upstream_keepalive_expiry": 30.0,
+            "upstream_http2_enabled": False,
+            "upstream_connect_timeout": 5.0,
+            "upstream_read_timeout": 120.0,
+            "response_cache_enabled": False,
+            "response_cache_max_bytes": 67108864,
+            "response_cache_ttl": 300.0,
+            "request_coalescing_enabled": False,
             "primary_open_ai_host": self.primary_mock_server.url_for(""),
             "primary_open_ai_api_key": "**********",
             "fallback_open_ai_host": self.fallback_mock_server.url_for(""),
             "fallback_open_ai_api_key": "**********",
+            "open_ai_backends": [
+                {
+                    "name": "primary",
+                    "host": self.primary_mock_server.url_for(""),
+                    "api_key": "**********",
+                    "weight": 1,
+                }
+            ],
+            "backend_pool_max_attempts": 2,
+            "backend_selector": "weighted",
+            "backend_latency_decay": 10.0,
+            "rate_limit_routing_enabled": True,
+            "rate_limit_window": 60.0,
+            "rate_limit_max_queue_time": 1.0,
+            "request_timeout": 60.0,
+            "request_max_timeout": 300.0,
+            "fallback_min_timeout": 10.0,
+            "hedging_enabled": False,
+            "hedging_quantile": 0.95,
+            "hedging_budget_percent": 5.0,
+            "hedging_min_samples": 20,
+            "bulkhead_enabled": False,
+            "bulkhead_max_concurrency": 100,
+            "bulkhead_max_queue_size": 100,
+            "bulkhead_max_queue_time": 5.0,
+            "bulkhead_limiter": "static",
+            "bulkhead_initial_limit": 20,
+            "bulkhead_min_limit": 1,
+            "bulkhead_latency_tolerance": 2.0,
+            "bulkhead_backoff_ratio": 0.9,
+            "priority_classes": {"interactive": 4, "default": 2, "batch": 1},
+            "priority_default_class": "default",
+            "priority_api_keys": "**********",
+            "tenant_quotas_enabled": False,
+            "tenant_requests_per_minute": 0,
+            "tenant_tokens_per_minute": 0,
+            "tenant_quotas": {},
+            "tenant_api_keys": "**********",
+            "log_level": "INFO",
+            "log_queue_size": 10000,
+            "log_body_max_length": 1024,
+            "log_sample_rates": {},
+            "metrics_enabled": True,
+            "metrics_directory": "",
+            "metrics_export_interval": 5.0,
+            "usage_accounting_enabled": True,
+            "usage_flush_interval": 60.0,
         }
 
         self.assertEqual(json.loads(response.text), expected_settings)
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from src.infrastructure.caches.lru_response_cache import CachedResponse, LruResponseCache
+
+
+def create_response(content: bytes):
+    return CachedResponse(200, {}, content)
+
+
+class Test(TestCase):
+    def test_returns_cached_response(self):
+        cache = LruResponseCache(max_bytes=100, ttl=60)
+        response = create_response(b"content")
+
+        cache.put("key", response)
+
+        self.assertIs(response, cache.get("key"))
+        self.assertIsNone(cache.get("other key"))
+
+    def test_evicts_least_recently_used_responses_over_budget(self):
+        cache = LruResponseCache(max_bytes=20, ttl=60)
+        cache.put("first", create_response(b"0123456789"))
+        cache.put("second", create_response(b"0123456789"))
+        cache.get("first")
+
+        cache.put("third", create_response(b"0123456789"))
+
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+        self.assertEqual(20, cache.size)
+
+    def test_counts_headers_against_budget(self):
+        response = CachedResponse(200, {"content-type": "application/json"}, b"{}")
+
+        self.assertEqual(2 + len("content-type") + len("application/json"), response.size)
+
+    def test_does_not_cache_response_larger_than_budget(self):
+        cache = LruResponseCache(max_bytes=5, ttl=60)
+
+        cache.put("key", create_response(b"0123456789"))
+
+        self.assertEqual(0, len(cache))
+
+    def test_expires_responses_after_ttl(self):
+        cache = LruResponseCache(max_bytes=100, ttl=0)
+
+        cache.put("key", create_response(b"content"))
+
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(0, cache.size)
+
+    def test_replacing_response_updates_size(self):
+        cache = LruResponseCache(max_bytes=100, ttl=60)
+
+        cache.put("key", create_response(b"0123456789"))
+        cache.put("key", create_response(b"01234"))
+
+        self.assertEqual(5, cache.size)
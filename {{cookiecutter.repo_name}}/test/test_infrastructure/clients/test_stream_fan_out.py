@@ -0,0 +1,124 @@
+import asyncio
+from unittest import TestCase
+
+from src.infrastructure.clients.stream_fan_out import StreamFanOut
+
+
+class StreamStub:
+    def __init__(self, *chunks):
+        self.status_code = 200
+        self.headers = {"content-type": "text/event-stream"}
+        self.chunks = chunks
+        self.reads = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.reads += 1
+
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+async def read(stream):
+    return [chunk async for chunk in stream]
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def test_subscribers_receive_all_chunks_read_once(self):
+        stream = StreamStub(b"first", b"second", b"third")
+        fan_out = StreamFanOut(stream)
+        subscribers = [fan_out.subscribe() for _ in range(3)]
+
+        chunks = self.loop.run_until_complete(
+            asyncio.gather(*[read(subscriber) for subscriber in subscribers])
+        )
+
+        self.assertEqual([[b"first", b"second", b"third"]] * 3, chunks)
+        self.assertEqual(3, stream.reads)
+        self.assertEqual(200, subscribers[0].status_code)
+        self.assertEqual("text/event-stream", subscribers[0].headers["content-type"])
+
+    def test_closes_upstream_after_last_subscriber(self):
+        stream = StreamStub(b"chunk")
+        fan_out = StreamFanOut(stream)
+        first, second = fan_out.subscribe(), fan_out.subscribe()
+
+        self.loop.run_until_complete(first.aclose())
+        self.loop.run_until_complete(first.aclose())
+        self.assertFalse(stream.closed)
+
+        self.loop.run_until_complete(second.aclose())
+        self.assertTrue(stream.closed)
+
+    def test_subscribers_receive_upstream_failure(self):
+        fan_out = StreamFanOut(StreamStub(b"chunk", Exception("Interrupted")))
+        first, second = fan_out.subscribe(), fan_out.subscribe()
+        received = []
+
+        async def read_until_failure(subscriber):
+            try:
+                async for chunk in subscriber:
+                    received.append(chunk)
+            except Exception as e:
+                return str(e)
+
+        failures = self.loop.run_until_complete(
+            asyncio.gather(read_until_failure(first), read_until_failure(second))
+        )
+
+        self.assertEqual(["Interrupted", "Interrupted"], failures)
+        self.assertEqual([b"chunk", b"chunk"], received)
+
+    def test_drops_chunks_every_subscriber_has_read(self):
+        fan_out = StreamFanOut(StreamStub(b"first", b"second", b"third"))
+        fan_out.expect(2)
+        first, second = fan_out.subscribe(), fan_out.subscribe()
+        buffered = []
+
+        async def read_and_count(subscriber):
+            chunks = []
+
+            async for chunk in subscriber:
+                chunks.append(chunk)
+                buffered.append(len(fan_out._chunks))
+
+            return chunks
+
+        chunks = self.loop.run_until_complete(read_and_count(first))
+        self.assertEqual(3, len(fan_out._chunks))
+        self.assertEqual(chunks, self.loop.run_until_complete(read_and_count(second)))
+
+        self.assertEqual(0, len(fan_out._chunks))
+        self.assertEqual([1, 2, 3, 2, 1, 0], buffered)
+
+    def test_single_subscriber_buffers_no_chunks(self):
+        fan_out = StreamFanOut(StreamStub(b"first", b"second"))
+        fan_out.expect(1)
+        subscriber = fan_out.subscribe()
+
+        async def read_and_count():
+            return [len(fan_out._chunks) async for _ in subscriber]
+
+        self.assertEqual([0, 0], self.loop.run_until_complete(read_and_count()))
+
+    def test_closes_upstream_given_no_subscriber_expected(self):
+        stream = StreamStub(b"chunk")
+        fan_out = StreamFanOut(stream)
+
+        async def expect_none():
+            fan_out.expect(1)
+            fan_out.forfeit()
+            await asyncio.sleep(0)
+
+        self.loop.run_until_complete(expect_none())
+
+        self.assertTrue(stream.closed)
@@ -0,0 +1,29 @@
+from unittest import TestCase
+
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+
+
+class Test(TestCase):
+    def test_reuses_client_per_host(self):
+        pool = UpstreamClientPool()
+
+        client = pool.get_client("http://some-host:8080/")
+        self.assertTrue(pool.get_client("http://some-host:8080/") is client)
+        self.assertTrue(pool.get_client("http://some-host:8080") is client)
+        self.assertTrue(pool.get_client("http://other-host:8080") is not client)
+
+    def test_configures_limits_and_timeouts(self):
+        pool = UpstreamClientPool(
+            max_connections=10,
+            max_keepalive_connections=5,
+            keepalive_expiry=15,
+            connect_timeout=2,
+            read_timeout=30,
+        )
+
+        client = pool.get_client("http://some-host")
+        self.assertEqual(2, client.timeout.connect)
+        self.assertEqual(30, client.timeout.read)
+        self.assertEqual(10, pool.limits.max_connections)
+        self.assertEqual(5, pool.limits.max_keepalive_connections)
+        self.assertEqual(15, pool.limits.keepalive_expiry)
@@ -0,0 +1,23 @@
+from unittest import TestCase
+
+from src.infrastructure.logs.log_body import LogBody, redact
+
+
+class Test(TestCase):
+    def test_writes_short_body_as_text(self):
+        self.assertEqual('{"messages": []}', str(LogBody(b'{"messages": []}')))
+        self.assertEqual("", str(LogBody(None)))
+
+    def test_truncates_long_body(self):
+        body = b"a" * (LogBody.max_length + 100)
+
+        text = str(LogBody(body))
+
+        self.assertEqual("a" * LogBody.max_length + f"... ({len(body)} bytes)", text)
+
+    def test_redacts_secrets(self):
+        self.assertEqual(
+            '{"api_key": "***", "Authorization": "***", "model": "gpt"}',
+            redact('{"api_key": "secret", "Authorization": "Bearer secret", "model": "gpt"}'),
+        )
+        self.assertEqual("header Bearer ***", redact("header Bearer abc.def-123"))
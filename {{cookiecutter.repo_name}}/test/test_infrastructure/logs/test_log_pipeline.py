@@ -0,0 +1,104 @@
+import logging
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.infrastructure.logs.log_pipeline import (
+    install_log_pipeline,
+    LogQueueHandler,
+    SamplingFilter,
+)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def create_record(name="src.services.forwarding_service", level=logging.INFO, msg="message", args=()):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestSamplingFilter(TestCase):
+    def setUp(self):
+        self.filter = SamplingFilter({"src.services": 0.0, "src.services.circuit_breaker_service": 1.0})
+
+    def test_applies_rate_of_most_specific_category(self):
+        self.assertFalse(self.filter.filter(create_record("src.services.forwarding_service")))
+        self.assertTrue(self.filter.filter(create_record("src.services.circuit_breaker_service")))
+        self.assertTrue(self.filter.filter(create_record("src.core.model.circuit")))
+
+    def test_keeps_warnings(self):
+        self.assertTrue(self.filter.filter(create_record(level=logging.WARNING)))
+
+    def test_samples_share_of_records(self):
+        sampling_filter = SamplingFilter({"src": 0.5})
+
+        with patch("src.infrastructure.logs.log_pipeline.random", side_effect=[0.2, 0.7]):
+            self.assertTrue(sampling_filter.filter(create_record()))
+            self.assertFalse(sampling_filter.filter(create_record()))
+
+
+class TestLogQueueHandler(TestCase):
+    def setUp(self):
+        self.output = RecordingHandler()
+        self.handler = LogQueueHandler([self.output], queue_size=10, overload_ratio=0.5)
+
+    def test_writes_records_in_background(self):
+        self.handler.start()
+        self.handler.handle(create_record(msg="Calling %s", args=("east",)))
+        self.handler.stop()
+        self.handler.stop()
+
+        self.assertEqual(["Calling east"], self.output.messages)
+
+    def test_does_not_format_message_when_enqueued(self):
+        class Argument:
+            def __str__(self):
+                raise AssertionError("The message must not be formatted")
+
+        self.handler.handle(create_record(msg="%s", args=(Argument(),)))
+
+        self.assertEqual(1, self.handler.queue.qsize())
+
+    def test_drops_debug_detail_while_overloaded(self):
+        for _ in range(5):
+            self.handler.handle(create_record())
+
+        self.handler.handle(create_record())
+        self.handler.handle(create_record(level=logging.ERROR))
+
+        self.assertTrue(self.handler.overloaded)
+        self.assertEqual(1, self.handler.dropped_records)
+        self.assertEqual(6, self.handler.queue.qsize())
+
+        self.handler.start()
+        self.handler.stop()
+        self.handler.handle(create_record())
+
+        self.assertFalse(self.handler.overloaded)
+        self.assertEqual(7, len(self.output.messages) + self.handler.queue.qsize())
+
+    def test_drops_records_without_blocking_given_full_queue(self):
+        for _ in range(12):
+            self.handler.handle(create_record(level=logging.ERROR))
+
+        self.assertEqual(10, self.handler.queue.qsize())
+        self.assertEqual(2, self.handler.dropped_records)
+
+    def test_install_replaces_previous_pipeline(self):
+        logger = logging.getLogger("test.log_pipeline")
+        previous = LogQueueHandler([RecordingHandler()])
+        install_log_pipeline(logger, previous)
+        install_log_pipeline(logger, self.handler)
+
+        logger.warning("message")
+        self.handler.stop()
+
+        self.assertEqual([self.handler], logger.handlers)
+        self.assertFalse(previous.started)
+        self.assertEqual(["message"], self.output.messages)
+        logger.removeHandler(self.handler)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from src.infrastructure.metrics.metrics_directory import EXITED_FILE, MetricsDirectory
+from src.infrastructure.metrics.metrics_registry import MetricsRegistry
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.registry = MetricsRegistry()
+        self.directory = MetricsDirectory(self.path, self.registry)
+        self.registry.counter("requests_total", "Requests").inc((), 2)
+        self.registry.gauge("in_flight", "Calls in flight").set((), 1)
+
+    def run_async(self, coroutine):
+        return asyncio.get_event_loop().run_until_complete(coroutine)
+
+    def collect(self):
+        return self.run_async(self.directory.collect())
+
+    def write_worker(self, pid):
+        worker = MetricsRegistry()
+        worker.counter("requests_total", "Requests").inc((), 3)
+        worker.gauge("in_flight", "Calls in flight").set((), 4)
+
+        with open(os.path.join(self.path, f"{pid}.json"), "w") as file:
+            json.dump({**worker.snapshot(), "pid": pid}, file)
+
+    def test_collects_metrics_of_all_workers(self):
+        self.write_worker(os.getppid())
+
+        metrics = self.collect()
+
+        self.assertEqual(5, metrics["requests_total"]["values"][()])
+        self.assertEqual(5, metrics["in_flight"]["values"][()])
+        self.assertTrue(os.path.exists(os.path.join(self.path, f"{os.getpid()}.json")))
+
+    def test_keeps_only_counters_of_exited_workers(self):
+        # Process ids are at most 2^22 on Linux
+        self.write_worker(2**22 + 1)
+
+        metrics = self.collect()
+
+        self.assertEqual(5, metrics["requests_total"]["values"][()])
+        self.assertEqual(1, metrics["in_flight"]["values"][()])
+
+    def test_folds_exited_workers_into_one_file(self):
+        self.write_worker(2**22 + 1)
+        self.collect()
+        self.write_worker(2**22 + 2)
+
+        metrics = self.collect()
+
+        self.assertEqual(8, metrics["requests_total"]["values"][()])
+        self.assertEqual(
+            sorted([EXITED_FILE, f"{os.getpid()}.json"]),
+            sorted(name for name in os.listdir(self.path) if name.endswith(".json")),
+        )
+
+    def test_start_clears_previous_run(self):
+        self.write_worker(2**22 + 1)
+        self.collect()
+        self.write_worker(2**22 + 2)
+
+        async def start_and_stop():
+            self.directory.start()
+            self.directory.stop()
+
+        self.run_async(start_and_stop())
+
+        self.assertEqual(2, self.collect()["requests_total"]["values"][()])
+
+    def test_start_keeps_snapshots_of_live_workers(self):
+        self.write_worker(os.getppid())
+        self.write_worker(2**22 + 1)
+
+        async def start_and_stop():
+            self.directory.start()
+            self.directory.stop()
+
+        self.run_async(start_and_stop())
+
+        self.assertEqual(8, self.collect()["requests_total"]["values"][()])
+
+    def test_skips_unreadable_snapshots(self):
+        with open(os.path.join(self.path, "1.json"), "w") as file:
+            file.write("{")
+
+        self.assertEqual(2, self.collect()["requests_total"]["values"][()])
@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+from src.infrastructure.metrics.metrics_registry import merge_snapshots, MetricsRegistry, render
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def render_registry(self):
+        return render(merge_snapshots([self.registry.snapshot()]))
+
+    def test_renders_counter_and_gauge(self):
+        counter = self.registry.counter("requests_total", "Requests", ("backend",))
+        gauge = self.registry.gauge("in_flight", "Calls in flight")
+
+        counter.inc(("east",))
+        counter.inc(("east",), 2)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        self.assertEqual(
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{backend="east"} 3.0\n'
+            "# HELP in_flight Calls in flight\n"
+            "# TYPE in_flight gauge\n"
+            "in_flight 1.0\n",
+            self.render_registry(),
+        )
+
+    def test_renders_cumulative_histogram_buckets(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency", ("backend",), buckets=(0.1, 1.0))
+
+        for latency in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(("east",), latency)
+
+        self.assertEqual(
+            [
+                'latency_seconds_bucket{backend="east",le="0.1"} 2',
+                'latency_seconds_bucket{backend="east",le="1.0"} 3',
+                'latency_seconds_bucket{backend="east",le="+Inf"} 4',
+                'latency_seconds_sum{backend="east"} 2.65',
+                'latency_seconds_count{backend="east"} 4',
+            ],
+            self.render_registry().splitlines()[2:],
+        )
+
+    def test_escapes_label_values(self):
+        self.registry.counter("errors_total", "Errors", ("reason",)).inc(('say "hi"\n',))
+
+        self.assertIn('errors_total{reason="say \\"hi\\"\\n"} 1.0', self.render_registry())
+
+    def test_collectors_run_before_snapshot(self):
+        gauge = self.registry.gauge("limit", "Limit")
+        self.registry.add_collector(lambda: gauge.set((), 7))
+
+        self.assertIn("limit 7.0", self.render_registry())
+
+    def test_merges_workers_by_aggregation(self):
+        other = MetricsRegistry()
+
+        for registry, value in [(self.registry, 2), (other, 3)]:
+            registry.counter("requests_total", "Requests").inc((), value)
+            registry.gauge("state", "State", aggregation="max").set((), value)
+            registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe((), value / 4)
+
+        merged = merge_snapshots([self.registry.snapshot(), other.snapshot()])
+
+        self.assertEqual(5, merged["requests_total"]["values"][()])
+        self.assertEqual(3, merged["state"]["values"][()])
+        self.assertEqual([2, 0, 1.25], merged["latency_seconds"]["values"][()])
+
+    def test_rejects_duplicate_metric(self):
+        self.registry.counter("requests_total", "Requests")
+
+        with self.assertRaises(ValueError):
+            self.registry.gauge("requests_total", "Requests")
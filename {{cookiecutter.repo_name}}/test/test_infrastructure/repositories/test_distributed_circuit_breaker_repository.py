@@ -0,0 +1,133 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock
+
+from src.core.model.circuit import Circuit, CircuitState
+from src.core.model.circuit_window import CircuitWindow
+from src.infrastructure.repositories.distributed_circuit_breaker_repository import (
+    DistributedCircuitBreakerRepository,
+)
+from src.infrastructure.stores.sqlite_circuit_store import SqliteCircuitStore
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "circuits.db")
+        self.repository = self.create_node()
+        self.other_node_repository = self.create_node()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_node(self):
+        repository = DistributedCircuitBreakerRepository(
+            SqliteCircuitStore(self.path), sync_interval=0.01
+        )
+        repository.add(Circuit("openai", failure_threshold=2))
+        return repository
+
+    def test_adding_and_getting_circuit(self):
+        circuit = Circuit("some-identifier")
+        self.repository.add(circuit)
+        self.assertTrue(self.repository.get(circuit.identifier) == circuit)
+
+    def test_get_returns_none_if_not_exists(self):
+        self.assertTrue(self.repository.get("does not exist") is None)
+
+    def test_outcomes_are_written_behind(self):
+        self.repository.modify("openai", Circuit.handle_failed_call)
+        self.repository.modify("openai", Circuit.handle_failed_call)
+
+        # Reads are served locally, the store is only written on synchronization
+        self.assertEqual(CircuitState.OPEN, self.repository.get("openai").state)
+        self.other_node_repository.synchronize()
+        self.assertEqual(CircuitState.CLOSED, self.other_node_repository.get("openai").state)
+
+        self.repository.synchronize()
+        self.other_node_repository.synchronize()
+        self.assertEqual(CircuitState.OPEN, self.other_node_repository.get("openai").state)
+
+    def test_throttle_is_shared_without_counting_as_failure(self):
+        self.repository.modify("openai", lambda circuit: circuit.handle_throttled_call(30))
+        open_until = self.repository.get("openai").open_until
+
+        self.repository.synchronize()
+        self.other_node_repository.synchronize()
+
+        shared = self.other_node_repository.get("openai")
+        self.assertEqual(CircuitState.OPEN, shared.state)
+        self.assertEqual(open_until, shared.open_until)
+        self.assertEqual(0, shared.failure_count)
+
+    def test_failures_of_several_nodes_trip_circuit(self):
+        self.repository.modify("openai", Circuit.handle_failed_call)
+        self.other_node_repository.modify("openai", Circuit.handle_failed_call)
+
+        self.repository.synchronize()
+        self.other_node_repository.synchronize()
+        self.repository.synchronize()
+
+        self.assertEqual(CircuitState.OPEN, self.repository.get("openai").state)
+        self.assertEqual(CircuitState.OPEN, self.other_node_repository.get("openai").state)
+
+    def test_failures_of_windowed_circuits_trip_only_by_window(self):
+        for repository in [self.repository, self.other_node_repository]:
+            repository.add(Circuit("windowed", window=CircuitWindow(minimum_calls=3)))
+            repository.modify("windowed", Circuit.handle_failed_call)
+            repository.modify("windowed", Circuit.handle_failed_call)
+            repository.synchronize()
+
+        self.repository.synchronize()
+        self.assertEqual(CircuitState.CLOSED, self.repository.get("windowed").state)
+
+        self.repository.modify("windowed", Circuit.handle_failed_call)
+        self.repository.synchronize()
+        self.other_node_repository.synchronize()
+        self.assertEqual(CircuitState.OPEN, self.other_node_repository.get("windowed").state)
+
+    def test_success_closes_circuit_on_all_nodes(self):
+        self.repository.modify("openai", Circuit.handle_failed_call)
+        self.repository.modify("openai", Circuit.handle_failed_call)
+        self.repository.synchronize()
+        self.other_node_repository.synchronize()
+
+        self.other_node_repository.modify("openai", Circuit.handle_successful_call)
+        self.other_node_repository.synchronize()
+        self.repository.synchronize()
+
+        self.assertEqual(CircuitState.CLOSED, self.repository.get("openai").state)
+        self.assertEqual(0, self.repository.get("openai").failure_count)
+
+    def test_keeps_outcomes_when_store_is_unavailable(self):
+        store = Mock()
+        store.synchronize.side_effect = Exception("Store unavailable")
+        repository = DistributedCircuitBreakerRepository(store)
+        repository.add(Circuit("openai", failure_threshold=2))
+
+        repository.modify("openai", Circuit.handle_failed_call)
+        repository.synchronize()
+        repository.modify("openai", Circuit.handle_failed_call)
+        repository.synchronize()
+
+        _, deltas = store.synchronize.call_args[0]
+        self.assertEqual(2, deltas["openai"].failures)
+
+    def test_background_synchronization(self):
+        self.repository.start()
+        self.other_node_repository.start()
+
+        try:
+            self.repository.modify("openai", Circuit.handle_failed_call)
+            self.repository.modify("openai", Circuit.handle_failed_call)
+
+            for _ in range(500):
+                if self.other_node_repository.get("openai").state is CircuitState.OPEN:
+                    break
+                self.other_node_repository._stopped.wait(0.01)
+        finally:
+            self.repository.stop()
+            self.other_node_repository.stop()
+
+        self.assertEqual(CircuitState.OPEN, self.other_node_repository.get("openai").state)
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from src.core.model.circuit import Circuit, CircuitState
+from src.infrastructure.repositories.shared_memory_circuit_breaker_repository import (
+    HEADER,
+    LAYOUT_VERSION,
+    MAGIC,
+    SharedMemoryCircuitBreakerRepository,
+)
+
+
+def admit_probe_and_die(directory):
+    repository = SharedMemoryCircuitBreakerRepository(
+        name="circuits", slots=4, directory=directory
+    )
+    repository.modify("some-identifier", Circuit.is_callable)
+    os._exit(0)
+
+
+def record_failures(directory, count):
+    repository = SharedMemoryCircuitBreakerRepository(
+        name="circuits", slots=4, directory=directory
+    )
+
+    for _ in range(count):
+        repository.modify("some-identifier", Circuit.handle_failed_call)
+
+    repository.close()
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.repository = self.create_repository()
+
+    def tearDown(self):
+        self.repository.close()
+        self.directory.cleanup()
+
+    def create_repository(self):
+        return SharedMemoryCircuitBreakerRepository(
+            name="circuits", slots=4, directory=self.directory.name
+        )
+
+    def test_adding_and_getting_circuit(self):
+        circuit = Circuit("some-identifier", failure_threshold=5, retry_timeout=20)
+        self.repository.add(circuit)
+
+        stored = self.repository.get(circuit.identifier)
+        self.assertEqual("some-identifier", stored.identifier)
+        self.assertEqual(5, stored.failure_threshold)
+        self.assertEqual(20, stored.retry_timeout)
+        self.assertEqual(CircuitState.CLOSED, stored.state)
+        self.assertTrue(stored.last_failure is None)
+
+    def test_get_returns_none_if_not_exists(self):
+        self.assertTrue(self.repository.get("does not exist") is None)
+
+    def test_updating_circuit(self):
+        circuit = Circuit("some-identifier", failure_threshold=1)
+        self.repository.add(circuit)
+
+        circuit.handle_failed_call()
+        self.repository.update(circuit)
+
+        stored = self.repository.get(circuit.identifier)
+        self.assertEqual(CircuitState.OPEN, stored.state)
+        self.assertEqual(1, stored.failure_count)
+        self.assertEqual(circuit.last_failure, stored.last_failure)
+
+    def test_modify_applies_operation_and_returns_result(self):
+        self.repository.add(Circuit("some-identifier", failure_threshold=1))
+
+        self.repository.modify("some-identifier", Circuit.handle_failed_call)
+
+        self.assertFalse(self.repository.modify("some-identifier", Circuit.is_callable))
+        self.assertEqual(
+            CircuitState.OPEN, self.repository.get("some-identifier").state
+        )
+
+    def test_modify_stores_throttle(self):
+        self.repository.add(Circuit("some-identifier"))
+
+        self.repository.modify(
+            "some-identifier", lambda circuit: circuit.handle_throttled_call(5)
+        )
+
+        stored = self.repository.get("some-identifier")
+        self.assertEqual(CircuitState.OPEN, stored.state)
+        self.assertEqual(stored.last_failure + 5, stored.open_until)
+
+    def test_workers_share_circuit_state(self):
+        other_worker_repository = self.create_repository()
+        self.repository.add(Circuit("some-identifier", failure_threshold=1))
+        # Every worker registers the circuits at startup, which must not reset the shared state
+        self.repository.modify("some-identifier", Circuit.handle_failed_call)
+        other_worker_repository.add(Circuit("some-identifier", failure_threshold=1))
+
+        self.assertEqual(
+            CircuitState.OPEN, other_worker_repository.get("some-identifier").state
+        )
+        other_worker_repository.close()
+
+    def test_updates_are_atomic_across_processes(self):
+        self.repository.add(Circuit("some-identifier", failure_threshold=1000))
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=record_failures, args=(self.directory.name, 200))
+            for _ in range(4)
+        ]
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join()
+
+        self.assertEqual(800, self.repository.get("some-identifier").failure_count)
+
+    def test_raises_exception_when_segment_is_full(self):
+        for index in range(4):
+            self.repository.add(Circuit(f"circuit-{index}"))
+
+        with self.assertRaises(Exception):
+            self.repository.add(Circuit("one-too-many"))
+
+    def test_stores_generation(self):
+        self.repository.add(Circuit("some-identifier", failure_threshold=1))
+
+        self.repository.modify("some-identifier", Circuit.handle_failed_call)
+
+        self.assertEqual(1, self.repository.get("some-identifier").generation)
+
+    def test_compare_and_set_ignores_older_generation(self):
+        self.repository.add(Circuit("some-identifier", failure_threshold=1))
+        self.repository.modify("some-identifier", Circuit.trip)
+
+        applied, _ = self.repository.compare_and_set(
+            "some-identifier", 0, Circuit.handle_successful_call
+        )
+
+        self.assertFalse(applied)
+        self.assertEqual(CircuitState.OPEN, self.repository.get("some-identifier").state)
+
+    def test_rejects_segment_of_other_layout_version(self):
+        path = os.path.join(self.directory.name, "circuits")
+
+        with open(path, "r+b") as segment:
+            segment.write(HEADER.pack(MAGIC, LAYOUT_VERSION + 1, 4))
+
+        with self.assertRaises(Exception):
+            self.create_repository()
+
+    def test_probe_of_dead_worker_expires(self):
+        self.repository.add(
+            Circuit("some-identifier", failure_threshold=1, retry_timeout=0, probe_lease=0.05)
+        )
+        self.repository.modify("some-identifier", Circuit.handle_failed_call)
+
+        process = multiprocessing.Process(target=admit_probe_and_die, args=(self.directory.name,))
+        process.start()
+        process.join()
+
+        self.assertEqual(1, self.repository.get("some-identifier").probes_in_flight)
+        self.assertFalse(self.repository.modify("some-identifier", Circuit.is_callable))
+        time.sleep(0.06)
+        self.assertTrue(self.repository.modify("some-identifier", Circuit.is_callable))
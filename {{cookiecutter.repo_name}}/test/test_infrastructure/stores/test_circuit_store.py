@@ -0,0 +1,89 @@
+from unittest import TestCase
+
+from src.infrastructure.stores.circuit_store import CircuitDelta, CircuitRecord, merge
+
+
+class Test(TestCase):
+    def test_merge_adds_failures_and_opens_at_threshold(self):
+        delta = CircuitDelta(failure_threshold=3)
+        delta.record_failure(100.0, False, 0)
+        delta.record_failure(101.0, False, 0)
+
+        record = merge(CircuitRecord(failure_count=1, last_failure=50.0), delta)
+
+        self.assertEqual(
+            CircuitRecord(state="OPEN", failure_count=3, open_count=1, last_failure=101.0),
+            record,
+        )
+
+    def test_merge_opens_circuit_tripped_by_node(self):
+        delta = CircuitDelta(failure_threshold=3)
+        delta.record_failure(100.0, True, 2)
+
+        record = merge(None, delta)
+
+        self.assertEqual("OPEN", record.state)
+        self.assertEqual(2, record.open_count)
+
+    def test_merge_closes_circuit_on_success(self):
+        delta = CircuitDelta(failure_threshold=3)
+        delta.record_failure(100.0, True, 1)
+        delta.record_success()
+
+        record = merge(
+            CircuitRecord(state="OPEN", failure_count=5, open_count=1, last_failure=90.0),
+            delta,
+        )
+
+        self.assertEqual(CircuitRecord(), record)
+
+    def test_merge_applies_failures_after_success(self):
+        delta = CircuitDelta(failure_threshold=3)
+        delta.record_success()
+        delta.record_failure(100.0, False, 0)
+
+        record = merge(CircuitRecord(failure_count=2, last_failure=90.0), delta)
+
+        self.assertEqual(CircuitRecord(failure_count=1, last_failure=100.0), record)
+
+    def test_combine_keeps_later_success(self):
+        earlier = CircuitDelta(failure_threshold=3)
+        earlier.record_failure(100.0, False, 0)
+        later = CircuitDelta(failure_threshold=3)
+        later.record_success()
+
+        self.assertTrue(earlier.combine(later) is later)
+
+    def test_combine_adds_failures(self):
+        earlier = CircuitDelta(failure_threshold=3)
+        earlier.record_failure(100.0, False, 0)
+        later = CircuitDelta(failure_threshold=3)
+        later.record_failure(101.0, True, 1)
+
+        combined = earlier.combine(later)
+
+        self.assertEqual(2, combined.failures)
+        self.assertEqual(101.0, combined.last_failure)
+        self.assertTrue(combined.tripped)
+
+    def test_merge_opens_circuit_until_throttle_ends(self):
+        delta = CircuitDelta(failure_threshold=3)
+        delta.record_throttle(100.0, 130.0)
+        other_delta = CircuitDelta(failure_threshold=3)
+        other_delta.record_throttle(101.0, 120.0)
+
+        record = merge(merge(None, delta), other_delta)
+
+        self.assertEqual(
+            CircuitRecord(state="OPEN", last_failure=101.0, open_until=130.0),
+            record,
+        )
+
+    def test_merge_clears_throttle_when_failures_open_circuit(self):
+        delta = CircuitDelta(failure_threshold=1)
+        delta.record_failure(140.0, True, 1)
+
+        record = merge(CircuitRecord(state="OPEN", last_failure=100.0, open_until=130.0), delta)
+
+        self.assertEqual("OPEN", record.state)
+        self.assertIsNone(record.open_until)
@@ -0,0 +1,51 @@
+import threading
+from unittest import TestCase
+
+import pytest
+
+from src.infrastructure.stores.circuit_store import CircuitDelta, CircuitRecord
+from src.infrastructure.stores.redis_circuit_store import RedisCircuitStore
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.store = RedisCircuitStore(client=fakeredis.FakeRedis(server=self.server))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_returns_no_records_for_unknown_circuits(self):
+        self.assertEqual({}, self.store.synchronize(["openai"], {}))
+
+    def test_merges_deltas_of_several_nodes(self):
+        other_node_store = RedisCircuitStore(
+            client=fakeredis.FakeRedis(server=self.server)
+        )
+        delta = CircuitDelta(failure_threshold=2)
+        delta.record_failure(100.0, False, 0)
+        other_delta = CircuitDelta(failure_threshold=2)
+        other_delta.record_failure(101.5, False, 0)
+
+        self.store.synchronize(["openai"], {"openai": delta})
+        records = other_node_store.synchronize(["openai"], {"openai": other_delta})
+
+        expected = CircuitRecord(state="OPEN", failure_count=2, open_count=1, last_failure=101.5)
+        self.assertEqual(expected, records["openai"])
+        self.assertEqual(expected, self.store.synchronize(["openai"], {})["openai"])
+
+    def test_notifies_changes(self):
+        other_node_store = RedisCircuitStore(
+            client=fakeredis.FakeRedis(server=self.server)
+        )
+        # Subscribe before the change is published
+        other_node_store.wait_for_change(0, threading.Event())
+        delta = CircuitDelta(failure_threshold=2)
+        delta.record_success()
+
+        self.store.synchronize(["openai"], {"openai": delta})
+
+        message = other_node_store._pubsub.get_message(timeout=1)
+        self.assertEqual(b"changed", message["data"])
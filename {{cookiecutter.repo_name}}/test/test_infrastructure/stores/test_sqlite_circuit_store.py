@@ -0,0 +1,50 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.infrastructure.stores.circuit_store import CircuitDelta, CircuitRecord
+from src.infrastructure.stores.sqlite_circuit_store import SqliteCircuitStore
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "circuits.db")
+        self.store = SqliteCircuitStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_uses_write_ahead_log(self):
+        journal_mode = self.store._connection.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual("wal", journal_mode[0])
+
+    def test_returns_no_records_for_unknown_circuits(self):
+        self.assertEqual({}, self.store.synchronize(["openai"], {}))
+
+    def test_merges_deltas_of_several_nodes(self):
+        other_node_store = SqliteCircuitStore(self.path)
+        delta = CircuitDelta(failure_threshold=2)
+        delta.record_failure(100.0, False, 0)
+        other_delta = CircuitDelta(failure_threshold=2)
+        other_delta.record_failure(101.0, False, 0)
+
+        self.store.synchronize(["openai"], {"openai": delta})
+        records = other_node_store.synchronize(["openai"], {"openai": other_delta})
+
+        expected = CircuitRecord(state="OPEN", failure_count=2, open_count=1, last_failure=101.0)
+        self.assertEqual(expected, records["openai"])
+        self.assertEqual(expected, self.store.synchronize(["openai"], {})["openai"])
+        other_node_store.close()
+
+    def test_stores_throttle(self):
+        delta = CircuitDelta(failure_threshold=2)
+        delta.record_throttle(100.0, 130.0)
+
+        self.store.synchronize(["openai"], {"openai": delta})
+
+        self.assertEqual(
+            CircuitRecord(state="OPEN", last_failure=100.0, open_until=130.0),
+            self.store.synchronize(["openai"], {})["openai"],
+        )
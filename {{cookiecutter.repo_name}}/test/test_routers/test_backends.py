@@ -0,0 +1,18 @@
+from test.resources import TestBase
+
+
+class TestBackends(TestBase):
+    def test_backends(self):
+        response = self.client.get("/backends")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {
+                "selector": "weighted",
+                "backends": {"primary": {"weight": 1, "available": True}},
+                "quotas": {},
+                "hedging": None,
+                "bulkheads": {},
+            },
+            response.json(),
+        )
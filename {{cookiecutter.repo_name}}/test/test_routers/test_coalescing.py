@@ -0,0 +1,12 @@
+from test.resources import TestBase
+
+
+class TestCoalescing(TestBase):
+    def test_coalescing(self):
+        response = self.client.get("/coalescing")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {"enabled": False, "upstream_calls": 0, "coalesced_calls": 0, "in_flight": 0},
+            response.json(),
+        )
@@ -0,0 +1,10 @@
+from test.resources import TestBase
+
+
+class TestMetrics(TestBase):
+    def test_metrics(self):
+        response = self.client.get("/metrics")
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('gateway_circuit_state{circuit="primary",state="CLOSED"} 1.0', response.text)
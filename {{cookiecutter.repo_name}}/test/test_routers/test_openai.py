@@ -1,13 +1,17 @@
 import json
+
+import httpx
 import pytest
-from unittest.mock import MagicMock, Mock, patch
+from unittest.mock import patch
 from fastapi.testclient import TestClient
+from dependency_injector import providers
 from pydantic import SecretStr
 
 from src.create_app import create_app
 from src.services import CircuitBreakerService
+from src.services.tenant_quota_service import TenantQuotaService
 
-from test.resources import TestBase
+from test.resources import TestBase, UpstreamStub
 
 primary_openai_host = "http://dummy_host_primary"
 fallback_openai_host = "http://dummy_host_fallback"
@@ -18,71 +22,75 @@ fallback_openai_api_key = "dummy_api_key_fallback"
 
 class Test(TestBase):
     def test_openai_forwards_requests_and_returns_successful_response(self):
-        with patch("src.api.routers.openai.requests.request") as request:
-            request_data = json.dumps(
-                {
-                    "messages": [{"role": "system", "content": "Message"}],
-                    "model": "gpt-35-turbo",
-                    "frequency_penalty": 0.0,
-                    "logit_bias": {},
-                    "max_tokens": 1000,
-                    "n": 1,
-                    "presence_penalty": 0.0,
-                    "stop": None,
-                    "stream": False,
-                    "temperature": 0.0,
-                    "top_p": 1.0,
-                    "user": "",
-                }
-            )
-            response_data = json.dumps(
-                {
-                    "id": "chatcmpl-8xaBj8LBEkmnqOxVQ4IS2UsRCLmPT",
-                    "object": "chat.completion",
-                    "created": 1709211151,
-                    "model": "gpt-35-turbo",
-                    "choices": [
-                        {
-                            "finish_reason": "stop",
-                            "index": 0,
-                            "message": {"role": "assistant", "content": "Mock content"},
-                            "logprobs": None,
-                        }
-                    ],
-                    "usage": {
-                        "prompt_tokens": 1985,
-                        "completion_tokens": 150,
-                        "total_tokens": 2135,
-                    },
-                }
-            )
-
-            mock_downstream_response = Mock()
-            mock_downstream_response.content = bytes(response_data, encoding="utf-8")
-            mock_downstream_response.status_code = 200
-            mock_downstream_response.headers = {
-                "connection": "keep-alive",
-                "content-type": "application/json",
+        request_data = json.dumps(
+            {
+                "messages": [{"role": "system", "content": "Message"}],
+                "model": "gpt-35-turbo",
+                "frequency_penalty": 0.0,
+                "logit_bias": {},
+                "max_tokens": 1000,
+                "n": 1,
+                "presence_penalty": 0.0,
+                "stop": None,
+                "stream": False,
+                "temperature": 0.0,
+                "top_p": 1.0,
+                "user": "",
             }
-            request.return_value = mock_downstream_response
-            response = self.client.post(
-                "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
-                content=request_data,
-            )
-            settings = self.app.container.settings()
+        )
+        response_data = json.dumps(
+            {
+                "id": "chatcmpl-8xaBj8LBEkmnqOxVQ4IS2UsRCLmPT",
+                "object": "chat.completion",
+                "created": 1709211151,
+                "model": "gpt-35-turbo",
+                "choices": [
+                    {
+                        "finish_reason": "stop",
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "Mock content"},
+                        "logprobs": None,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 1985,
+                    "completion_tokens": 150,
+                    "total_tokens": 2135,
+                },
+            }
+        )
 
-            assert request.call_args[0] == (
-                "POST",
-                f"{settings.primary_open_ai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+        upstream = UpstreamStub(
+            httpx.Response(
+                200,
+                content=bytes(response_data, encoding="utf-8"),
+                headers={
+                    "connection": "keep-alive",
+                    "content-type": "application/json",
+                },
             )
-            assert request.call_args[1]["params"] == {
-                "api-version": "2023-03-15-preview"
-            }
-            assert request.call_args[1]["headers"].get("host") == "primary-host"
-            assert request.call_args[1]["data"] == bytes(request_data, encoding="utf-8")
-            assert response.text == response_data
-            assert response.status_code == 200
-            assert "connection" not in response.headers
+        )
+        upstream.install(self.app.container)
+
+        response = self.client.post(
+            "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
+            content=request_data,
+        )
+        settings = self.app.container.settings()
+
+        upstream_request = upstream.requests[0]
+        assert upstream_request.method == "POST"
+        assert upstream_request.url.copy_with(query=None) == (
+            f"{settings.primary_open_ai_host}/openai/deployments/gpt-35-turbo/chat/completions"
+        )
+        assert dict(upstream_request.url.params) == {
+            "api-version": "2023-03-15-preview"
+        }
+        assert upstream_request.headers.get("host") == "primary-host"
+        assert upstream_request.content == bytes(request_data, encoding="utf-8")
+        assert response.text == response_data
+        assert response.status_code == 200
+        assert "connection" not in response.headers
 
 
 request_data = json.dumps(
@@ -140,62 +148,86 @@ def client(app):
     return TestClient(app)
 
 
-async def mock_circuit_breaker_execute(circuit_id, function, fallback_function):
+def stub_upstream(client, *responses):
+    upstream = UpstreamStub(*responses)
+    upstream.install(client.app.container)
+    return upstream
+
+
+def upstream_url(upstream_request: httpx.Request):
+    return str(upstream_request.url.copy_with(query=None))
+
+
+async def mock_circuit_breaker_execute_pool(
+    pool,
+    function,
+    fallback_function,
+    *args,
+    cost=0,
+    hedge_function=None,
+    deadline=None,
+    priority=None,
+):
     try:
-        return await function()
+        return await function(next(pool.select()), *args)
     except Exception:
-        return await fallback_function()
+        return await fallback_function(*args)
 
 
-@patch("src.api.routers.openai.requests.request")
-def test_openai_bad_request(request: MagicMock, client):
-    mock_downstream_response = Mock()
-    mock_downstream_response.content = bytes("Bad request", encoding="utf-8")
-    mock_downstream_response.status_code = 400
-    mock_downstream_response.headers = {
-        "connection": "keep-alive",
-        "content-type": "application/json",
-    }
+def test_openai_bad_request(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            400,
+            content=bytes("Bad request", encoding="utf-8"),
+            headers={
+                "connection": "keep-alive",
+                "content-type": "application/json",
+            },
+        ),
+    )
     settings = client.app.container.settings()
     settings.primary_open_ai_host = primary_openai_host
     settings.secondary_open_ai_host = fallback_openai_host
-    request.return_value = mock_downstream_response
 
     with patch.object(
-        CircuitBreakerService, "execute", side_effect=mock_circuit_breaker_execute
+        CircuitBreakerService,
+        "execute_pool",
+        side_effect=mock_circuit_breaker_execute_pool,
     ):
         response = client.post(
             "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
             content=request_data,
         )
 
-    request.assert_called_once()
-    assert request.call_args[0] == (
-        "POST",
-        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    assert upstream.call_count == 1
+    assert upstream.requests[0].method == "POST"
+    assert upstream_url(upstream.requests[0]) == (
+        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
 
     assert response.text == "Bad request"
     assert response.status_code == 400
 
 
-@patch("src.api.routers.openai.requests.request")
-def test_openai_fallbacks_on_exception_calling_primary(request: MagicMock, client):
-    mock_downstream_response = Mock()
-    mock_downstream_response.content = bytes(success_response_data, encoding="utf-8")
-    mock_downstream_response.status_code = 200
-    mock_downstream_response.headers = {
-        "connection": "keep-alive",
-        "content-type": "application/json",
-    }
-
-    request.side_effect = [
-        Exception("Stubbed primary failure"),
-        mock_downstream_response,
-    ]
+def test_openai_fallbacks_on_exception_calling_primary(client):
+    upstream = stub_upstream(
+        client,
+        httpx.ConnectError("Stubbed primary failure"),
+        httpx.Response(
+            200,
+            content=bytes(success_response_data, encoding="utf-8"),
+            headers={
+                "connection": "keep-alive",
+                "content-type": "application/json",
+            },
+        ),
+    )
 
     with patch.object(
-        CircuitBreakerService, "execute", side_effect=mock_circuit_breaker_execute
+        CircuitBreakerService,
+        "execute_pool",
+        side_effect=mock_circuit_breaker_execute_pool,
     ):
         response = client.post(
             "/openai/deployments/gpt-35-turbo/chat/"
@@ -211,27 +243,24 @@ def test_openai_fallbacks_on_exception_calling_primary(request: MagicMock, clien
         )
 
     # Check first call is still made
-    assert request.call_args_list[0][0] == (
-        "POST",
-        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    assert upstream.requests[0].method == "POST"
+    assert upstream_url(upstream.requests[0]) == (
+        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
 
     # Check fallback call is made correctly
-    assert request.call_args_list[1][0] == (
-        "POST",
-        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    fallback_request = upstream.requests[1]
+    assert fallback_request.method == "POST"
+    assert upstream_url(fallback_request) == (
+        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
-    assert request.call_args_list[1][1]["params"] == {
-        "api-version": "2023-03-15-preview"
-    }
-    assert request.call_args_list[1][1]["headers"] == {
-        "host": "dummy_host_fallback",
-        "accept": "application/json",
-        "content-type": "application/json",
-        "accept-encoding": "gzip",
-        "api-key": fallback_openai_api_key,
-    }
-    assert request.call_args_list[1][1]["data"] == bytes(request_data, encoding="utf-8")
+    assert dict(fallback_request.url.params) == {"api-version": "2023-03-15-preview"}
+    assert fallback_request.headers["host"] == "dummy_host_fallback"
+    assert fallback_request.headers["accept"] == "application/json"
+    assert fallback_request.headers["content-type"] == "application/json"
+    assert fallback_request.headers["accept-encoding"] == "gzip"
+    assert fallback_request.headers["api-key"] == fallback_openai_api_key
+    assert fallback_request.content == bytes(request_data, encoding="utf-8")
 
     # Check fallback response is returned
     assert response.text == success_response_data
@@ -240,85 +269,463 @@ def test_openai_fallbacks_on_exception_calling_primary(request: MagicMock, clien
     assert response.headers["content-type"] == "application/json"
 
 
-@patch("src.api.routers.openai.requests.request")
-def test_fallback_after_too_many_requests(request: MagicMock, client):
-    mock_downstream_response_one = Mock()
-    mock_downstream_response_one.content = bytes("Too many requests", encoding="utf-8")
-    mock_downstream_response_one.status_code = 429
-    mock_downstream_response_one.headers = {
-        "connection": "keep-alive",
-        "content-type": "application/json",
-    }
+def test_fallback_after_too_many_requests(client):
     settings = client.app.container.settings()
     settings.primary_open_ai_host = primary_openai_host
     settings.fallback_open_ai_host = fallback_openai_host
     settings.primary_open_ai_api_key = SecretStr(primary_openai_api_key)
     settings.fallback_open_ai_api_key = SecretStr(fallback_openai_api_key)
-    mock_downstream_response_two = Mock()
-    mock_downstream_response_two.content = bytes(
-        success_response_data, encoding="utf-8"
-    )
-    mock_downstream_response_two.status_code = 200
-    mock_downstream_response_two.headers = {
-        "connection": "keep-alive",
-        "content-type": "application/json",
-    }
-
-    request.side_effect = [mock_downstream_response_one, mock_downstream_response_two]
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            429,
+            content=bytes("Too many requests", encoding="utf-8"),
+            headers={
+                "connection": "keep-alive",
+                "content-type": "application/json",
+            },
+        ),
+        httpx.Response(
+            200,
+            content=bytes(success_response_data, encoding="utf-8"),
+            headers={
+                "connection": "keep-alive",
+                "content-type": "application/json",
+            },
+        ),
+    )
 
     with patch.object(
-        CircuitBreakerService, "execute", side_effect=mock_circuit_breaker_execute
+        CircuitBreakerService,
+        "execute_pool",
+        side_effect=mock_circuit_breaker_execute_pool,
     ):
         response = client.post(
             "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
             content=request_data,
         )
 
-    assert request.call_count == 2
-    assert request.call_args_list[0][0] == (
-        "POST",
-        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    assert upstream.call_count == 2
+    assert upstream_url(upstream.requests[0]) == (
+        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
-    assert request.call_args_list[1][0] == (
-        "POST",
-        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    assert upstream_url(upstream.requests[1]) == (
+        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
 
     assert response.text == success_response_data
     assert response.status_code == 200
 
 
-@patch("src.api.routers.openai.requests.request")
-def test_fallback_failure(request: MagicMock, client):
-    mock_downstream_response = Mock()
-    mock_downstream_response.content = bytes("Internal server error", encoding="utf-8")
-    mock_downstream_response.status_code = 500
-    mock_downstream_response.headers = {
-        "connection": "keep-alive",
-        "content-type": "application/json",
-    }
+def test_fallback_failure(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            500,
+            content=bytes("Internal server error", encoding="utf-8"),
+            headers={
+                "connection": "keep-alive",
+                "content-type": "application/json",
+            },
+        ),
+    )
     settings = client.app.container.settings()
     settings.primary_open_ai_host = primary_openai_host
     settings.secondary_open_ai_host = fallback_openai_host
-    request.return_value = mock_downstream_response
 
     with patch.object(
-        CircuitBreakerService, "execute", side_effect=mock_circuit_breaker_execute
+        CircuitBreakerService,
+        "execute_pool",
+        side_effect=mock_circuit_breaker_execute_pool,
     ):
         response = client.post(
             "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
             content=request_data,
         )
 
-    assert request.call_count == 2
-    assert request.call_args_list[0][0] == (
-        "POST",
-        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    assert upstream.call_count == 2
+    assert upstream_url(upstream.requests[0]) == (
+        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
-    assert request.call_args_list[1][0] == (
-        "POST",
-        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    assert upstream_url(upstream.requests[1]) == (
+        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
     )
 
     assert response.text == "Internal server error"
     assert response.status_code == 500
+
+
+def test_openai_returns_decoded_body_without_encoding_headers(client):
+    stub_upstream(
+        client,
+        httpx.Response(
+            200,
+            content=bytes(success_response_data, encoding="utf-8"),
+            headers={
+                "content-type": "application/json",
+                "content-encoding": "identity",
+            },
+        ),
+    )
+
+    response = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
+        content=request_data,
+    )
+
+    assert response.status_code == 200
+    assert response.text == success_response_data
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(success_response_data))
+
+
+stream_request_data = json.dumps(
+    {
+        "messages": [{"role": "system", "content": "Message"}],
+        "model": "gpt-35-turbo",
+        "stream": True,
+    }
+)
+
+
+async def sse_events(*events, failure=None):
+    for event in events:
+        yield f"data: {event}\n\n".encode()
+
+    if failure is not None:
+        raise failure
+
+
+def test_openai_streams_response(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            200,
+            content=sse_events('{"choices": [{"delta": {"content": "Mock"}}]}', "[DONE]"),
+            headers={"content-type": "text/event-stream"},
+        ),
+    )
+
+    with client.stream(
+        "POST",
+        "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
+        content=stream_request_data,
+    ) as response:
+        chunks = list(response.iter_bytes())
+
+    assert upstream.call_count == 1
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/event-stream"
+    assert b"".join(chunks) == (
+        b'data: {"choices": [{"delta": {"content": "Mock"}}]}\n\ndata: [DONE]\n\n'
+    )
+
+
+def test_openai_stream_fallbacks_on_failure_before_first_byte(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            200,
+            content=sse_events(failure=httpx.ReadError("Stubbed primary failure")),
+            headers={"content-type": "text/event-stream"},
+        ),
+        httpx.Response(
+            200,
+            content=sse_events("fallback", "[DONE]"),
+            headers={"content-type": "text/event-stream"},
+        ),
+    )
+
+    response = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
+        content=stream_request_data,
+    )
+
+    assert upstream.call_count == 2
+    assert upstream_url(upstream.requests[1]) == (
+        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions"
+    )
+    assert response.status_code == 200
+    assert response.text == "data: fallback\n\ndata: [DONE]\n\n"
+
+
+def test_openai_stream_fallbacks_on_too_many_requests(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(429, content=b"Too many requests"),
+        httpx.Response(
+            200,
+            content=sse_events("fallback", "[DONE]"),
+            headers={"content-type": "text/event-stream"},
+        ),
+    )
+
+    response = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
+        content=stream_request_data,
+    )
+
+    assert upstream.call_count == 2
+    assert response.status_code == 200
+    assert response.text == "data: fallback\n\ndata: [DONE]\n\n"
+
+
+def test_openai_stream_reports_failure_after_first_byte(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            200,
+            content=sse_events("first", failure=httpx.ReadError("Stubbed failure")),
+            headers={"content-type": "text/event-stream"},
+        ),
+    )
+
+    response = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview",
+        content=stream_request_data,
+    )
+
+    assert upstream.call_count == 1
+    assert response.status_code == 200
+    events = response.text.split("\n\n")
+    assert events[0] == "data: first"
+    assert json.loads(events[1][len("data: "):])["error"]["type"] == (
+        "upstream_stream_error"
+    )
+
+
+def test_openai_spreads_requests_over_backend_pool(monkeypatch):
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", fallback_openai_host)
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", fallback_openai_api_key)
+    monkeypatch.setenv(
+        "OPENAI_BACKENDS",
+        json.dumps(
+            [
+                {"name": "east", "host": "http://dummy_host_east", "api_key": "east_key"},
+                {"name": "west", "host": "http://dummy_host_west", "api_key": "west_key"},
+            ]
+        ),
+    )
+    client = TestClient(create_app())
+    upstream = stub_upstream(client, httpx.Response(200, content=b"{}"))
+
+    for _ in range(4):
+        response = client.post("/openai/deployments/gpt-35-turbo/chat/completions")
+        assert response.status_code == 200
+
+    assert [request.headers["api-key"] for request in upstream.requests] == [
+        "east_key",
+        "west_key",
+        "east_key",
+        "west_key",
+    ]
+
+
+def test_openai_routes_away_from_backend_without_quota(monkeypatch):
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", fallback_openai_host)
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", fallback_openai_api_key)
+    monkeypatch.setenv(
+        "OPENAI_BACKENDS",
+        json.dumps(
+            [
+                {"name": "east", "host": "http://dummy_host_east", "api_key": "east_key"},
+                {"name": "west", "host": "http://dummy_host_west", "api_key": "west_key"},
+            ]
+        ),
+    )
+    client = TestClient(create_app())
+    upstream = stub_upstream(
+        client,
+        httpx.Response(200, content=b"{}", headers={"x-ratelimit-remaining-tokens": "10"}),
+        httpx.Response(200, content=b"{}"),
+    )
+
+    for _ in range(3):
+        response = client.post(
+            "/openai/deployments/gpt-35-turbo/chat/completions", content=request_data
+        )
+        assert response.status_code == 200
+
+    assert [request.headers["api-key"] for request in upstream.requests] == [
+        "east_key",
+        "west_key",
+        "west_key",
+    ]
+
+
+def test_openai_sends_throttled_traffic_to_fallback_for_retry_after(client):
+    upstream = stub_upstream(
+        client,
+        httpx.Response(429, content=b"Too many requests", headers={"retry-after-ms": "60000"}),
+        httpx.Response(200, content=b"fallback response"),
+    )
+
+    responses = [
+        client.post("/openai/deployments/gpt-35-turbo/chat/completions", content=request_data)
+        for _ in range(2)
+    ]
+
+    assert [response.text for response in responses] == ["fallback response"] * 2
+    assert [upstream_url(request) for request in upstream.requests] == [
+        f"{primary_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+        f"{fallback_openai_host}/openai/deployments/gpt-35-turbo/chat/completions",
+    ]
+    circuit = client.app.container.circuit_breaker_service().get_circuit("primary")
+    assert circuit.failure_count == 0
+    assert circuit.open_until == pytest.approx(circuit.last_failure + 60)
+
+
+def test_openai_serves_deterministic_requests_from_cache(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "true")
+    monkeypatch.setenv("PRIMARY_OPENAI_HOST", primary_openai_host)
+    monkeypatch.setenv("FALLBACK_OPENAI_HOST", fallback_openai_host)
+    monkeypatch.setenv("PRIMARY_OPENAI_API_KEY", primary_openai_api_key)
+    monkeypatch.setenv("FALLBACK_OPENAI_API_KEY", fallback_openai_api_key)
+    client = TestClient(create_app())
+    upstream = stub_upstream(
+        client,
+        httpx.Response(
+            200,
+            content=bytes(success_response_data, encoding="utf-8"),
+            headers={"content-type": "application/json"},
+        ),
+    )
+    url = "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2023-03-15-preview"
+
+    miss = client.post(url, content=request_data)
+    hit = client.post(url, content=request_data)
+    bypass = client.post(url, content=request_data, headers={"cache-control": "no-cache"})
+    sampled = client.post(url, content=request_data.replace('"temperature": 0.0', '"temperature": 1.0'))
+
+    assert upstream.call_count == 3
+    assert [response.headers.get("x-cache-status") for response in [miss, hit, bypass, sampled]] == [
+        "MISS",
+        "HIT",
+        "BYPASS",
+        None,
+    ]
+    assert hit.text == success_response_data
+    assert hit.headers["content-type"] == "application/json"
+
+
+def test_openai_takes_deadline_from_request_timeout_header(client):
+    deadlines = []
+
+    async def execute_pool(pool, function, fallback_function, *args, deadline=None, **kwargs):
+        deadlines.append(deadline)
+        return httpx.Response(200, content=b"response")
+
+    with patch.object(CircuitBreakerService, "execute_pool", side_effect=execute_pool):
+        client.post(
+            "/openai/deployments/gpt-35-turbo/chat/completions",
+            content=request_data,
+            headers={"x-request-timeout": "30"},
+        )
+        client.post("/openai/deployments/gpt-35-turbo/chat/completions", content=request_data)
+
+    assert 29 < deadlines[0].remaining() <= 30
+    assert 59 < deadlines[1].remaining() <= 60
+    assert deadlines[0].fallback_reserve == 10.0
+
+
+def test_openai_rejects_invalid_request_timeout_header(client):
+    response = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions",
+        content=request_data,
+        headers={"x-request-timeout": "soon"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_openai_classifies_request_by_priority_header(client):
+    priorities = []
+
+    async def execute_pool(pool, function, fallback_function, *args, priority=None, **kwargs):
+        priorities.append(priority)
+        return httpx.Response(200, content=b"response")
+
+    with patch.object(CircuitBreakerService, "execute_pool", side_effect=execute_pool):
+        client.post(
+            "/openai/deployments/gpt-35-turbo/chat/completions",
+            content=request_data,
+            headers={"x-priority": "batch"},
+        )
+        client.post("/openai/deployments/gpt-35-turbo/chat/completions", content=request_data)
+        rejected = client.post(
+            "/openai/deployments/gpt-35-turbo/chat/completions",
+            content=request_data,
+            headers={"x-priority": "urgent"},
+        )
+
+    assert priorities == ["batch", "default"]
+    assert rejected.status_code == 400
+    statistics = client.app.container.priority_service().statistics()
+    assert statistics["batch"]["requests"] == 1
+    assert statistics["default"]["requests"] == 1
+
+
+def test_openai_rejects_request_over_tenant_quota_before_calling_upstream(client):
+    tenant_quota_service = TenantQuotaService(enabled=True, requests_per_minute=1, tokens_per_minute=100_000)
+    client.app.container.tenant_quota_service.override(providers.Object(tenant_quota_service))
+    upstream = stub_upstream(client, httpx.Response(200, content=success_response_data))
+    headers = {"x-tenant-id": "team-a"}
+
+    accepted = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions", content=request_data, headers=headers
+    )
+    rejected = client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions", content=request_data, headers=headers
+    )
+
+    assert accepted.status_code == 200
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "60"
+    assert upstream.call_count == 1
+    statistics = tenant_quota_service.statistics()["anonymous"]
+    assert statistics["used_tokens"] == 2135
+    assert statistics["rejected_requests"] == 1
+
+
+def test_openai_accounts_usage_per_backend_deployment_and_tenant(client):
+    stub_upstream(client, httpx.Response(200, content=success_response_data))
+
+    client.post(
+        "/openai/deployments/gpt-35-turbo/chat/completions",
+        content=request_data,
+        headers={"x-tenant-id": "team-a"},
+    )
+
+    usage = client.get("/usage").json()["usage"]
+    assert [(row["deployment"], row["tenant"], row["prompt_tokens"], row["completion_tokens"]) for row in usage] == [
+        ("gpt-35-turbo", "team-a", 1985, 150)
+    ]
+
+
+def test_openai_reconciles_tenant_quota_with_usage_of_stream(client):
+    tenant_quota_service = TenantQuotaService(enabled=True, tokens_per_minute=100_000)
+    client.app.container.tenant_quota_service.override(providers.Object(tenant_quota_service))
+    stub_upstream(
+        client,
+        httpx.Response(
+            200,
+            content=sse_events(
+                '{"choices": [{"delta": {"content": "Mock"}}], "usage": null}',
+                '{"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 30}}',
+                "[DONE]",
+            ),
+            headers={"content-type": "text/event-stream"},
+        ),
+    )
+
+    with client.stream(
+        "POST",
+        "/openai/deployments/gpt-35-turbo/chat/completions",
+        content=stream_request_data,
+        headers={"x-tenant-id": "team-a"},
+    ) as response:
+        list(response.iter_bytes())
+
+    assert tenant_quota_service.statistics()["anonymous"]["used_tokens"] == 42
+    assert client.get("/usage").json()["total"]["total_tokens"] == 42
@@ -0,0 +1,13 @@
+from test.resources import TestBase
+
+
+class TestPriorities(TestBase):
+    def test_priorities(self):
+        response = self.client.get("/priorities")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {"weight": 2, "requests": 0, "p50": None, "p95": None, "p99": None},
+            response.json()["default"],
+        )
+        self.assertEqual(["interactive", "default", "batch"], list(response.json()))
@@ -0,0 +1,9 @@
+from test.resources import TestBase
+
+
+class TestTenants(TestBase):
+    def test_tenants(self):
+        response = self.client.get("/tenants")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({}, response.json())
@@ -0,0 +1,15 @@
+from test.resources import TestBase
+
+
+class TestUsage(TestBase):
+    def test_usage(self):
+        response = self.client.get("/usage")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {
+                "total": {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                "usage": [],
+            },
+            response.json(),
+        )
@@ -0,0 +1,68 @@
+from time import time
+from unittest import TestCase
+
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+from src.services.backend_capacity import (
+    BackendCapacityTracker,
+    DEFAULT_MAX_TOKENS,
+    estimate_cost,
+)
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.backend = Backend("east", "https://east", SecretStr("some-key"))
+        self.tracker = BackendCapacityTracker(window=60.0)
+
+    def test_estimate_cost_adds_prompt_and_max_tokens(self):
+        body = b'{"messages": [], "max_tokens": 100}'
+
+        self.assertEqual(len(body) // 4 + 100, estimate_cost(body))
+
+    def test_estimate_cost_assumes_default_max_tokens(self):
+        self.assertEqual(DEFAULT_MAX_TOKENS, estimate_cost(b""))
+
+    def test_estimate_cost_takes_max_tokens_of_decoded_body(self):
+        body = b'{"messages": [], "max_tokens": 100}'
+
+        self.assertEqual(len(body) // 4 + 100, estimate_cost(body, {"max_tokens": 100}))
+        self.assertEqual(len(body) // 4 + DEFAULT_MAX_TOKENS, estimate_cost(body, {"max_tokens": None}))
+
+    def test_reserve_given_no_reported_quota(self):
+        self.assertTrue(self.tracker.reserve(self.backend, 10_000))
+
+    def test_reserve_subtracts_cost_from_reported_quota(self):
+        self.tracker.observe(
+            self.backend,
+            {"x-ratelimit-remaining-tokens": "1500", "x-ratelimit-remaining-requests": "10"},
+        )
+
+        self.assertTrue(self.tracker.reserve(self.backend, 1000))
+        self.assertFalse(self.tracker.reserve(self.backend, 1000))
+        self.assertEqual(
+            {"remaining_tokens": 500, "remaining_requests": 9},
+            {
+                key: value
+                for key, value in self.tracker.capacities()["east"].items()
+                if key != "expires"
+            },
+        )
+
+    def test_reserve_fails_given_no_remaining_requests(self):
+        self.tracker.observe(self.backend, {"x-ratelimit-remaining-requests": "0"})
+
+        self.assertFalse(self.tracker.reserve(self.backend, 1))
+
+    def test_reserve_given_expired_quota(self):
+        self.tracker.observe(self.backend, {"x-ratelimit-remaining-tokens": "0"})
+        self.tracker._capacities["east"].expires = time() - 1
+
+        self.assertTrue(self.tracker.reserve(self.backend, 1000))
+        self.assertIsNone(self.tracker.replenished_at(self.backend))
+
+    def test_observe_ignores_responses_without_quota(self):
+        self.tracker.observe(self.backend, {"x-ratelimit-remaining-tokens": "unknown"})
+
+        self.assertEqual({}, self.tracker.capacities())
@@ -0,0 +1,86 @@
+import random
+from collections import Counter
+from unittest import TestCase
+
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+from src.core.model.backend_pool import BackendPool
+from src.services.backend_selector import LatencyAwareBackendSelector
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.backends = [
+            Backend(identifier, f"https://{identifier}", SecretStr("some-key"))
+            for identifier in ["east", "west"]
+        ]
+        self.east, self.west = self.backends
+        self.pool = BackendPool(self.backends)
+        self.selector = LatencyAwareBackendSelector(
+            decay=10.0, random_generator=random.Random(0)
+        )
+
+    def record(self, backend, latency):
+        self.selector.start(backend)
+        self.selector.complete(backend, latency)
+
+    def test_select_prefers_backend_with_lower_latency(self):
+        self.record(self.east, 0.1)
+        self.record(self.west, 2.0)
+
+        selected = Counter(next(self.selector.select(self.pool)).identifier for _ in range(10))
+
+        self.assertEqual({"east": 10}, selected)
+
+    def test_select_prefers_backend_with_fewer_calls_in_flight(self):
+        self.record(self.east, 0.1)
+        self.record(self.west, 0.2)
+
+        for _ in range(3):
+            self.selector.start(self.east)
+
+        self.assertIs(self.west, next(self.selector.select(self.pool)))
+
+    def test_select_yields_other_backends_after_the_first(self):
+        selected = list(self.selector.select(self.pool))
+
+        self.assertEqual({"east", "west"}, {backend.identifier for backend in selected})
+
+    def test_select_skips_unavailable_backends(self):
+        self.record(self.east, 0.1)
+        self.record(self.west, 2.0)
+        self.pool.mark_unavailable(self.east, float("inf"))
+
+        self.assertEqual([self.west], list(self.selector.select(self.pool)))
+
+    def test_failed_calls_do_not_change_latency(self):
+        self.record(self.east, 0.5)
+        self.selector.start(self.east)
+        self.selector.complete(self.east)
+
+        scores = self.selector.scores(self.pool)["east"]
+
+        self.assertEqual(0.5, scores["latency"])
+        self.assertEqual(0, scores["in_flight"])
+
+    def test_latency_decays_towards_recent_observations(self):
+        self.record(self.east, 1.0)
+        statistics = self.selector._get_statistics(self.east)
+        statistics.updated -= 10.0
+
+        self.record(self.east, 0.0)
+
+        # After one time constant, the old observation keeps a weight of 1 / e
+        self.assertAlmostEqual(0.368, statistics.latency, places=3)
+
+    def test_scores_contain_cost_per_backend(self):
+        self.record(self.east, 0.5)
+        self.selector.start(self.east)
+
+        scores = self.selector.scores(self.pool)
+
+        self.assertEqual(
+            {"weight": 1, "available": True, "latency": 0.5, "in_flight": 1, "cost": 1.0},
+            scores["east"],
+        )
@@ -0,0 +1,238 @@
+import asyncio
+from unittest import TestCase
+
+import httpx
+
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.bulkhead import Bulkhead
+from src.services.concurrency_limiter import GradientLimiter
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.bulkhead = Bulkhead(max_concurrency=2, max_queue_size=2, max_queue_time=1.0)
+
+    def run_async(self, coroutine):
+        return asyncio.get_event_loop().run_until_complete(coroutine)
+
+    def test_acquire_given_free_slot(self):
+        self.assertTrue(self.run_async(self.bulkhead.acquire("east")))
+        self.assertTrue(self.run_async(self.bulkhead.acquire("east")))
+        self.assertEqual(2, self.bulkhead.statistics()["east"]["in_flight"])
+        self.assertEqual(0, self.bulkhead.statistics()["east"]["queued_calls"])
+
+    def test_try_acquire_fails_given_no_free_slot(self):
+        self.assertTrue(self.bulkhead.try_acquire("east"))
+        self.assertTrue(self.bulkhead.try_acquire("east"))
+
+        self.assertFalse(self.bulkhead.try_acquire("east"))
+        self.assertTrue(self.bulkhead.try_acquire("west"))
+
+    def test_hands_released_slots_to_waiting_calls_in_order(self):
+        order = []
+
+        async def call(name):
+            self.assertTrue(await self.bulkhead.acquire("east"))
+            order.append(name)
+
+        async def scenario():
+            self.bulkhead.try_acquire("east")
+            self.bulkhead.try_acquire("east")
+            tasks = [asyncio.ensure_future(call(name)) for name in ["first", "second"]]
+            await asyncio.sleep(0.01)
+            self.assertEqual(2, self.bulkhead.statistics()["east"]["queue_depth"])
+
+            self.bulkhead.release("east")
+            await asyncio.sleep(0.01)
+            self.assertEqual(["first"], order)
+
+            self.bulkhead.release("east")
+            await asyncio.gather(*tasks)
+
+        self.run_async(scenario())
+
+        statistics = self.bulkhead.statistics()["east"]
+        self.assertEqual(["first", "second"], order)
+        self.assertEqual(2, statistics["in_flight"])
+        self.assertEqual(0, statistics["queue_depth"])
+        self.assertEqual(2, statistics["queued_calls"])
+        self.assertGreater(statistics["max_wait_time"], 0)
+
+    def test_rejects_call_given_full_queue(self):
+        bulkhead = Bulkhead(max_concurrency=1, max_queue_size=0, max_queue_time=1.0)
+        bulkhead.try_acquire("east")
+
+        self.assertFalse(self.run_async(bulkhead.acquire("east")))
+        self.assertEqual(1, bulkhead.statistics()["east"]["rejected_calls"])
+
+    def test_gives_up_after_max_queue_time(self):
+        bulkhead = Bulkhead(max_concurrency=1, max_queue_size=1, max_queue_time=0.05)
+        bulkhead.try_acquire("east")
+
+        self.assertFalse(self.run_async(bulkhead.acquire("east")))
+
+        statistics = bulkhead.statistics()["east"]
+        self.assertEqual(1, statistics["timed_out_calls"])
+        self.assertEqual(0, statistics["queue_depth"])
+        self.assertEqual(1, statistics["in_flight"])
+
+    def test_cancelled_call_leaves_queue(self):
+        bulkhead = Bulkhead(max_concurrency=1, max_queue_size=1, max_queue_time=1.0)
+
+        async def scenario():
+            bulkhead.try_acquire("east")
+            task = asyncio.ensure_future(bulkhead.acquire("east"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+            bulkhead.release("east")
+
+        self.run_async(scenario())
+
+        self.assertEqual(0, bulkhead.statistics()["east"]["in_flight"])
+        self.assertEqual(0, bulkhead.statistics()["east"]["queue_depth"])
+
+    def test_slot_handed_to_cancelled_call_is_passed_on(self):
+        bulkhead = Bulkhead(max_concurrency=1, max_queue_size=2, max_queue_time=1.0)
+
+        async def scenario():
+            bulkhead.try_acquire("east")
+            cancelled = asyncio.ensure_future(bulkhead.acquire("east"))
+            waiting = asyncio.ensure_future(bulkhead.acquire("east"))
+            await asyncio.sleep(0.01)
+
+            # The slot is handed over, but the call is cancelled before it resumes
+            bulkhead.release("east")
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+
+            return await waiting
+
+        self.assertTrue(self.run_async(scenario()))
+        self.assertEqual(1, bulkhead.statistics()["east"]["in_flight"])
+
+    def test_streamed_response_holds_slot_until_closed(self):
+        async def scenario():
+            self.bulkhead.try_acquire("east")
+            stream = await UpstreamStream.open(httpx.Response(200, content=b"chunk"))
+            self.bulkhead.release_after("east", stream)
+            self.assertEqual(1, self.bulkhead.statistics()["east"]["in_flight"])
+
+            await stream.aclose()
+            await stream.aclose()
+
+        self.run_async(scenario())
+
+        self.assertEqual(0, self.bulkhead.statistics()["east"]["in_flight"])
+
+    def test_retry_after_covers_max_queue_time(self):
+        self.assertEqual(1, Bulkhead(max_queue_time=0.2).retry_after())
+        self.assertEqual(3, Bulkhead(max_queue_time=2.5).retry_after())
+
+    def test_reports_limit(self):
+        self.bulkhead.try_acquire("east")
+
+        self.assertEqual(2, self.bulkhead.statistics()["east"]["limit"])
+
+    def test_grown_limit_frees_slots_for_waiting_calls(self):
+        bulkhead = Bulkhead(
+            max_concurrency=10,
+            max_queue_size=10,
+            create_limiter=lambda: GradientLimiter(initial_limit=1, max_limit=10),
+        )
+
+        async def scenario():
+            bulkhead.try_acquire("east")
+            waiting = asyncio.ensure_future(bulkhead.acquire("east"))
+            await asyncio.sleep(0.01)
+            self.assertEqual(1, bulkhead.statistics()["east"]["queue_depth"])
+
+            for _ in range(10):
+                bulkhead.record("east", 0.1)
+
+            return await waiting
+
+        self.assertTrue(self.run_async(scenario()))
+        self.assertEqual(2, bulkhead.statistics()["east"]["in_flight"])
+
+    def test_shrunk_limit_does_not_replace_released_calls(self):
+        bulkhead = Bulkhead(
+            max_concurrency=10,
+            max_queue_size=10,
+            create_limiter=lambda: GradientLimiter(initial_limit=2, backoff_ratio=0.5),
+        )
+
+        async def scenario():
+            bulkhead.try_acquire("east")
+            bulkhead.try_acquire("east")
+            waiting = asyncio.ensure_future(bulkhead.acquire("east", timeout=0.05))
+            await asyncio.sleep(0.01)
+
+            bulkhead.drop("east")
+            bulkhead.release("east")
+
+            return await waiting
+
+        self.assertFalse(self.run_async(scenario()))
+        self.assertEqual(1, bulkhead.statistics()["east"]["limit"])
+        self.assertEqual(1, bulkhead.statistics()["east"]["in_flight"])
+
+    def test_shares_slots_between_classes_by_weight(self):
+        bulkhead = Bulkhead(
+            max_concurrency=1,
+            max_queue_size=10,
+            weights={"interactive": 3, "batch": 1},
+        )
+        order = []
+
+        async def call(priority):
+            self.assertTrue(await bulkhead.acquire("east", priority=priority))
+            order.append(priority)
+
+        async def scenario():
+            bulkhead.try_acquire("east")
+            # The batch calls arrive first, but may only take one slot for every three interactive calls
+            tasks = [asyncio.ensure_future(call("batch")) for _ in range(4)]
+            tasks += [asyncio.ensure_future(call("interactive")) for _ in range(4)]
+            await asyncio.sleep(0.01)
+
+            for _ in tasks:
+                bulkhead.release("east")
+                await asyncio.sleep(0)
+
+            await asyncio.gather(*tasks)
+
+        self.run_async(scenario())
+
+        self.assertEqual(
+            ["interactive", "interactive", "batch", "interactive", "interactive"], order[:5]
+        )
+
+    def test_full_queue_evicts_call_of_lower_class(self):
+        bulkhead = Bulkhead(
+            max_concurrency=1,
+            max_queue_size=1,
+            weights={"interactive": 3, "batch": 1},
+        )
+
+        async def scenario():
+            bulkhead.try_acquire("east")
+            batch = asyncio.ensure_future(bulkhead.acquire("east", priority="batch"))
+            await asyncio.sleep(0.01)
+            interactive = asyncio.ensure_future(bulkhead.acquire("east", priority="interactive"))
+            await asyncio.sleep(0.01)
+
+            # Another batch call finds the queue full of a higher class
+            self.assertFalse(await bulkhead.acquire("east", priority="batch"))
+            self.assertFalse(await batch)
+
+            bulkhead.release("east")
+            return await interactive
+
+        self.assertTrue(self.run_async(scenario()))
+
+        statistics = bulkhead.statistics()["east"]
+        self.assertEqual(1, statistics["evicted_calls"])
+        self.assertEqual(1, statistics["rejected_calls"])
+        self.assertEqual(1, statistics["in_flight"])
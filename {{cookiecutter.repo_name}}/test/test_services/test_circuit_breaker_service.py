@@ -1,10 +1,21 @@
 from fastapi import HTTPException
+from pydantic import SecretStr
 
+from src.core.exceptions.throttled_exception import ThrottledException
+from src.core.model.backend import Backend
+from src.core.model.backend_pool import BackendPool
+from src.core.model.deadline import Deadline
 from src.infrastructure.repositories.in_memory_circuit_breaker_repository import (
     InMemoryCircuitBreakerRepository,
 )
+from src.services.backend_capacity import BackendCapacityTracker
+from src.services.backend_selector import LatencyAwareBackendSelector
+from src.services.bulkhead import FALLBACK, Bulkhead
+from src.services.concurrency_limiter import GradientLimiter
 from src.services.circuit_breaker_service import CircuitBreakerService
-from src.core.model.circuit import Circuit
+from src.services.hedging_policy import HedgingPolicy
+from src.core.model.circuit import Circuit, CircuitState
+from time import time
 from unittest import TestCase
 import asyncio
 
@@ -59,6 +70,24 @@ class Test(TestCase):
         self.assertTrue(fallback_function_calls == 0)
         self.assertTrue(response == "function called")
 
+    def test_execute_passes_args_to_functions(self):
+        loop = asyncio.get_event_loop()
+
+        async def test_function(argument):
+            raise Exception("Failure")
+
+        async def test_fallback_function(argument):
+            return f"fallback function called with {argument}"
+
+        self.service.add_circuit(Circuit("test-circuit"))
+        response = loop.run_until_complete(
+            self.service.execute(
+                "test-circuit", test_function, test_fallback_function, "argument"
+            )
+        )
+
+        self.assertEqual("fallback function called with argument", response)
+
     def test_execute_calls_fallback_function_if_function_fails(self):
         function_calls = 0
         fallback_function_calls = 0
@@ -166,6 +195,66 @@ class Test(TestCase):
         self.assertTrue(response == "fallback function called")
         self.assertTrue(circuit.failure_count == 1)
 
+    def test_execute_calls_fallback_while_half_open_probe_is_in_flight(self):
+        loop = asyncio.get_event_loop()
+        circuit = Circuit("test-circuit", failure_threshold=1, retry_timeout=10)
+        circuit.handle_failed_call()
+        circuit.last_failure = time() - 10
+        self.service.add_circuit(circuit)
+        probe_started = asyncio.Event()
+        release_probe = asyncio.Event()
+
+        async def test_function():
+            probe_started.set()
+            await release_probe.wait()
+            return "function called"
+
+        async def test_fallback_function():
+            return "fallback function called"
+
+        async def run():
+            probe = asyncio.ensure_future(
+                self.service.execute("test-circuit", test_function, test_fallback_function)
+            )
+            await probe_started.wait()
+            other = await self.service.execute(
+                "test-circuit", test_function, test_fallback_function
+            )
+            release_probe.set()
+            return await probe, other
+
+        probe_response, other_response = loop.run_until_complete(run())
+
+        self.assertEqual("function called", probe_response)
+        self.assertEqual("fallback function called", other_response)
+        self.assertEqual(CircuitState.CLOSED, circuit.state)
+
+    def test_execute_frees_probe_slot_when_cancelled(self):
+        loop = asyncio.get_event_loop()
+        circuit = Circuit("test-circuit", failure_threshold=1, retry_timeout=10)
+        circuit.handle_failed_call()
+        circuit.last_failure = time() - 10
+        self.service.add_circuit(circuit)
+
+        async def test_function():
+            await asyncio.sleep(10)
+
+        async def test_fallback_function():
+            return "fallback function called"
+
+        async def run():
+            probe = asyncio.ensure_future(
+                self.service.execute("test-circuit", test_function, test_fallback_function)
+            )
+            await asyncio.sleep(0)
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+
+        loop.run_until_complete(run())
+
+        self.assertEqual(CircuitState.HALF_OPEN, circuit.state)
+        self.assertEqual(0, circuit.probes_in_flight)
+
     def test_execute_throws_exception_for_non_existing_circuit(self):
         loop = asyncio.get_event_loop()
 
@@ -186,3 +275,573 @@ class Test(TestCase):
 
         self.assertEqual("Circuit does not exist", context.exception.detail)
         self.assertEqual(500, context.exception.status_code)
+
+
+class TestExecuteThrottled(TestCase):
+    def test_execute_opens_circuit_for_retry_after_of_throttled_call(self):
+        repository = InMemoryCircuitBreakerRepository()
+        service = CircuitBreakerService(repository)
+        service.add_circuit(Circuit("test-circuit", failure_threshold=3))
+
+        async def test_function():
+            raise ThrottledException(429, "Too many requests", retry_after=5)
+
+        async def test_fallback_function():
+            return "fallback function called"
+
+        response = asyncio.get_event_loop().run_until_complete(
+            service.execute("test-circuit", test_function, test_fallback_function)
+        )
+
+        circuit = repository.get("test-circuit")
+        self.assertEqual("fallback function called", response)
+        self.assertEqual(CircuitState.OPEN, circuit.state)
+        self.assertEqual(0, circuit.failure_count)
+        self.assertEqual(circuit.last_failure + 5, circuit.open_until)
+
+
+class TestExecutePool(TestCase):
+    def setUp(self):
+        self.repository = InMemoryCircuitBreakerRepository()
+        self.service = CircuitBreakerService(self.repository, max_attempts=2)
+        self.backends = [
+            Backend(identifier, f"https://{identifier}", SecretStr("some-key"))
+            for identifier in ["east", "west", "north"]
+        ]
+        self.pool = BackendPool(self.backends)
+
+        for backend in self.backends:
+            self.service.add_circuit(Circuit(backend.identifier, failure_threshold=1))
+
+    def execute(self, function):
+        async def fallback_function(argument):
+            return f"fallback called with {argument}"
+
+        return asyncio.get_event_loop().run_until_complete(
+            self.service.execute_pool(self.pool, function, fallback_function, "argument")
+        )
+
+    def test_spreads_calls_over_backends(self):
+        async def function(backend, argument):
+            return f"{backend.identifier} called with {argument}"
+
+        responses = [self.execute(function) for _ in range(3)]
+
+        self.assertEqual(
+            [
+                "east called with argument",
+                "west called with argument",
+                "north called with argument",
+            ],
+            responses,
+        )
+
+    def test_fails_over_to_next_backend_and_removes_tripped_backend(self):
+        calls = []
+
+        async def function(backend, argument):
+            calls.append(backend.identifier)
+
+            if backend.identifier == "east":
+                raise Exception("Failure")
+
+            return backend.identifier
+
+        response = self.execute(function)
+
+        self.assertEqual("west", response)
+        self.assertEqual(["east", "west"], calls)
+        self.assertEqual(CircuitState.OPEN, self.repository.get("east").state)
+        self.assertTrue("east" in self.pool.unavailable)
+
+    def test_calls_fallback_after_max_attempts(self):
+        calls = []
+
+        async def function(backend, argument):
+            calls.append(backend.identifier)
+            raise Exception("Failure")
+
+        response = self.execute(function)
+
+        self.assertEqual("fallback called with argument", response)
+        self.assertEqual(["east", "west"], calls)
+
+    def test_tries_every_backend_given_earlier_backends_fail(self):
+        self.service = CircuitBreakerService(self.repository, max_attempts=3)
+        calls = []
+
+        async def function(backend, argument):
+            calls.append(backend.identifier)
+
+            if backend.identifier != "north":
+                raise Exception("Failure")
+
+            return backend.identifier
+
+        self.assertEqual("north", self.execute(function))
+        self.assertEqual(["east", "west", "north"], calls)
+
+    def test_skips_backends_with_open_circuit(self):
+        self.repository.get("east").trip()
+        self.repository.get("east").last_failure = time()
+        calls = []
+
+        async def function(backend, argument):
+            calls.append(backend.identifier)
+            return backend.identifier
+
+        self.assertEqual("west", self.execute(function))
+        self.assertEqual(["west"], calls)
+        self.assertTrue("east" in self.pool.unavailable)
+
+    def test_calls_fallback_given_all_circuits_open(self):
+        for backend in self.backends:
+            self.repository.get(backend.identifier).trip()
+            self.repository.get(backend.identifier).last_failure = time()
+
+        async def function(backend, argument):
+            raise AssertionError("No backend should be called")
+
+        self.assertEqual("fallback called with argument", self.execute(function))
+
+    def test_reports_calls_to_selector(self):
+        selector = LatencyAwareBackendSelector()
+        self.service = CircuitBreakerService(self.repository, selector=selector)
+        calls = []
+
+        async def function(backend, argument):
+            calls.append(backend.identifier)
+
+            if len(calls) == 1:
+                raise Exception("Failure")
+
+            return backend.identifier
+
+        self.execute(function)
+        scores = selector.scores(self.pool)
+        failed, succeeded = calls
+
+        self.assertEqual(0.0, scores[failed]["latency"])
+        self.assertTrue(scores[succeeded]["latency"] > 0)
+        self.assertEqual(
+            [0, 0, 0], [scores[identifier]["in_flight"] for identifier in scores]
+        )
+
+    def test_skips_backends_without_quota(self):
+        tracker = BackendCapacityTracker()
+        tracker.observe(self.backends[0], {"x-ratelimit-remaining-tokens": "100"})
+        self.service = CircuitBreakerService(self.repository, capacity_tracker=tracker)
+
+        async def function(backend, argument):
+            return backend.identifier
+
+        async def fallback_function(argument):
+            return "fallback"
+
+        response = asyncio.get_event_loop().run_until_complete(
+            self.service.execute_pool(
+                self.pool, function, fallback_function, "argument", cost=1000
+            )
+        )
+
+        self.assertEqual("west", response)
+        self.assertEqual(CircuitState.CLOSED, self.repository.get("east").state)
+
+    def test_refused_calls_do_not_use_quota(self):
+        tracker = BackendCapacityTracker()
+        self.pool = BackendPool(self.backends[:1])
+        tracker.observe(self.backends[0], {"x-ratelimit-remaining-tokens": "5000"})
+        self.service = CircuitBreakerService(self.repository, capacity_tracker=tracker)
+        self.repository.get("east").trip()
+        self.repository.get("east").last_failure = time()
+
+        async def function(backend, argument):
+            raise AssertionError("The backend should not be called")
+
+        for _ in range(8):
+            self.assertEqual("fallback called with argument", self.execute(function))
+
+        self.assertEqual(5000, tracker.capacities()["east"]["remaining_tokens"])
+
+    def test_backend_without_quota_frees_its_probe(self):
+        tracker = BackendCapacityTracker()
+        self.pool = BackendPool(self.backends[:1])
+        tracker.observe(self.backends[0], {"x-ratelimit-remaining-tokens": "0"})
+        self.service = CircuitBreakerService(self.repository, capacity_tracker=tracker)
+        circuit = self.repository.get("east")
+        circuit.trip()
+        circuit.last_failure = time() - 60
+
+        async def function(backend, argument):
+            raise AssertionError("The backend should not be called")
+
+        async def fallback_function(argument):
+            return "fallback"
+
+        response = asyncio.get_event_loop().run_until_complete(
+            self.service.execute_pool(
+                self.pool, function, fallback_function, "argument", cost=100
+            )
+        )
+
+        self.assertEqual("fallback", response)
+        self.assertEqual(CircuitState.HALF_OPEN, circuit.state)
+        self.assertEqual(0, circuit.probes_in_flight)
+
+    def test_waits_for_quota_to_be_replenished(self):
+        tracker = BackendCapacityTracker(window=0.05)
+        self.pool = BackendPool(self.backends[:1])
+        tracker.observe(self.backends[0], {"x-ratelimit-remaining-tokens": "0"})
+        self.service = CircuitBreakerService(
+            self.repository, capacity_tracker=tracker, max_queue_time=1.0
+        )
+
+        async def function(backend, argument):
+            return backend.identifier
+
+        self.assertEqual("east", self.execute(function))
+
+    def test_calls_fallback_given_quota_replenished_after_max_queue_time(self):
+        tracker = BackendCapacityTracker(window=60.0)
+        self.pool = BackendPool(self.backends[:1])
+        tracker.observe(self.backends[0], {"x-ratelimit-remaining-tokens": "0"})
+        self.service = CircuitBreakerService(
+            self.repository, capacity_tracker=tracker, max_queue_time=1.0
+        )
+
+        async def function(backend, argument):
+            raise AssertionError("The backend should not be called")
+
+        self.assertEqual("fallback called with argument", self.execute(function))
+
+    def test_throttled_backend_leaves_pool_for_retry_after(self):
+        async def function(backend, argument):
+            if backend.identifier == "east":
+                raise ThrottledException(429, "Too many requests", retry_after=7)
+
+            return backend.identifier
+
+        before = time()
+        response = self.execute(function)
+
+        circuit = self.repository.get("east")
+        self.assertEqual("west", response)
+        self.assertEqual(CircuitState.OPEN, circuit.state)
+        self.assertEqual(0, circuit.failure_count)
+        self.assertEqual(circuit.open_until, self.pool.unavailable["east"][1])
+        self.assertTrue(before + 7 <= circuit.open_until <= time() + 7)
+
+
+class TestExecuteHedged(TestCase):
+    def setUp(self):
+        self.repository = InMemoryCircuitBreakerRepository()
+        self.policy = HedgingPolicy(budget_percent=100.0, min_samples=1)
+        self.service = CircuitBreakerService(self.repository, hedging_policy=self.policy)
+        self.backend = Backend("primary", "https://primary", SecretStr("some-key"))
+        self.pool = BackendPool([self.backend])
+        self.policy.record(self.backend, 0.01)
+        self.service.add_circuit(Circuit("primary", failure_threshold=1))
+        self.cancelled = []
+
+    def execute(self, function, hedge_function):
+        async def fallback_function(argument):
+            return "fallback"
+
+        return asyncio.get_event_loop().run_until_complete(
+            self.service.execute_pool(
+                self.pool,
+                function,
+                fallback_function,
+                "argument",
+                hedge_function=hedge_function,
+            )
+        )
+
+    def create_function(self, name, delay, error=None):
+        async def function(*args):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled.append(name)
+                raise
+
+            if error is not None:
+                raise error
+
+            return name
+
+        return function
+
+    def test_hedge_wins_given_slow_backend(self):
+        response = self.execute(
+            self.create_function("primary", 1.0), self.create_function("hedge", 0.0)
+        )
+
+        self.assertEqual("hedge", response)
+        self.assertEqual(["primary"], self.cancelled)
+        self.assertEqual(1, self.policy.hedges_won)
+        self.assertEqual(CircuitState.CLOSED, self.repository.get("primary").state)
+        self.assertEqual(0, self.repository.get("primary").failure_count)
+
+    def test_backend_wins_given_it_responds_before_hedge(self):
+        response = self.execute(
+            self.create_function("primary", 0.05), self.create_function("hedge", 1.0)
+        )
+
+        self.assertEqual("primary", response)
+        self.assertEqual(["hedge"], self.cancelled)
+        self.assertEqual(1, self.policy.hedges)
+        self.assertEqual(0, self.policy.hedges_won)
+
+    def test_does_not_hedge_fast_backend(self):
+        async def hedge_function(argument):
+            raise AssertionError("The hedge should not be called")
+
+        self.assertEqual(
+            "primary", self.execute(self.create_function("primary", 0.0), hedge_function)
+        )
+        self.assertEqual(0, self.policy.hedges)
+
+    def test_does_not_hedge_given_budget_used_up(self):
+        self.policy = HedgingPolicy(budget_percent=0.0, min_samples=1)
+        self.policy.record(self.backend, 0.01)
+        self.service = CircuitBreakerService(self.repository, hedging_policy=self.policy)
+
+        async def hedge_function(argument):
+            raise AssertionError("The hedge should not be called")
+
+        self.assertEqual(
+            "primary", self.execute(self.create_function("primary", 0.05), hedge_function)
+        )
+        self.assertEqual(0, self.policy.hedges)
+
+    def test_does_not_hedge_given_fallback_full(self):
+        bulkhead = Bulkhead(max_concurrency=1)
+        bulkhead.try_acquire(FALLBACK)
+        self.service = CircuitBreakerService(
+            self.repository, hedging_policy=self.policy, bulkhead=bulkhead
+        )
+
+        async def hedge_function(argument):
+            raise AssertionError("The hedge should not be called")
+
+        self.assertEqual(
+            "primary", self.execute(self.create_function("primary", 0.05), hedge_function)
+        )
+        self.assertEqual(0, self.policy.hedges)
+        self.assertEqual(0, bulkhead.statistics()["primary"]["in_flight"])
+
+    def test_hedge_releases_fallback_slot(self):
+        bulkhead = Bulkhead(max_concurrency=1)
+        self.service = CircuitBreakerService(
+            self.repository, hedging_policy=self.policy, bulkhead=bulkhead
+        )
+
+        response = self.execute(
+            self.create_function("primary", 1.0), self.create_function("hedge", 0.0)
+        )
+
+        self.assertEqual("hedge", response)
+        self.assertEqual(0, bulkhead.statistics()[FALLBACK]["in_flight"])
+        self.assertEqual(0, bulkhead.statistics()["primary"]["in_flight"])
+
+    def test_hedge_wins_given_backend_fails(self):
+        response = self.execute(
+            self.create_function("primary", 0.05, Exception("Failure")),
+            self.create_function("hedge", 0.1),
+        )
+
+        self.assertEqual("hedge", response)
+        self.assertEqual(CircuitState.OPEN, self.repository.get("primary").state)
+
+    def test_waits_for_backend_given_hedge_fails(self):
+        response = self.execute(
+            self.create_function("primary", 0.1),
+            self.create_function("hedge", 0.0, Exception("Failure")),
+        )
+
+        self.assertEqual("primary", response)
+        self.assertEqual(0, self.policy.hedges_won)
+
+
+class TestExecutePoolDeadline(TestCase):
+    def setUp(self):
+        self.repository = InMemoryCircuitBreakerRepository()
+        self.service = CircuitBreakerService(self.repository, max_attempts=2)
+        self.backends = [
+            Backend(identifier, f"https://{identifier}", SecretStr("some-key"))
+            for identifier in ["east", "west"]
+        ]
+        self.pool = BackendPool(self.backends)
+
+        for backend in self.backends:
+            self.service.add_circuit(Circuit(backend.identifier, failure_threshold=1))
+
+    def execute(self, function, fallback_function, deadline):
+        return asyncio.get_event_loop().run_until_complete(
+            self.service.execute_pool(
+                self.pool, function, fallback_function, "argument", deadline=deadline
+            )
+        )
+
+    def test_call_exceeding_deadline_counts_as_failure(self):
+        calls = []
+
+        async def function(backend, argument):
+            calls.append(backend.identifier)
+            await asyncio.sleep(1.0)
+
+        async def fallback_function(argument):
+            return "fallback"
+
+        response = self.execute(function, fallback_function, Deadline(0.15, fallback_reserve=0.1))
+
+        self.assertEqual("fallback", response)
+        self.assertEqual(["east"], calls)
+        self.assertEqual(CircuitState.OPEN, self.repository.get("east").state)
+        self.assertEqual(CircuitState.CLOSED, self.repository.get("west").state)
+
+    def test_calls_backend_given_budget_below_fallback_reserve(self):
+        async def function(backend, argument):
+            return backend.identifier
+
+        async def fallback_function(argument):
+            raise AssertionError("The fallback should not be called")
+
+        response = self.execute(function, fallback_function, Deadline(0.2, fallback_reserve=10.0))
+
+        self.assertEqual("east", response)
+
+    def test_raises_gateway_timeout_given_budget_used_up(self):
+        async def function(backend, argument):
+            raise AssertionError("No backend should be called")
+
+        async def fallback_function(argument):
+            raise AssertionError("The fallback should not be called")
+
+        with self.assertRaises(HTTPException) as context:
+            self.execute(function, fallback_function, Deadline(0.0, fallback_reserve=1.0))
+
+        self.assertEqual(504, context.exception.status_code)
+
+    def test_raises_gateway_timeout_given_fallback_exceeds_deadline(self):
+        async def function(backend, argument):
+            raise Exception("Failure")
+
+        async def fallback_function(argument):
+            await asyncio.sleep(1.0)
+
+        with self.assertRaises(HTTPException) as context:
+            self.execute(function, fallback_function, Deadline(0.05, fallback_reserve=0.05))
+
+        self.assertEqual(504, context.exception.status_code)
+
+
+class TestExecuteBulkhead(TestCase):
+    def setUp(self):
+        self.repository = InMemoryCircuitBreakerRepository()
+        self.bulkhead = Bulkhead(max_concurrency=1, max_queue_size=0, max_queue_time=1.0)
+        self.service = CircuitBreakerService(
+            self.repository, max_attempts=2, bulkhead=self.bulkhead
+        )
+        self.backends = [
+            Backend(identifier, f"https://{identifier}", SecretStr("some-key"))
+            for identifier in ["east", "west"]
+        ]
+        self.pool = BackendPool(self.backends)
+
+        for backend in self.backends:
+            self.service.add_circuit(Circuit(backend.identifier, failure_threshold=1))
+
+    def execute(self, function, fallback_function):
+        return asyncio.get_event_loop().run_until_complete(
+            self.service.execute_pool(self.pool, function, fallback_function, "argument")
+        )
+
+    def test_fails_over_given_full_backend(self):
+        self.bulkhead.try_acquire("east")
+
+        async def function(backend, argument):
+            return backend.identifier
+
+        async def fallback_function(argument):
+            raise AssertionError("The fallback should not be called")
+
+        self.assertEqual("west", self.execute(function, fallback_function))
+        self.assertEqual(0, self.bulkhead.statistics()["west"]["in_flight"])
+        self.assertEqual(1, self.bulkhead.statistics()["east"]["rejected_calls"])
+        # The refused call neither counts as a failure nor keeps a probe slot
+        self.assertEqual(0, self.repository.get("east").failure_count)
+
+    def test_sheds_request_given_backends_and_fallback_full(self):
+        for identifier in ["east", "west", FALLBACK]:
+            self.bulkhead.try_acquire(identifier)
+
+        async def function(backend, argument):
+            raise AssertionError("No backend should be called")
+
+        async def fallback_function(argument):
+            raise AssertionError("The fallback should not be called")
+
+        with self.assertRaises(HTTPException) as context:
+            self.execute(function, fallback_function)
+
+        self.assertEqual(503, context.exception.status_code)
+        self.assertEqual("1", context.exception.headers["Retry-After"])
+
+    def test_releases_slots_of_failed_calls(self):
+        async def function(backend, argument):
+            raise Exception("Failure")
+
+        async def fallback_function(argument):
+            return "fallback"
+
+        self.assertEqual("fallback", self.execute(function, fallback_function))
+        self.assertEqual(
+            {"east": 0, "west": 0, FALLBACK: 0},
+            {
+                identifier: statistics["in_flight"]
+                for identifier, statistics in self.bulkhead.statistics().items()
+            },
+        )
+
+    def test_execute_calls_fallback_given_full_backend(self):
+        self.bulkhead.try_acquire("east")
+
+        async def function():
+            raise AssertionError("The function should not be called")
+
+        async def fallback_function():
+            return "fallback"
+
+        response = asyncio.get_event_loop().run_until_complete(
+            self.service.execute("east", function, fallback_function)
+        )
+
+        self.assertEqual("fallback", response)
+        self.assertEqual(CircuitState.CLOSED, self.repository.get("east").state)
+
+    def test_throttled_call_shrinks_limit_of_backend(self):
+        self.bulkhead = Bulkhead(
+            max_concurrency=10,
+            create_limiter=lambda: GradientLimiter(initial_limit=10, backoff_ratio=0.5),
+        )
+        self.service = CircuitBreakerService(
+            self.repository, max_attempts=2, bulkhead=self.bulkhead
+        )
+
+        async def function(backend, argument):
+            if backend.identifier == "east":
+                raise ThrottledException(status_code=429, retry_after=1.0)
+
+            return backend.identifier
+
+        async def fallback_function(argument):
+            raise AssertionError("The fallback should not be called")
+
+        self.assertEqual("west", self.execute(function, fallback_function))
+
+        statistics = self.bulkhead.statistics()
+        self.assertEqual(5, statistics["east"]["limit"])
+        self.assertEqual(10, statistics["west"]["limit"])
+        self.assertIsNotNone(statistics["west"]["latency"])
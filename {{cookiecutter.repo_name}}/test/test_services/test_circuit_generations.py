@@ -0,0 +1,110 @@
+import asyncio
+import random
+import threading
+import time
+from unittest import TestCase
+
+from src.core.model.circuit import Circuit, CircuitState
+from src.infrastructure.repositories.in_memory_circuit_breaker_repository import (
+    InMemoryCircuitBreakerRepository,
+)
+from src.services.circuit_breaker_service import CircuitBreakerService
+
+
+class TestStaleOutcomes(TestCase):
+    def test_failure_of_call_admitted_before_recovery_is_ignored(self):
+        repository = InMemoryCircuitBreakerRepository()
+        service = CircuitBreakerService(repository)
+        service.add_circuit(Circuit("test-circuit", failure_threshold=1, retry_timeout=0))
+
+        async def slow_failure():
+            await asyncio.sleep(0.05)
+            raise Exception("Failure")
+
+        async def fast_failure():
+            raise Exception("Failure")
+
+        async def success():
+            return "success"
+
+        async def fallback():
+            return "fallback"
+
+        async def run():
+            slow_call = asyncio.ensure_future(
+                service.execute("test-circuit", slow_failure, fallback)
+            )
+            await asyncio.sleep(0)
+            # Opens the circuit, then a successful probe closes it while the slow call is still running
+            await service.execute("test-circuit", fast_failure, fallback)
+            await service.execute("test-circuit", success, fallback)
+            return await slow_call
+
+        self.assertEqual("fallback", asyncio.get_event_loop().run_until_complete(run()))
+
+        circuit = repository.get("test-circuit")
+        self.assertEqual(CircuitState.CLOSED, circuit.state)
+        self.assertEqual(0, circuit.failure_count)
+
+
+class TestConcurrencyStress(TestCase):
+    """
+    Many threads admit calls and record random outcomes after a random delay, while the circuit trips, half opens
+    and recovers all the time. Every transition is checked while the repository holds its lock.
+    """
+
+    threads = 16
+    calls_per_thread = 300
+
+    def test_outcomes_never_break_circuit_transitions(self):
+        repository = InMemoryCircuitBreakerRepository()
+        repository.add(
+            Circuit("test-circuit", failure_threshold=2, retry_timeout=0, half_open_max_probes=2)
+        )
+        violations = []
+
+        def checked(operation):
+            def apply(circuit: Circuit):
+                state = circuit.state
+                result = operation(circuit)
+
+                if state is CircuitState.OPEN and circuit.state is CircuitState.CLOSED:
+                    violations.append("closed without a probe")
+
+                if not 0 <= circuit.probes_in_flight <= circuit.half_open_max_probes:
+                    violations.append(f"{circuit.probes_in_flight} probes in flight")
+
+                return result
+
+            return apply
+
+        def admit(circuit: Circuit):
+            return circuit.generation if circuit.is_callable() else None
+
+        def call():
+            for _ in range(self.calls_per_thread):
+                generation = repository.modify("test-circuit", checked(admit))
+
+                if generation is None:
+                    continue
+
+                time.sleep(random.random() / 10000)
+                operation = random.choice(
+                    [
+                        Circuit.handle_successful_call,
+                        Circuit.handle_failed_call,
+                        Circuit.handle_abandoned_call,
+                    ]
+                )
+                repository.compare_and_set("test-circuit", generation, checked(operation))
+
+        workers = [threading.Thread(target=call) for _ in range(self.threads)]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual([], violations)
+        self.assertTrue(repository.get("test-circuit").generation > 0)
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from src.services.concurrency_limiter import GradientLimiter, StaticLimiter
+
+
+class TestStaticLimiter(TestCase):
+    def test_keeps_limit(self):
+        limiter = StaticLimiter(10)
+
+        limiter.record(5.0, 10)
+        limiter.drop()
+
+        self.assertEqual({"limit": 10}, limiter.statistics())
+
+
+class TestGradientLimiter(TestCase):
+    def setUp(self):
+        self.limiter = GradientLimiter(initial_limit=10, min_limit=2, max_limit=50)
+
+    def test_grows_limit_given_steady_latency(self):
+        for _ in range(50):
+            self.limiter.record(0.1, int(self.limiter.limit))
+
+        self.assertEqual(50, self.limiter.limit)
+
+    def test_does_not_grow_limit_beyond_calls_in_flight(self):
+        for _ in range(50):
+            self.limiter.record(0.1, 1)
+
+        self.assertEqual(10, self.limiter.limit)
+
+    def test_shrinks_limit_given_latency_beyond_tolerance(self):
+        for _ in range(20):
+            self.limiter.record(0.1, int(self.limiter.limit))
+
+        grown_limit = self.limiter.limit
+
+        for _ in range(20):
+            self.limiter.record(1.0, int(self.limiter.limit))
+
+        self.assertLess(self.limiter.limit, grown_limit / 2)
+        self.assertGreater(self.limiter.statistics()["latency"], 0.5)
+
+    def test_drop_shrinks_limit_down_to_min_limit(self):
+        self.limiter.drop()
+        self.assertAlmostEqual(9.0, self.limiter.limit)
+
+        for _ in range(100):
+            self.limiter.drop()
+
+        self.assertEqual(2, self.limiter.limit)
+
+    def test_statistics_report_whole_limit(self):
+        self.limiter.drop()
+
+        self.assertEqual(
+            {"limit": 9, "latency": None, "baseline_latency": None},
+            self.limiter.statistics(),
+        )
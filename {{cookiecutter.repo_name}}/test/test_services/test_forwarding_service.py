@@ -0,0 +1,26 @@
+from email.utils import formatdate
+from time import time
+from unittest import TestCase
+
+import httpx
+
+from src.services.forwarding_service import parse_retry_after
+
+
+class Test(TestCase):
+    def test_parse_retry_after_prefers_milliseconds(self):
+        headers = httpx.Headers({"retry-after-ms": "1500", "retry-after": "2"})
+
+        self.assertEqual(1.5, parse_retry_after(headers))
+
+    def test_parse_retry_after_in_seconds(self):
+        self.assertEqual(2.0, parse_retry_after(httpx.Headers({"retry-after": "2"})))
+
+    def test_parse_retry_after_as_http_date(self):
+        headers = httpx.Headers({"retry-after": formatdate(time() + 60, usegmt=True)})
+
+        self.assertAlmostEqual(60, parse_retry_after(headers), delta=2)
+
+    def test_parse_retry_after_given_no_valid_header(self):
+        self.assertIsNone(parse_retry_after(httpx.Headers({})))
+        self.assertIsNone(parse_retry_after(httpx.Headers({"retry-after": "soon"})))
@@ -0,0 +1,145 @@
+import asyncio
+from unittest import TestCase
+
+import httpx
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+from src.core.model.circuit import Circuit
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.clients.upstream_client_pool import UpstreamClientPool
+from src.infrastructure.metrics.metrics_registry import merge_snapshots, render
+from src.infrastructure.repositories.in_memory_circuit_breaker_repository import (
+    InMemoryCircuitBreakerRepository,
+)
+from src.services.circuit_breaker_service import CircuitBreakerService
+from src.services.forwarding_service import ForwardingService
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.priority_service import PriorityService
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.metrics = GatewayMetrics()
+        self.backend = Backend("east", "https://east", SecretStr("some-key"))
+
+    def run_async(self, coroutine):
+        return asyncio.get_event_loop().run_until_complete(coroutine)
+
+    def create_forwarding_service(self, handler):
+        return ForwardingService(
+            UpstreamClientPool(transport=httpx.MockTransport(handler)),
+            Backend("fallback", "https://fallback", SecretStr("some-key")),
+            metrics=self.metrics,
+        )
+
+    def test_measures_upstream_call(self):
+        service = self.create_forwarding_service(lambda request: httpx.Response(200, content=b"response"))
+
+        self.run_async(service.forward(self.backend, UpstreamRequest("POST", "/chat", b"request", [])))
+
+        self.assertEqual(1, sum(self.metrics.upstream_latency.values[("east", "200")][:-1]))
+        self.assertEqual(7, self.metrics.sent_bytes.values[("east",)])
+        self.assertEqual(8, self.metrics.received_bytes.values[("east",)])
+        self.assertEqual(0, self.metrics.upstream_in_flight.values[("east",)])
+
+    def test_measures_failed_upstream_call(self):
+        def handler(request):
+            raise httpx.ConnectError("Connection refused")
+
+        service = self.create_forwarding_service(handler)
+
+        with self.assertRaises(httpx.ConnectError):
+            self.run_async(service.forward(self.backend, UpstreamRequest("POST", "/chat", b"request", [])))
+
+        self.assertIn(("east", "error"), self.metrics.upstream_latency.values)
+        self.assertEqual(0, self.metrics.upstream_in_flight.values[("east",)])
+
+    def test_streamed_call_is_in_flight_until_closed(self):
+        service = self.create_forwarding_service(
+            lambda request: httpx.Response(200, stream=httpx.ByteStream(b"chunk"))
+        )
+
+        async def scenario():
+            stream = await service.forward(
+                self.backend, UpstreamRequest("POST", "/chat", b"request", [], stream=True)
+            )
+            self.assertEqual(1, self.metrics.upstream_in_flight.values[("east",)])
+
+            async for _ in stream:
+                pass
+
+            await stream.aclose()
+
+        self.run_async(scenario())
+
+        self.assertEqual(0, self.metrics.upstream_in_flight.values[("east",)])
+        self.assertEqual(5, self.metrics.received_bytes.values[("east",)])
+
+    def test_streamed_call_ends_given_error_status(self):
+        service = self.create_forwarding_service(
+            lambda request: httpx.Response(500, stream=httpx.ByteStream(b"error"))
+        )
+
+        with self.assertRaises(Exception):
+            self.run_async(
+                service.forward(self.backend, UpstreamRequest("POST", "/chat", b"", [], stream=True))
+            )
+
+        self.assertEqual(0, self.metrics.upstream_in_flight.values[("east",)])
+        self.assertEqual(1, sum(self.metrics.upstream_latency.values[("east", "500")][:-1]))
+
+    def test_collects_circuits_and_fallback_calls(self):
+        circuit_breaker_service = CircuitBreakerService(
+            InMemoryCircuitBreakerRepository(), metrics=self.metrics
+        )
+        circuit_breaker_service.add_circuit(Circuit("east", failure_threshold=1))
+        priority_service = PriorityService({"default": 1}, "default")
+        priority_service.record("default", 0.1)
+        self.metrics.watch(circuit_breaker_service, ["east", "missing"], priority_service)
+
+        async def fail():
+            raise Exception("Backend failed")
+
+        async def fallback():
+            return "fallback"
+
+        self.run_async(circuit_breaker_service.execute("east", fail, fallback))
+
+        rendered = self.run_async(self.metrics.render())
+        self.assertIn('gateway_circuit_state{circuit="east",state="OPEN"} 1.0', rendered)
+        self.assertIn('gateway_circuit_state{circuit="east",state="CLOSED"} 0.0', rendered)
+        self.assertIn('gateway_circuit_transitions_total{circuit="east"} 1.0', rendered)
+        self.assertIn("gateway_fallback_calls_total 1.0", rendered)
+        self.assertIn('gateway_priority_requests_total{priority="default"} 1.0', rendered)
+
+    def test_observes_latency_per_priority_class(self):
+        priority_service = PriorityService({"interactive": 2, "batch": 1}, "interactive", metrics=self.metrics)
+
+        priority_service.record("batch", 0.2)
+        priority_service.record("batch", 3.0)
+
+        rendered = self.run_async(self.metrics.render())
+        self.assertIn('gateway_priority_request_duration_seconds_bucket{priority="batch",le="0.25"} 1', rendered)
+        self.assertIn('gateway_priority_request_duration_seconds_count{priority="batch"} 2', rendered)
+
+    def test_sums_circuit_transitions_of_workers(self):
+        snapshots = []
+
+        async def fail():
+            raise Exception("Backend failed")
+
+        async def fallback():
+            return "fallback"
+
+        for _ in range(2):
+            metrics = GatewayMetrics()
+            circuit_breaker_service = CircuitBreakerService(InMemoryCircuitBreakerRepository(), metrics=metrics)
+            circuit_breaker_service.add_circuit(Circuit("east", failure_threshold=1, retry_timeout=0))
+            # Trips the circuit, then half opens it and trips it again with a failed probe
+            self.run_async(circuit_breaker_service.execute("east", fail, fallback))
+            self.run_async(circuit_breaker_service.execute("east", fail, fallback))
+            snapshots.append(metrics.registry.snapshot())
+
+        rendered = render(merge_snapshots(snapshots))
+        self.assertIn('gateway_circuit_transitions_total{circuit="east"} 6.0', rendered)
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from pydantic import SecretStr
+
+from src.core.model.backend import Backend
+from src.services.hedging_policy import HedgingPolicy, LatencyWindow
+
+
+class TestLatencyWindow(TestCase):
+    def test_quantile(self):
+        window = LatencyWindow(100)
+
+        for latency in range(1, 101):
+            window.record(latency / 100)
+
+        self.assertEqual(0.96, window.quantile(0.95))
+        self.assertEqual(0.51, window.quantile(0.5))
+
+    def test_keeps_most_recent_latencies(self):
+        window = LatencyWindow(2)
+
+        for latency in [5.0, 1.0, 2.0]:
+            window.record(latency)
+
+        self.assertEqual(2, window.count)
+        self.assertEqual(2.0, window.quantile(0.99))
+
+
+class TestHedgingPolicy(TestCase):
+    def setUp(self):
+        self.backend = Backend("primary", "https://primary", SecretStr("some-key"))
+
+    def test_delay_is_none_given_too_few_samples(self):
+        policy = HedgingPolicy(min_samples=3)
+        policy.record(self.backend, 0.1)
+        policy.record(self.backend, 0.2)
+
+        self.assertIsNone(policy.delay(self.backend))
+
+    def test_delay_is_quantile_of_latencies(self):
+        policy = HedgingPolicy(quantile=0.5, min_samples=3)
+
+        for latency in [0.3, 0.1, 0.2]:
+            policy.record(self.backend, latency)
+
+        self.assertEqual(0.2, policy.delay(self.backend))
+
+    def test_budget_limits_hedges_to_percent_of_calls(self):
+        policy = HedgingPolicy(budget_percent=10.0)
+        hedges = 0
+
+        for _ in range(100):
+            policy.delay(self.backend)
+            hedges += policy.acquire_hedge()
+
+        self.assertEqual(10, hedges)
+        self.assertEqual(10, policy.statistics()["hedges"])
+
+    def test_no_hedge_without_budget(self):
+        policy = HedgingPolicy()
+
+        self.assertFalse(policy.acquire_hedge())
+
+    def test_statistics(self):
+        policy = HedgingPolicy(quantile=0.5)
+        policy.record(self.backend, 0.25)
+
+        self.assertEqual(
+            {"hedges": 0, "hedges_won": 0, "delays": {"primary": 0.25}},
+            policy.statistics(),
+        )
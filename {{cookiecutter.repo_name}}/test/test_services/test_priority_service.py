@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from fastapi import HTTPException
+
+from src.services.priority_service import PriorityService
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.service = PriorityService(
+            {"interactive": 4, "default": 2, "batch": 1},
+            "default",
+            api_keys={"batch-key": "batch"},
+        )
+
+    def test_classifies_by_header(self):
+        self.assertEqual("interactive", self.service.classify({"x-priority": "interactive"}))
+
+    def test_classifies_into_default_class_without_header(self):
+        self.assertEqual("default", self.service.classify({}))
+
+    def test_mapped_api_key_takes_precedence_over_header(self):
+        self.assertEqual(
+            "batch",
+            self.service.classify({"api-key": "batch-key", "x-priority": "interactive"}),
+        )
+        self.assertEqual("batch", self.service.classify({"authorization": "Bearer batch-key"}))
+        self.assertEqual("default", self.service.classify({"api-key": "other-key"}))
+
+    def test_rejects_unknown_class(self):
+        with self.assertRaises(HTTPException) as context:
+            self.service.classify({"x-priority": "urgent"})
+
+        self.assertEqual(400, context.exception.status_code)
+
+    def test_statistics_report_latency_quantiles_per_class(self):
+        for latency in range(1, 101):
+            self.service.record("batch", latency / 100)
+
+        statistics = self.service.statistics()
+
+        self.assertEqual(
+            {"weight": 4, "requests": 0, "p50": None, "p95": None, "p99": None},
+            statistics["interactive"],
+        )
+        self.assertEqual(
+            {"weight": 1, "requests": 100, "p50": 0.51, "p95": 0.96, "p99": 1.0},
+            statistics["batch"],
+        )
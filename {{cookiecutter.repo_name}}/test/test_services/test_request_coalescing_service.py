@@ -0,0 +1,170 @@
+import asyncio
+from unittest import TestCase
+
+import httpx
+
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.request_coalescing_service import RequestCoalescingService
+
+
+async def stream_body():
+    yield b"first"
+    yield b"second"
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.service = RequestCoalescingService(enabled=True)
+        self.calls = 0
+        self.release = None
+
+    async def function(self, argument):
+        self.calls += 1
+        await self.release.wait()
+        return f"response to {argument}"
+
+    def run_concurrently(self, *coroutines):
+        async def run():
+            self.release = asyncio.Event()
+            tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        return self.loop.run_until_complete(run())
+
+    def test_identical_requests_share_one_call(self):
+        responses = self.run_concurrently(
+            *[self.service.execute("key", self.function, "request") for _ in range(3)]
+        )
+
+        self.assertEqual(["response to request"] * 3, responses)
+        self.assertEqual(1, self.calls)
+        self.assertEqual(
+            {"enabled": True, "upstream_calls": 1, "coalesced_calls": 2, "in_flight": 0},
+            self.service.statistics(),
+        )
+
+    def test_requests_with_different_keys_are_not_coalesced(self):
+        responses = self.run_concurrently(
+            self.service.execute("first", self.function, "first"),
+            self.service.execute("second", self.function, "second"),
+            self.service.execute(None, self.function, "third"),
+        )
+
+        self.assertEqual(
+            ["response to first", "response to second", "response to third"], responses
+        )
+        self.assertEqual(3, self.calls)
+
+    def test_requests_after_call_ended_make_new_call(self):
+        self.run_concurrently(self.service.execute("key", self.function, "request"))
+        self.run_concurrently(self.service.execute("key", self.function, "request"))
+
+        self.assertEqual(2, self.calls)
+
+    def test_failure_is_shared(self):
+        async def function():
+            await asyncio.sleep(0)
+            raise Exception("Failure")
+
+        responses = self.run_concurrently(
+            self.service.execute("key", function), self.service.execute("key", function)
+        )
+
+        self.assertEqual(["Failure", "Failure"], [str(response) for response in responses])
+
+    def test_cancelled_first_request_does_not_cancel_call(self):
+        async def run():
+            self.release = asyncio.Event()
+            first = asyncio.ensure_future(self.service.execute("key", self.function, "request"))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(self.service.execute("key", self.function, "request"))
+            await asyncio.sleep(0)
+            first.cancel()
+            self.release.set()
+            return await second
+
+        self.assertEqual("response to request", self.loop.run_until_complete(run()))
+
+    def test_streamed_response_is_fanned_out(self):
+        async def function():
+            await asyncio.sleep(0)
+            return await UpstreamStream.open(httpx.Response(200, content=stream_body()))
+
+        async def read(coroutine):
+            stream = await coroutine
+
+            try:
+                return [chunk async for chunk in stream]
+            finally:
+                await stream.aclose()
+
+        responses = self.run_concurrently(
+            read(self.service.execute("key", function)),
+            read(self.service.execute("key", function)),
+        )
+
+        self.assertEqual([[b"first", b"second"]] * 2, responses)
+
+    def test_closes_stream_given_every_request_cancelled(self):
+        closed = []
+
+        async def function():
+            await self.release.wait()
+            stream = await UpstreamStream.open(httpx.Response(200, content=stream_body()))
+            aclose = stream.aclose
+
+            async def record_close():
+                closed.append(True)
+                await aclose()
+
+            stream.aclose = record_close
+            return stream
+
+        async def run():
+            self.release = asyncio.Event()
+            requests = [
+                asyncio.ensure_future(self.service.execute("key", function)) for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+
+            for request in requests:
+                request.cancel()
+
+            self.release.set()
+            await asyncio.sleep(0.01)
+
+        self.loop.run_until_complete(run())
+
+        self.assertEqual([True], closed)
+
+    def test_create_key_given_deterministic_json_post_request(self):
+        target = "/openai/deployments/gpt-4/chat/completions"
+        request = UpstreamRequest("POST", target, b'{"temperature": 0}', [])
+
+        self.assertIsNotNone(self.service.create_key(request))
+        self.assertIsNotNone(
+            self.service.create_key(UpstreamRequest("POST", "/openai/deployments/ada/embeddings", b"{}", []))
+        )
+        self.assertIsNone(self.service.create_key(UpstreamRequest("POST", target, b"text", [])))
+        self.assertIsNone(self.service.create_key(UpstreamRequest("GET", target, b"", [])))
+
+    def test_does_not_coalesce_sampled_requests(self):
+        target = "/openai/deployments/gpt-4/chat/completions"
+
+        self.assertIsNone(self.service.create_key(UpstreamRequest("POST", target, b'{"temperature": 0.7}', [])))
+        self.assertIsNone(
+            self.service.create_key(UpstreamRequest("POST", target, b'{"temperature": 0, "n": 2}', []))
+        )
+
+    def test_does_not_coalesce_requests_of_different_tenants(self):
+        target = "/openai/deployments/gpt-4/chat/completions"
+        body = b'{"temperature": 0}'
+
+        self.assertNotEqual(
+            self.service.create_key(UpstreamRequest("POST", target, body, [], tenant="team-a")),
+            self.service.create_key(UpstreamRequest("POST", target, body, [], tenant="team-b")),
+        )
@@ -0,0 +1,74 @@
+import json
+from unittest import TestCase
+
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.caches.lru_response_cache import LruResponseCache
+from src.services.response_cache_service import ResponseCacheService, is_bypassed
+
+TARGET = "/openai/deployments/gpt-35-turbo/chat/completions?api-version=2024-02-01"
+
+
+def create_request(body, target=TARGET, stream=False):
+    return UpstreamRequest("POST", target, json.dumps(body).encode(), [], stream=stream)
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.service = ResponseCacheService(LruResponseCache(), enabled=True)
+
+    def test_key_ignores_key_order_and_whitespace(self):
+        first = UpstreamRequest(
+            "POST", TARGET, b'{"temperature": 0, "messages": []}', []
+        )
+        second = UpstreamRequest("POST", TARGET, b'{"messages":[],"temperature":0}', [])
+
+        self.assertEqual(self.service.create_key(first), self.service.create_key(second))
+
+    def test_key_depends_on_path_and_api_version(self):
+        body = {"temperature": 0, "messages": []}
+        keys = {
+            self.service.create_key(create_request(body)),
+            self.service.create_key(
+                create_request(body, target=TARGET.replace("2024-02-01", "2023-05-15"))
+            ),
+            self.service.create_key(
+                create_request(body, target=TARGET.replace("gpt-35-turbo", "gpt-4"))
+            ),
+        }
+
+        self.assertEqual(3, len(keys))
+
+    def test_does_not_cache_sampled_requests(self):
+        self.assertIsNone(self.service.create_key(create_request({"messages": []})))
+        self.assertIsNone(
+            self.service.create_key(create_request({"temperature": 0.7, "messages": []}))
+        )
+        self.assertIsNone(
+            self.service.create_key(create_request({"temperature": 0, "n": 2, "messages": []}))
+        )
+
+    def test_does_not_cache_streamed_requests(self):
+        request = create_request({"temperature": 0, "stream": True}, stream=True)
+
+        self.assertIsNone(self.service.create_key(request))
+
+    def test_caches_embeddings(self):
+        request = create_request(
+            {"input": "text"},
+            target="/openai/deployments/ada/embeddings?api-version=2024-02-01",
+        )
+
+        self.assertIsNotNone(self.service.create_key(request))
+
+    def test_caches_only_successful_responses(self):
+        self.service.put("failed", 500, {}, b"error")
+        self.service.put("succeeded", 200, {"content-type": "application/json"}, b"{}")
+
+        self.assertIsNone(self.service.get("failed"))
+        self.assertEqual(b"{}", self.service.get("succeeded").content)
+
+    def test_is_bypassed(self):
+        self.assertTrue(is_bypassed("no-cache"))
+        self.assertTrue(is_bypassed("max-age=0, No-Store"))
+        self.assertFalse(is_bypassed("max-age=60"))
+        self.assertFalse(is_bypassed(None))
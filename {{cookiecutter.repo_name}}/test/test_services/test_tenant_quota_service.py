@@ -0,0 +1,116 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from src.services.tenant_quota_service import TenantQuotaService
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.service = TenantQuotaService(
+            enabled=True,
+            requests_per_minute=2,
+            tokens_per_minute=1000,
+            quotas={"batch": {"tokens_per_minute": 100}, "free": {}},
+            api_keys={"batch-key": "batch"},
+        )
+
+    def test_identifies_tenant_by_api_key_before_header(self):
+        self.assertEqual(
+            ("batch", True),
+            self.service.identify({"api-key": "batch-key", "x-tenant-id": "team-a"}),
+        )
+        self.assertEqual(("batch", True), self.service.identify({"authorization": "Bearer batch-key"}))
+        self.assertEqual(
+            ("team-a", False),
+            self.service.identify({"api-key": "other-key", "x-tenant-id": "team-a"}),
+        )
+        self.assertEqual(("anonymous", False), self.service.identify({}))
+
+    def test_tenants_named_by_header_share_anonymous_buckets(self):
+        self.service.reserve("team-a", 10, authenticated=False)
+        self.service.reserve("team-b", 10, authenticated=False)
+
+        # A new tenant name does not bring fresh buckets
+        with self.assertRaises(HTTPException):
+            self.service.reserve("team-c", 10, authenticated=False)
+
+        self.assertEqual(["anonymous"], list(self.service.statistics()))
+
+    def test_rejects_requests_over_quota(self):
+        self.service.reserve("team-a", 10)
+        self.service.reserve("team-a", 10)
+
+        with self.assertRaises(HTTPException) as context:
+            self.service.reserve("team-a", 10)
+
+        self.assertEqual(429, context.exception.status_code)
+        self.assertEqual("30", context.exception.headers["Retry-After"])
+        # Every tenant has buckets of its own
+        self.service.reserve("team-b", 10)
+
+    def test_rejects_tokens_over_quota(self):
+        self.service.reserve("batch", 80)
+
+        with self.assertRaises(HTTPException) as context:
+            self.service.reserve("batch", 50)
+
+        self.assertEqual("18", context.exception.headers["Retry-After"])
+        self.assertEqual(1, self.service.statistics()["batch"]["rejected_requests"])
+
+    def test_refills_buckets_over_time(self):
+        with patch("src.services.tenant_quota_service.monotonic", return_value=0.0):
+            self.service.reserve("team-a", 1000)
+            self.service.reserve("team-a", 0)
+
+        with patch("src.services.tenant_quota_service.monotonic", return_value=30.0):
+            self.service.reserve("team-a", 500)
+
+            statistics = self.service.statistics()["team-a"]
+
+        self.assertEqual(0, statistics["remaining_requests"])
+        self.assertEqual(0, statistics["remaining_tokens"])
+
+    def test_reconcile_gives_back_unused_tokens(self):
+        reservation = self.service.reserve("batch", 100)
+        self.service.reconcile(reservation, 30)
+
+        self.service.reserve("batch", 70)
+
+        statistics = self.service.statistics()["batch"]
+        self.assertEqual(30, statistics["used_tokens"])
+        self.assertEqual(0, statistics["remaining_tokens"])
+
+    def test_reconcile_takes_tokens_beyond_estimate(self):
+        reservation = self.service.reserve("batch", 10)
+        self.service.reconcile(reservation, 150)
+
+        with self.assertRaises(HTTPException):
+            self.service.reserve("batch", 1)
+
+    def test_reconcile_keeps_estimate_given_no_usage(self):
+        reservation = self.service.reserve("batch", 40)
+        self.service.reconcile(reservation, None)
+
+        statistics = self.service.statistics()["batch"]
+        self.assertEqual(40, statistics["used_tokens"])
+        self.assertEqual(60, statistics["remaining_tokens"])
+
+    def test_lets_request_larger_than_bucket_through_given_full_bucket(self):
+        self.assertEqual(100, self.service.reserve("batch", 500)[1])
+
+    def test_does_not_track_tenant_without_limits(self):
+        self.assertIsNone(self.service.reserve("free", 10_000))
+        self.service.reconcile(None, 10)
+        self.assertNotIn("free", self.service.statistics())
+
+    def test_drops_least_recently_used_tenant(self):
+        service = TenantQuotaService(enabled=True, requests_per_minute=10, max_tenants=2)
+
+        service.reserve("team-a", 0)
+        service.reserve("team-b", 0)
+        service.reserve("team-a", 0)
+        service.reserve("team-c", 0)
+
+        self.assertEqual(["team-a", "team-c"], list(service.statistics()))
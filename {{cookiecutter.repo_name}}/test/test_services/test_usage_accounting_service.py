@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from unittest import TestCase
+
+import httpx
+
+from src.core.model.upstream_request import UpstreamRequest
+from src.infrastructure.clients.upstream_stream import UpstreamStream
+from src.services.gateway_metrics import GatewayMetrics
+from src.services.usage_accounting_service import (
+    get_deployment,
+    get_usage,
+    parse_usage,
+    UsageAccountingService,
+    UsageScanner,
+)
+
+TARGET = "/openai/deployments/gpt-4/chat/completions?api-version=2024-02-01"
+
+
+class TestParseUsage(TestCase):
+    def test_parses_usage_of_completion(self):
+        usage = parse_usage(
+            b'{"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}'
+        )
+
+        self.assertEqual((10, 5, 15), (usage.prompt_tokens, usage.completion_tokens, usage.total_tokens))
+
+    def test_ignores_usage_within_message_content(self):
+        body = b'{"choices": [{"message": {"content": "the \\"usage\\": {}"}}], "id": "1"}'
+
+        self.assertIsNone(parse_usage(body))
+
+    def test_returns_none_given_no_usage(self):
+        self.assertIsNone(parse_usage(b'{"choices": []}'))
+        self.assertIsNone(parse_usage(b'{"usage": null}'))
+        self.assertIsNone(parse_usage(b'{"usage": {"prompt'))
+
+    def test_get_usage_parses_response_once(self):
+        response = httpx.Response(200, content=b'{"usage": {"prompt_tokens": 10, "completion_tokens": 5}}')
+
+        usage = get_usage(response)
+
+        self.assertEqual(15, usage.total_tokens)
+        self.assertIs(usage, get_usage(response))
+
+
+class TestUsageScanner(TestCase):
+    def test_finds_usage_of_final_event_across_chunks(self):
+        scanner = UsageScanner()
+        stream = (
+            b'data: {"choices": [{"delta": {"content": "Hi"}}], "usage": null}\n\n'
+            b'data: {"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": 3}}\n\n'
+            b"data: [DONE]\n\n"
+        )
+
+        for index in range(0, len(stream), 9):
+            scanner.feed(stream[index : index + 9])
+
+        self.assertEqual(10, scanner.total_tokens)
+
+    def test_has_no_usage_given_stream_without_usage(self):
+        scanner = UsageScanner()
+        scanner.feed(b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\ndata: [DONE]\n\n')
+
+        self.assertIsNone(scanner.total_tokens)
+
+
+class TestUsageAccountingService(TestCase):
+    def setUp(self):
+        self.metrics = GatewayMetrics()
+        self.service = UsageAccountingService(metrics=self.metrics)
+
+    def test_aggregates_usage_per_backend_deployment_and_tenant(self):
+        body = b'{"usage": {"prompt_tokens": 10, "completion_tokens": 5}}'
+        request = UpstreamRequest("POST", TARGET, b"", [], tenant="team-a")
+        self.service.record_response("east", request, httpx.Response(200, content=body))
+        self.service.record_response("east", request, httpx.Response(200, content=body))
+        self.service.record_response(
+            "west", UpstreamRequest("POST", TARGET, b"", []), httpx.Response(200, content=b"{}")
+        )
+
+        self.assertEqual(
+            {
+                "total": {"requests": 3, "prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30},
+                "usage": [
+                    {
+                        "backend": "east",
+                        "deployment": "gpt-4",
+                        "tenant": "team-a",
+                        "requests": 2,
+                        "prompt_tokens": 20,
+                        "completion_tokens": 10,
+                        "total_tokens": 30,
+                    },
+                    {
+                        "backend": "west",
+                        "deployment": "gpt-4",
+                        "tenant": "anonymous",
+                        "requests": 1,
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                        "total_tokens": 0,
+                    },
+                ],
+            },
+            self.service.statistics(),
+        )
+
+    def test_flush_moves_period_into_totals_log_and_metrics(self):
+        request = UpstreamRequest("POST", TARGET, b"", [], tenant="team-a")
+        self.service.record_response(
+            "east", request, httpx.Response(200, content=b'{"usage": {"prompt_tokens": 10, "completion_tokens": 5}}')
+        )
+
+        with self.assertLogs("src.services.usage_accounting_service", logging.INFO):
+            self.service.flush()
+
+        self.service.record_response(
+            "east", request, httpx.Response(200, content=b'{"usage": {"prompt_tokens": 1, "completion_tokens": 1}}')
+        )
+
+        self.assertEqual(17, self.service.statistics()["total"]["total_tokens"])
+        self.assertEqual(10, self.metrics.tokens.values[("east", "gpt-4", "prompt")])
+        self.assertEqual(5, self.metrics.tokens.values[("east", "gpt-4", "completion")])
+
+    def test_records_usage_of_stream_once_closed(self):
+        async def events():
+            yield b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n'
+            yield b'data: {"choices": [], "usage": {"prompt_tokens": 4, "completion_tokens": 2}}\n\n'
+
+        async def scenario():
+            stream = await UpstreamStream.open(httpx.Response(200, content=events()))
+            self.service.scan_stream("east", UpstreamRequest("POST", TARGET, b"", [], stream=True), stream)
+
+            async for _ in stream:
+                pass
+
+            self.assertEqual([], self.service.statistics()["usage"])
+            await stream.aclose()
+
+        asyncio.get_event_loop().run_until_complete(scenario())
+
+        self.assertEqual(6, self.service.statistics()["total"]["total_tokens"])
+
+    def test_get_deployment(self):
+        self.assertEqual("gpt-4", get_deployment(TARGET))
+        self.assertEqual("gpt-4", get_deployment("/openai/deployments/gpt-4?api-version=1"))
+        self.assertEqual("", get_deployment("/openai/models"))